@@ -0,0 +1,151 @@
+import heapq
+import os
+import threading
+import time
+
+
+class AudioJanitor:
+    """
+    Một luồng nền duy nhất xóa file âm thanh hết hạn.
+    Hạn xóa của mọi file nằm trong một min-heap; luồng chỉ ngủ đến hạn gần nhất,
+    nên số luồng và bộ nhớ không tăng theo số request.
+    """
+
+    def __init__(self, folder, ttl_seconds=600, max_bytes=None, on_delete=None, sweep_interval=None):
+        self.folder = folder
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.on_delete = on_delete
+        # Quét lại thư mục định kỳ để thấy file do process khác tạo (nhiều worker)
+        self.sweep_interval = sweep_interval
+        self._heap = []        # (deadline, filename); mục cũ bị bỏ qua khi pop
+        self._deadlines = {}   # filename -> deadline hiện hành
+        self._sizes = {}       # filename -> kích thước (byte)
+        self._total_bytes = 0
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopped = False
+
+    def start(self):
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._stopped = False
+            self._thread = threading.Thread(target=self._run, name="audio-janitor", daemon=True)
+        self.sweep()
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def sweep(self):
+        """Quét thư mục lúc khởi động: xóa file đã quá hạn, lên lịch cho file còn lại."""
+        now = time.time()
+        expired = []
+        with self._cond:
+            for entry in os.scandir(self.folder):
+                if not entry.is_file():
+                    continue
+                st = entry.stat()
+                deadline = st.st_mtime + self.ttl_seconds
+                if deadline <= now:
+                    expired.append(entry.name)
+                else:
+                    self._track_locked(entry.name, st.st_size, deadline)
+            expired += self._enforce_quota_locked()
+            self._cond.notify()
+        self._delete(expired)
+        if expired:
+            print(f"🧹 Đã dọn {len(expired)} file âm thanh cũ")
+
+    def schedule(self, filename, ttl_seconds=None):
+        """Đặt (hoặc gia hạn) thời điểm xóa cho một file trong thư mục."""
+        if self._thread is None:
+            # Không phải process dọn dẹp: leader sẽ thấy file qua lần quét định kỳ
+            return
+        deadline = time.time() + (self.ttl_seconds if ttl_seconds is None else ttl_seconds)
+        try:
+            size = os.path.getsize(os.path.join(self.folder, filename))
+        except FileNotFoundError:
+            return
+        with self._cond:
+            wake = not self._heap or deadline < self._heap[0][0]
+            self._track_locked(filename, size, deadline)
+            over_quota = self._enforce_quota_locked()
+            if wake:
+                self._cond.notify()
+        self._delete(over_quota)
+
+    def stats(self):
+        with self._cond:
+            return {"files": len(self._deadlines), "bytes": self._total_bytes}
+
+    def _track_locked(self, filename, size, deadline):
+        self._total_bytes += size - self._sizes.get(filename, 0)
+        self._sizes[filename] = size
+        self._deadlines[filename] = deadline
+        heapq.heappush(self._heap, (deadline, filename))
+        # Heap chứa nhiều mục cũ do gia hạn liên tục: dựng lại khi quá lớn
+        if len(self._heap) > 2 * len(self._deadlines) + 64:
+            self._heap = [(d, f) for f, d in self._deadlines.items()]
+            heapq.heapify(self._heap)
+
+    def _untrack_locked(self, filename):
+        self._deadlines.pop(filename, None)
+        self._total_bytes -= self._sizes.pop(filename, 0)
+
+    def _pop_due_locked(self, now):
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            deadline, filename = heapq.heappop(self._heap)
+            if self._deadlines.get(filename) == deadline:
+                self._untrack_locked(filename)
+                due.append(filename)
+        return due
+
+    def _enforce_quota_locked(self):
+        # Vượt hạn mức dung lượng: xóa sớm các file có hạn gần nhất
+        evicted = []
+        if self.max_bytes is None:
+            return evicted
+        while self._heap and self._total_bytes > self.max_bytes:
+            deadline, filename = heapq.heappop(self._heap)
+            if self._deadlines.get(filename) == deadline:
+                self._untrack_locked(filename)
+                evicted.append(filename)
+        return evicted
+
+    def _run(self):
+        next_sweep = time.time() + self.sweep_interval if self.sweep_interval else None
+        while True:
+            with self._cond:
+                if self._stopped:
+                    return
+                now = time.time()
+                due = self._pop_due_locked(now)
+                sweep_due = next_sweep is not None and now >= next_sweep
+                if not due and not sweep_due:
+                    deadlines = [d for d in (self._heap[0][0] if self._heap else None, next_sweep) if d]
+                    self._cond.wait(min(deadlines) - now if deadlines else None)
+                    continue
+            self._delete(due)
+            if sweep_due:
+                self.sweep()
+                next_sweep = time.time() + self.sweep_interval
+
+    def _delete(self, filenames):
+        for filename in filenames:
+            try:
+                os.remove(os.path.join(self.folder, filename))
+                print(f"Đã xóa file âm thanh: {filename}")
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                print(f"Lỗi khi xóa file {filename}: {e}")
+            if self.on_delete:
+                self.on_delete(filename)
@@ -0,0 +1,99 @@
+import base64
+import hashlib
+import hmac
+from flask import Response
+from tts_cache import cache_key
+from metrics import STAGE_SECONDS, TTS_FAILURES
+
+# URL chứa chính nội dung cần đọc nên phải giới hạn độ dài (URL ~4/3 số byte UTF-8)
+MAX_STREAM_TEXT_CHARS = 1000
+# URL theo nội dung không bao giờ đổi: client được cache và phát lại mà không tải lại
+CACHE_CONTROL = "public, max-age=86400, immutable"
+
+
+def _b64encode(raw):
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _b64decode(value):
+    return base64.urlsafe_b64decode(value + "=" * (-len(value) % 4))
+
+
+def _signature(text_bytes, secret):
+    return hmac.new(secret, text_bytes, hashlib.sha256).digest()[:16]
+
+
+def encode_audio_token(text, secret):
+    """
+    Token cho /audio/stream/<token>, hoặc None nếu câu quá dài để đưa vào URL.
+    Dạng <nội dung>.<chữ ký HMAC của nội dung>: chỉ server (giữ secret) tạo được URL hợp lệ,
+    nên /audio/stream không thành proxy TTS cho văn bản tùy ý.
+    """
+    if not text or len(text) > MAX_STREAM_TEXT_CHARS:
+        return None
+    raw = text.encode("utf-8")
+    return f"{_b64encode(raw)}.{_b64encode(_signature(raw, secret))}"
+
+
+def decode_audio_token(token, secret):
+    try:
+        payload, signature = token.split(".")
+        raw = _b64decode(payload)
+        valid = hmac.compare_digest(_b64decode(signature), _signature(raw, secret))
+        text = raw.decode("utf-8")
+    except Exception:
+        raise ValueError("token âm thanh không hợp lệ")
+    if not valid or not text.strip() or len(text) > MAX_STREAM_TEXT_CHARS:
+        raise ValueError("token âm thanh không hợp lệ")
+    return text
+
+
+def audio_stream_response(engine, text, request, lang="vi", tld="com.vn"):
+    """
+    Phát mp3 của text thẳng từ bộ tổng hợp, không ghi file:
+    - không có Range: đẩy từng đoạn ra ngay khi tải xong (chunked transfer);
+    - có Range: ghép đủ trong bộ nhớ (các đoạn đã nằm trong cache của engine sau
+      lần phát đầu) rồi trả 206 với đúng khoảng byte.
+    ETag là hàm băm của nội dung nên If-None-Match / If-Range dùng được giữa các lần phát.
+    """
+    etag = cache_key(text, lang, tld)
+    headers = {"Cache-Control": CACHE_CONTROL, "Accept-Ranges": "bytes"}
+
+    if request.if_none_match.contains(etag):
+        response = Response(status=304, headers=headers)
+        response.set_etag(etag)
+        return response
+
+    if request.range is not None:
+        try:
+            data = engine.synthesize_bytes(text, lang, tld)
+        except Exception as e:
+            TTS_FAILURES.inc("audio_stream")
+            print(f"⚠️ TTS stream lỗi: {e}")
+            return Response(status=502)
+        response = Response(data, mimetype="audio/mpeg", headers=headers)
+        response.set_etag(etag)
+        return response.make_conditional(request, accept_ranges=True, complete_length=len(data))
+
+    parts = engine.iter_audio(text, lang, tld)
+    # Chờ đoạn đầu trước khi gửi header: nếu TTS lỗi ngay thì vẫn trả được mã lỗi
+    try:
+        with STAGE_SECONDS.time("audio_stream", "first_chunk"):
+            first = next(parts, b"")
+    except Exception as e:
+        TTS_FAILURES.inc("audio_stream")
+        print(f"⚠️ TTS stream lỗi: {e}")
+        return Response(status=502)
+
+    def generate():
+        yield first
+        try:
+            yield from parts
+        except Exception as e:
+            # Header đã gửi đi: chỉ còn cách cắt luồng, client sẽ thấy file ngắn
+            TTS_FAILURES.inc("audio_stream")
+            print(f"⚠️ TTS stream lỗi: {e}")
+
+    response = Response(generate(), mimetype="audio/mpeg", headers=headers, direct_passthrough=True)
+    response.set_etag(etag)
+    return response
@@ -0,0 +1,114 @@
+"""
+Nhập/xuất hàng loạt NDJSON (/note/import, /note/export, /appointment/import,
+/appointment/export) so với nhập từng ghi chú qua POST /note. Chạy offline trên DB tạm;
+body được sinh dần khi gửi (chunked) nên cả hai phía đều không giữ toàn bộ dữ liệu.
+
+    cd backend && python bench/bench_bulk_io.py --rows 100000
+    python bench/bench_bulk_io.py --rows 20000 --trace-memory   # đỉnh bộ nhớ phía server
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import requests  # noqa: E402
+from loadtest import serve  # noqa: E402
+
+
+def note_lines(count):
+    for i in range(count):
+        record = {"title": f"Ghi chú {i}", "content": f"Mua sữa, trứng và bánh mì lần thứ {i}",
+                  "created_at": f"2024-01-01 08:{i // 60 % 60:02d}:{i % 60:02d}"}
+        yield (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def appointment_lines(count):
+    start = datetime(2020, 1, 1, 7, 0)
+    for i in range(count):
+        record = {"datetime": (start + timedelta(minutes=i)).strftime("%Y-%m-%d %H:%M"),
+                  "description": f"Uống thuốc lần {i}", "notified": True}
+        yield (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def measure(label, count, fn, trace_memory):
+    if trace_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - started
+    peak = ""
+    if trace_memory:
+        peak = f"  đỉnh bộ nhớ {tracemalloc.get_traced_memory()[1] / 1024 / 1024:7.1f} MiB"
+        tracemalloc.stop()
+    print(f"{label:34} {count:8} dòng  {elapsed:8.2f} s  {count / elapsed:10.0f} dòng/s{peak}")
+    return result
+
+
+def export(url):
+    rows = 0
+    with requests.get(url, stream=True) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if line:
+                rows += 1
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--single-rows", type=int, default=500,
+                        help="số ghi chú gửi từng cái qua POST /note để so sánh")
+    parser.add_argument("--trace-memory", action="store_true")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="ruby-bulk-")
+    os.environ.update({
+        "APPOINTMENTS_DB_URI": "sqlite:///" + os.path.join(workdir, "appointments.db"),
+        "NOTES_DB_PATH": os.path.join(workdir, "notes.db"),
+        "AUDIO_FOLDER": os.path.join(workdir, "audio"),
+        # Không chạy leader/lịch nhắc; POST /note chỉ trả link stream, không gọi TTS
+        "DEFER_PROCESS_START": "1",
+        "AUDIO_DELIVERY": "stream",
+    })
+    os.chdir(workdir)
+    try:
+        import main
+        main.storage.migrate()
+        _, base = serve(main.app)
+
+        with requests.Session() as session:
+            measure("POST /note (từng ghi chú)", args.single_rows, lambda: [
+                session.post(f"{base}/note", json={"content": f"ghi chú {i}"}).raise_for_status()
+                for i in range(args.single_rows)], args.trace_memory)
+
+        def bulk_import(path, lines):
+            response = requests.post(f"{base}{path}", data=lines,
+                                     headers={"Content-Type": "application/x-ndjson"})
+            response.raise_for_status()
+            return response.json()["imported"]
+
+        imported = measure("POST /note/import", args.rows,
+                           lambda: bulk_import("/note/import", note_lines(args.rows)), args.trace_memory)
+        assert imported == args.rows, imported
+        exported = measure("GET /note/export", args.rows + args.single_rows,
+                           lambda: export(f"{base}/note/export"), args.trace_memory)
+        assert exported == args.rows + args.single_rows, exported
+
+        imported = measure("POST /appointment/import", args.rows,
+                           lambda: bulk_import("/appointment/import", appointment_lines(args.rows)),
+                           args.trace_memory)
+        assert imported == args.rows, imported
+        exported = measure("GET /appointment/export", args.rows,
+                           lambda: export(f"{base}/appointment/export"), args.trace_memory)
+        assert exported == args.rows, exported
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
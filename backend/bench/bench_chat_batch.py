@@ -0,0 +1,118 @@
+"""
+Một lô tin nhắn gửi qua /chat/batch so với gửi lần lượt từng tin qua /chat (như client
+khi có mạng lại). OpenRouter và OpenWeather là server giả lập có độ trễ cấu hình được;
+cache LLM và cache thời tiết được tắt để mỗi tin nhắn thật sự gọi upstream.
+--llm-messages N thêm một lô N câu hỏi cho LLM (nhiều hơn LLM_MAX_CONCURRENCY): lô không
+được tự làm tràn llm_gateway, mọi tin nhắn phải có câu trả lời, không có lỗi wait_timeout.
+Trong lúc lô đó chạy, một /chat và một lô chỉ gồm thời tiết/giờ phải được trả lời ngay,
+không bị lô LLM chiếm hết chỗ của gateway hay luồng của pool.
+
+    cd backend && python bench/bench_chat_batch.py --llm-ms 800 --weather-ms 300 --llm-messages 16
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import requests  # noqa: E402
+from fake_openrouter import start_fake_openrouter  # noqa: E402
+from fake_openweather import start_fake_openweather  # noqa: E402
+from loadtest import serve  # noqa: E402
+
+BATCH = [
+    "thời tiết hà nội",
+    "bạn có thể kể một câu chuyện ngắn không",
+    "nhắc tôi uống nước sau 10 phút",
+    "thời tiết đà nẵng ngày mai",
+    "giải thích ngắn gọn về quang hợp",
+    "bật đèn",
+    "nhắc tôi gọi cho mẹ lúc 8 giờ tối",
+    "thời tiết huế và cần thơ",
+    "gợi ý món ăn tối nay",
+    "mấy giờ rồi",
+]
+NO_LLM_BATCH = ["thời tiết hà nội", "mấy giờ rồi", "thời tiết huế", "hôm nay ngày mấy"]
+
+
+def llm_batch(count):
+    return [f"câu hỏi số {i}: giải thích ngắn gọn một hiện tượng tự nhiên" for i in range(count)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--llm-ms", type=int, default=800)
+    parser.add_argument("--weather-ms", type=int, default=300)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--llm-messages", type=int, default=16)
+    args = parser.parse_args()
+
+    _, llm_url = start_fake_openrouter(first_token_ms=args.llm_ms, token_ms=0)
+    _, weather_url = start_fake_openweather(latency_ms=args.weather_ms)
+    workdir = tempfile.mkdtemp(prefix="ruby-batch-")
+    os.environ.update({
+        "OPENROUTER_BASE_URL": llm_url,
+        "OPENWEATHER_BASE_URL": weather_url,
+        "OPENROUTER_API_KEY": "bench",
+        "OPENWEATHER_API_KEY": "bench",
+        "APPOINTMENTS_DB_URI": "sqlite:///" + os.path.join(workdir, "appointments.db"),
+        "NOTES_DB_PATH": os.path.join(workdir, "notes.db"),
+        "AUDIO_FOLDER": os.path.join(workdir, "audio"),
+        "AUDIO_DELIVERY": "stream",
+        "WEATHER_CURRENT_TTL": "0",
+        "WEATHER_FORECAST_TTL": "0",
+        "DEFER_PROCESS_START": "1",
+    })
+    os.chdir(workdir)
+    try:
+        import main
+        main.storage.migrate()
+        _, base = serve(main.app)
+
+        with requests.Session() as session:
+            for round_no in range(1, args.rounds + 1):
+                started = time.perf_counter()
+                sequential = [session.post(f"{base}/chat", json={"message": m, "cache": False}).json()["reply"]
+                              for m in BATCH]
+                sequential_s = time.perf_counter() - started
+
+                started = time.perf_counter()
+                response = session.post(f"{base}/chat/batch", json={"messages": BATCH, "cache": False})
+                batch_s = time.perf_counter() - started
+                results = response.json()["results"]
+                errors = [r["error"] for r in results if "error" in r]
+                print(f"lượt {round_no}: {len(BATCH)} tin nhắn  lần lượt {sequential_s:6.2f} s"
+                      f"  /chat/batch {batch_s:6.2f} s  ({sequential_s / batch_s:4.1f}x)"
+                      f"  lỗi: {errors or 'không'}")
+                assert len(results) == len(sequential)
+
+        if args.llm_messages:
+            def timed_post(path, body):
+                started = time.perf_counter()
+                response = requests.post(f"{base}{path}", json={**body, "cache": False})
+                return response, time.perf_counter() - started
+
+            with ThreadPoolExecutor(max_workers=3) as clients:
+                llm = clients.submit(timed_post, "/chat/batch", {"messages": llm_batch(args.llm_messages)})
+                time.sleep(args.llm_ms / 1000 / 4)  # lô LLM đã giữ chỗ trong gateway
+                chat = clients.submit(timed_post, "/chat", {"message": "kể một câu chuyện cười"})
+                no_llm = clients.submit(timed_post, "/chat/batch", {"messages": NO_LLM_BATCH})
+                (llm_response, llm_s), (chat_response, chat_s), (no_llm_response, no_llm_s) = (
+                    llm.result(), chat.result(), no_llm.result())
+
+            errors = [r["error"] for r in llm_response.json()["results"] if "error" in r]
+            print(f"lô {args.llm_messages} tin nhắn LLM (chiếm tối đa {main.CHAT_BATCH_LLM_SHARE}/"
+                  f"{main.llm_gateway.max_concurrent} chỗ): {llm_s:6.2f} s  lỗi: {errors or 'không'}")
+            print(f"  /chat cùng lúc: {chat_response.status_code} sau {chat_s:5.2f} s")
+            no_llm_errors = [r["error"] for r in no_llm_response.json()["results"] if "error" in r]
+            print(f"  lô {len(NO_LLM_BATCH)} tin nhắn không cần LLM cùng lúc: {no_llm_s:5.2f} s"
+                  f"  lỗi: {no_llm_errors or 'không'}")
+            assert not errors and not no_llm_errors, (errors, no_llm_errors)
+            assert chat_response.status_code == 200, chat_response.text
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
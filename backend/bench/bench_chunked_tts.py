@@ -0,0 +1,53 @@
+"""
+Thời gian TTS cho câu trả lời dài: tải lần lượt từng đoạn (như gTTS) so với
+ChunkedSynthesizer tải song song, và khi các đoạn đã nằm trong cache.
+
+    cd backend && python bench/bench_chunked_tts.py --latency-ms 250 --workers 8
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chunked_tts import ChunkedSynthesizer, split_chunks  # noqa: E402
+from fake_tts import http_fetch_chunk, start_fake_tts  # noqa: E402
+
+REPLY_500 = (
+    "Chào bạn, mình là Ruby. Hôm nay trời Hà Nội nắng nhẹ, khoảng 30 độ, độ ẩm cao. "
+    "Buổi chiều có thể có mưa rào và dông rải rác, bạn nhớ mang theo áo mưa nhé. "
+    "Về lịch của bạn: 9 giờ sáng họp nhóm dự án, 12 giờ ăn trưa với chị Lan, "
+    "3 giờ chiều gọi điện cho khách hàng, 6 giờ tối đi tập thể dục. "
+    "Mình đã tạo ghi chú mua sữa, bánh mì và trái cây cho cuối tuần. "
+    "Ngày mai nhiệt độ giảm nhẹ, sáng sớm có sương mù nên bạn đi đường cẩn thận. "
+    "Nếu cần thay đổi lịch hẹn hay đặt thêm nhắc nhở, bạn cứ nói với mình nhé. Chúc bạn một ngày vui vẻ!"
+)
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return (time.perf_counter() - start) * 1000, result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency-ms", type=int, default=250, help="độ trễ mỗi request TTS")
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    _, url = start_fake_tts(latency_ms=args.latency_ms)
+    fetch = http_fetch_chunk(url)
+    chunks = split_chunks(REPLY_500)
+    print(f"{len(REPLY_500)} ký tự -> {len(chunks)} đoạn, độ trễ mỗi request {args.latency_ms} ms")
+
+    sequential_ms, sequential = timed(lambda: b"".join(fetch(c, "vi", "com.vn") for c in chunks))
+    engine = ChunkedSynthesizer(max_workers=args.workers, fetch_chunk=fetch)
+    parallel_ms, parallel = timed(lambda: engine.synthesize_bytes(REPLY_500))
+    cached_ms, _ = timed(lambda: engine.synthesize_bytes(REPLY_500))
+    assert parallel == sequential, "thứ tự frame mp3 phải giống hệt bản tải tuần tự"
+
+    print(f"{'tuần tự (gTTS)':22} {sequential_ms:8.1f} ms")
+    print(f"{'song song':22} {parallel_ms:8.1f} ms  (x{sequential_ms / parallel_ms:.1f})")
+    print(f"{'song song, cache đoạn':22} {cached_ms:8.1f} ms")
@@ -0,0 +1,58 @@
+"""
+So sánh extract_city hiện tại (regex trie dựng sẵn) với cách cũ
+(duyệt từng alias, bỏ dấu lại mỗi vòng lặp) trên tập tin nhắn thực tế.
+
+    cd backend && python bench/bench_city_match.py
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from city_utils import extract_city, remove_accents  # noqa: E402
+from map import ALIAS_MAP, VIETNAM_CITIES  # noqa: E402
+from corpus import CITY_MESSAGES  # noqa: E402
+
+
+def legacy_extract_city(message):
+    """Bản cũ của extract_city (bỏ các dòng print debug)."""
+    message = message.lower()
+    normalized_msg = remove_accents(message)
+    for alias, real_city in ALIAS_MAP.items():
+        if alias in message or remove_accents(alias) in normalized_msg:
+            return real_city
+    for city_name in VIETNAM_CITIES:
+        if remove_accents(city_name.lower()) in normalized_msg:
+            return city_name
+    return None
+
+
+def run(fn, messages, repeat=5, number=200):
+    def loop():
+        for m in messages:
+            fn(m)
+    best = min(timeit.repeat(loop, repeat=repeat, number=number))
+    return best / (number * len(messages)) * 1e6  # µs / tin nhắn
+
+
+def accuracy(fn):
+    return sum(fn(m) == expected for m, expected in CITY_MESSAGES) / len(CITY_MESSAGES)
+
+
+if __name__ == "__main__":
+    messages = [m for m, _ in CITY_MESSAGES]
+    legacy_us = run(legacy_extract_city, messages)
+    current_us = run(extract_city, messages)
+    print(f"{'':10} {'µs/msg':>10} {'accuracy':>10}")
+    print(f"{'legacy':10} {legacy_us:10.2f} {accuracy(legacy_extract_city):10.0%}")
+    print(f"{'current':10} {current_us:10.2f} {accuracy(extract_city):10.0%}")
+    print(f"speedup: {legacy_us / current_us:.1f}x")
+
+    # Bản cũ sai ở vài câu (so khớp chuỗi con: "john" chứa "hn"), nhưng câu nào bản cũ đúng
+    # thì bản hiện tại cũng phải đúng (vd. thứ tự ưu tiên alias: "vịnh hạ long")
+    regressions = [(m, expected, extract_city(m)) for m, expected in CITY_MESSAGES
+                   if legacy_extract_city(m) == expected != extract_city(m)]
+    for message, expected, got in regressions:
+        print(f"  hồi quy: {message!r} expected={expected} got={got}")
+    print(f"hồi quy so với bản cũ: {len(regressions)}")
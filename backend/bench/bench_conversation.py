@@ -0,0 +1,57 @@
+"""
+Kích thước prompt gửi LLM theo độ dài hội thoại (gửi cả lịch sử so với assemble_prompt
+có giới hạn token), và chi phí đọc/ghi một lượt của từng backend bộ nhớ hội thoại.
+
+    cd backend && python bench/bench_conversation.py --budget 1024
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from conversation import InProcessMemory, SQLiteMemory, assemble_prompt, estimate_tokens  # noqa: E402
+
+SYSTEM_PROMPT = "Bạn là Ruby – trợ lý ảo lanh lợi, trả lời CỰC KỲ NGẮN GỌN, đúng trọng tâm, súc tích."
+QUESTION = "còn ngày mai thì sao, có mưa không và nhiệt độ bao nhiêu?"
+ANSWER = "Ngày mai Hà Nội có mưa rào rải rác vào buổi chiều, nhiệt độ từ 26 đến 31 độ C. " * 2
+
+
+def prompt_tokens(messages):
+    return sum(estimate_tokens(m["content"]) for m in messages)
+
+
+def per_op_us(fn, count):
+    started = time.perf_counter()
+    for i in range(count):
+        fn(i)
+    return (time.perf_counter() - started) / count * 1e6
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--budget", type=int, default=1024)
+    parser.add_argument("--ops", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{'lượt':>6} {'toàn bộ lịch sử':>16} {'assemble_prompt':>16}  (token ước lượng)")
+    history = []
+    for turns in range(0, 201):
+        if turns in (0, 1, 5, 10, 50, 200):
+            full = [{"role": "system", "content": SYSTEM_PROMPT}, *history, {"role": "user", "content": QUESTION}]
+            bounded = assemble_prompt(SYSTEM_PROMPT, history, QUESTION, args.budget)
+            print(f"{turns:6} {prompt_tokens(full):16} {prompt_tokens(bounded):16}")
+        history += [{"role": "user", "content": QUESTION}, {"role": "assistant", "content": ANSWER}]
+
+    workdir = tempfile.mkdtemp(prefix="ruby-conversation-")
+    try:
+        for memory in (InProcessMemory(), SQLiteMemory(os.path.join(workdir, "conversations.db"))):
+            name = type(memory).__name__
+            append_us = per_op_us(lambda i: memory.append(f"s{i % 100}", QUESTION, ANSWER), args.ops)
+            history_us = per_op_us(lambda i: memory.history(f"s{i % 100}"), args.ops)
+            print(f"{name:16} append {append_us:8.1f} µs   history {history_us:8.1f} µs   {memory.stats()}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
@@ -0,0 +1,102 @@
+"""
+Đo độ chính xác định tuyến và độ trễ mỗi tin nhắn của intent_router
+so với chuỗi if cũ trong chat_endpoint (handle_device_command -> parse_reminder -> "in").
+
+    cd backend && python bench/bench_intents.py
+
+Thời gian của router đã gồm cả trích xuất slot (thành phố, ngày cho weather;
+thời điểm cho reminder) mà chuỗi cũ không làm.
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from handle_device_command import extract_level  # noqa: E402
+from intent_router import IntentRouter, register_default_intents, route  # noqa: E402
+from time_utils import parse_reminder  # noqa: E402
+from corpus import INTENT_MESSAGES, SHADOWED_INTENT_MESSAGES, SHADOWED_RULES  # noqa: E402
+
+
+def legacy_handle_device_command(message):
+    """Chuỗi if cũ của handle_device_command; chỉ giữ điều kiện (câu trả lời nay nằm ở device_reply)."""
+    msg = message.lower()
+    if "bật đèn" in msg or "bật flash" in msg or "tắt đèn" in msg or "tắt flash" in msg:
+        return True
+    if "bật thông báo" in msg or "tắt thông báo" in msg:
+        return True
+    if "âm lượng" in msg:
+        return ("tăng" in msg or "giảm" in msg or "tắt" in msg or "bật" in msg
+                or extract_level(msg) is not None)
+    if "độ sáng" in msg:
+        return "tăng" in msg or "giảm" in msg or extract_level(msg) is not None
+    return "mở điều hướng" in msg or "mở thanh điều hướng" in msg
+
+
+def legacy_route(message):
+    """Chuỗi kiểm tra cũ; chỉ phân biệt được device/reminder/time/date/LLM."""
+    if legacy_handle_device_command(message):
+        return "device"
+    dt, _ = parse_reminder(message)
+    if dt:
+        return "reminder"
+    if "mấy giờ" in message:
+        return "time"
+    if "ngày mấy" in message:
+        return "date"
+    return None
+
+
+def router_route(message):
+    intent = route(message)
+    return intent.name if intent else None
+
+
+def coarse(label):
+    return label.split(".")[0] if label else None
+
+
+def per_message_us(fn, messages=None, repeat=5, number=200):
+    messages = messages or [m for m, _ in INTENT_MESSAGES]
+
+    def loop():
+        for m in messages:
+            fn(m)
+    return min(timeit.repeat(loop, repeat=repeat, number=number)) / (number * len(messages)) * 1e6
+
+
+if __name__ == "__main__":
+    total = len(INTENT_MESSAGES)
+    misses = [(m, exp, router_route(m)) for m, exp in INTENT_MESSAGES if router_route(m) != exp]
+    legacy_ok = sum(coarse(exp) == legacy_route(m) for m, exp in INTENT_MESSAGES)
+    router_coarse_ok = sum(coarse(exp) == coarse(router_route(m)) for m, exp in INTENT_MESSAGES)
+
+    print(f"{'':10} {'µs/msg':>10} {'accuracy':>10} {'coarse acc':>11}")
+    print(f"{'legacy':10} {per_message_us(legacy_route):10.2f} {'-':>10} {legacy_ok / total:11.0%}")
+    print(f"{'router':10} {per_message_us(router_route):10.2f} "
+          f"{(total - len(misses)) / total:10.0%} {router_coarse_ok / total:11.0%}")
+
+    by_label = {}
+    for message, expected in INTENT_MESSAGES:
+        by_label.setdefault(expected or "llm", []).append(message)
+    print(f"\n{'intent':22} {'legacy µs':>10} {'router µs':>10}")
+    for label, messages in by_label.items():
+        print(f"{label:22} {per_message_us(legacy_route, messages):10.2f} "
+              f"{per_message_us(router_route, messages):10.2f}")
+
+    for message, expected, got in misses:
+        print(f"  miss: {message!r} expected={expected} got={got}")
+
+    # Rule trùng vị trí với rule ưu tiên hơn (xem SHADOWED_RULES)
+    router = register_default_intents(IntentRouter())
+    for name, pattern in SHADOWED_RULES:
+        router.register(name, pattern, speak=False)
+    shadowed_ok = 0
+    for message, expected in SHADOWED_INTENT_MESSAGES:
+        intent = router.route(message)
+        got = intent.name if intent else None
+        shadowed_ok += got == expected
+        if got != expected:
+            print(f"  miss (shadowed): {message!r} expected={expected} got={got}")
+    print(f"\nrule bị che cùng vị trí: {shadowed_ok}/{len(SHADOWED_INTENT_MESSAGES)} đúng")
@@ -0,0 +1,54 @@
+"""
+Độ trễ /chat nhánh LLM khi có và không có cache câu trả lời.
+LLM được giả lập bằng một hàm ngủ --llm-ms mili giây.
+
+    cd backend && python bench/bench_llm_cache.py
+"""
+import argparse
+import os
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llm_cache import LLMResponseCache, normalize_message  # noqa: E402
+
+MODEL = "nousresearch/deephermes-3-llama-3-8b-preview:free"
+SYSTEM_PROMPT = "Bạn là Ruby"
+
+# Các cách gõ khác nhau của cùng một câu hỏi
+VARIANTS = ["Bạn là ai?", "bạn là ai", "ban la ai", "  Bạn   là ai ?!", "BẠN LÀ AI..."]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--llm-ms", type=float, default=1500)
+    args = parser.parse_args()
+
+    calls = []
+
+    def fake_llm():
+        calls.append(1)
+        time.sleep(args.llm_ms / 1000)
+        return "Mình là Ruby, trợ lý ảo của bạn."
+
+    cache = LLMResponseCache(ttl=3600, max_entries=1024)
+
+    started = time.perf_counter()
+    for message in VARIANTS:
+        key = cache.key_for(MODEL, SYSTEM_PROMPT, message)
+        cache.get_or_load(key, fake_llm)
+    elapsed = (time.perf_counter() - started) * 1000
+    print(f"{len(VARIANTS)} biến thể -> {len({normalize_message(m) for m in VARIANTS})} key, "
+          f"{len(calls)} lần gọi LLM, tổng {elapsed:.0f} ms")
+
+    hit_us = min(timeit.repeat(lambda: cache.get_or_load(cache.key_for(MODEL, SYSTEM_PROMPT, "Bạn là ai?"),
+                                                         fake_llm),
+                               repeat=5, number=20_000)) / 20_000 * 1e6
+    print(f"{'miss (LLM giả lập)':24} {args.llm_ms * 1000:10.1f} µs")
+    print(f"{'hit (chuẩn hoá + tra)':24} {hit_us:10.1f} µs")
+
+    skipped = cache.key_for(MODEL, SYSTEM_PROMPT, "giá vàng hôm nay bao nhiêu")
+    print(f"câu hỏi theo thời gian được cache: {skipped is not None}")
+    print(cache.stats())
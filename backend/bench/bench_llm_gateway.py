@@ -0,0 +1,80 @@
+"""
+Hành vi của LLMGateway khi OpenRouter xuống cấp (dùng server giả lập, không cần mạng):
+  1. upstream chậm: request vượt quá sức chứa bị từ chối sau tối đa --wait-timeout giây;
+  2. upstream lỗi 503 liên tục: circuit mở sau --failures lỗi, các lần gọi sau bị từ chối ngay;
+  3. upstream hồi phục: sau --reset giây một request thử (nửa mở) đóng lại circuit.
+
+    cd backend && python bench/bench_llm_gateway.py
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from fake_openrouter import start_fake_openrouter  # noqa: E402
+from http_clients import UpstreamClient  # noqa: E402
+from llm_gateway import CircuitBreaker, LLMGateway, LLMUnavailable  # noqa: E402
+from loadtest import percentile  # noqa: E402
+
+PAYLOAD = {"model": "fake", "messages": [{"role": "user", "content": "xin chào"}]}
+
+
+def call(gateway, client):
+    """(kết quả, ms): "ok", "error" (upstream lỗi) hoặc lý do bị gateway từ chối."""
+    start = time.perf_counter()
+    try:
+        with gateway.slot():
+            client.post("chat/completions", json=PAYLOAD).raise_for_status()
+        outcome = "ok"
+    except LLMUnavailable as e:
+        outcome = e.reason
+    except Exception:
+        outcome = "error"
+    return outcome, (time.perf_counter() - start) * 1000
+
+
+def report(title, results):
+    print(title)
+    for outcome in sorted({o for o, _ in results}):
+        latencies = sorted(ms for o, ms in results if o == outcome)
+        print(f"  {outcome:14} {len(latencies):4} lần  p50 {percentile(latencies, 0.5):9.2f} ms"
+              f"  max {latencies[-1]:9.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--callers", type=int, default=32)
+    parser.add_argument("--slow-ms", type=int, default=2000)
+    parser.add_argument("--max-concurrent", type=int, default=4)
+    parser.add_argument("--max-waiting", type=int, default=8)
+    parser.add_argument("--wait-timeout", type=float, default=1.0)
+    parser.add_argument("--failures", type=int, default=5)
+    parser.add_argument("--reset", type=float, default=2.0)
+    args = parser.parse_args()
+
+    server, url = start_fake_openrouter(first_token_ms=args.slow_ms, token_ms=0)
+    handler = server.RequestHandlerClass
+    client = UpstreamClient("openrouter", url, read_timeout=30)
+    gateway = LLMGateway(CircuitBreaker("openrouter", args.failures, args.reset),
+                         max_concurrent=args.max_concurrent, max_waiting=args.max_waiting,
+                         wait_timeout=args.wait_timeout)
+
+    with ThreadPoolExecutor(max_workers=args.callers) as pool:
+        results = list(pool.map(lambda _: call(gateway, client), range(args.callers)))
+    report(f"1) upstream chậm {args.slow_ms} ms, {args.callers} request đồng thời:", results)
+
+    handler.first_token_ms = 100
+    handler.error_rate = 1.0
+    results = [call(gateway, client) for _ in range(args.failures + 20)]
+    report(f"2) upstream trả 503 liên tục ({args.failures + 20} request nối tiếp):", results)
+    print(f"  circuit: {gateway.breaker.stats()}")
+
+    handler.error_rate = 0.0
+    time.sleep(args.reset)
+    results = [call(gateway, client) for _ in range(5)]
+    report(f"3) upstream hồi phục, sau {args.reset} s:", results)
+    print(f"  circuit: {gateway.breaker.stats()}")
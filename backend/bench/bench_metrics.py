@@ -0,0 +1,42 @@
+"""
+Chi phí ghi một mẫu vào metrics (phải ở mức micro giây để bật thường trực).
+
+    cd backend && python bench/bench_metrics.py
+"""
+import os
+import sys
+import threading
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from metrics import Counter, Histogram, Registry  # noqa: E402
+
+
+def per_call_us(stmt, number=200_000):
+    return min(timeit.repeat(stmt, repeat=5, number=number)) / number * 1e6
+
+
+if __name__ == "__main__":
+    registry = Registry()
+    histogram = Histogram("bench_seconds", "bench", ["endpoint", "stage"], registry=registry)
+    counter = Counter("bench_events", "bench", ["upstream", "status"], registry=registry)
+
+    def timed():
+        with histogram.time("chat", "llm"):
+            pass
+
+    print(f"{'Histogram.observe':24} {per_call_us(lambda: histogram.observe(0.042, 'chat', 'llm')):6.2f} µs")
+    print(f"{'Histogram.time':24} {per_call_us(timed):6.2f} µs")
+    print(f"{'Counter.inc':24} {per_call_us(lambda: counter.inc('openrouter', '200')):6.2f} µs")
+
+    # Nhiều luồng ghi cùng lúc không được mất mẫu
+    threads = [threading.Thread(target=lambda: [counter.inc("x", "1") for _ in range(50_000)])
+               for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    total = counter.collect()[("x", "1")]
+    print(f"{'8 luồng x 50000 inc':24} {total} ({'đủ' if total == 400_000 else 'MẤT MẪU'})")
+    print(f"{'render':24} {per_call_us(registry.render, number=200):6.2f} µs")
@@ -0,0 +1,74 @@
+"""
+Thời gian import main (đường khởi động của mỗi worker), đo bằng `python -X importtime`
+trong process mới, lấy trung vị của --runs lần. In các module tốn thời gian nhất
+để thấy ngay module nào vừa bị kéo vào đường khởi động.
+
+    cd backend && python bench/bench_startup.py
+    python bench/bench_startup.py --max-ms 800   # thoát mã 1 nếu chậm hơn ngưỡng (dùng cho CI)
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORTTIME_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+
+
+def run_once(workdir):
+    env = {
+        **os.environ,
+        # Chỉ đo import: không tạo luồng nền, không chạm DB (giống worker gunicorn trước post_fork)
+        "DEFER_PROCESS_START": "1",
+        "APPOINTMENTS_DB_URI": "sqlite:///" + os.path.join(workdir, "appointments.db"),
+        "NOTES_DB_PATH": os.path.join(workdir, "notes.db"),
+        "AUDIO_FOLDER": os.path.join(workdir, "audio"),
+        "LEADER_DB_PATH": os.path.join(workdir, "leader.db"),
+    }
+    code = "import time; t = time.perf_counter(); import main; print('IMPORT_SECONDS', time.perf_counter() - t)"
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=BACKEND_DIR,
+                            env=env, capture_output=True, text=True, check=True)
+    modules = []
+    for line in result.stderr.splitlines():
+        m = IMPORTTIME_RE.match(line)
+        if m:
+            self_us, cumulative_us, indent, name = m.groups()
+            modules.append({"module": name, "depth": len(indent) // 2,
+                            "self_ms": int(self_us) / 1000, "cumulative_ms": int(cumulative_us) / 1000})
+    # Bản cũ của main có thể in log từ luồng nền chen vào stdout
+    wall_ms = float(re.search(r"IMPORT_SECONDS (\S+)", result.stdout).group(1)) * 1000
+    return wall_ms, modules
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--max-ms", type=float, default=None)
+    parser.add_argument("--out", help="ghi kết quả JSON ra file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        runs = [run_once(workdir) for _ in range(args.runs)]
+    # median_low: luôn là một lần chạy thật, để bảng module bên dưới khớp với con số in ra
+    wall_ms = statistics.median_low(wall for wall, _ in runs)
+    modules = next(m for wall, m in runs if wall == wall_ms)
+
+    # Chỉ các module được main (hoặc module của app) kéo vào trực tiếp: depth 1 dưới "main"
+    direct = sorted((m for m in modules if m["depth"] == 1), key=lambda m: -m["cumulative_ms"])
+    print(f"import main: {wall_ms:.1f} ms (trung vị của {args.runs} lần)")
+    print(f"{'module':32} {'tích luỹ ms':>12} {'riêng ms':>10}")
+    for m in direct[:args.top]:
+        print(f"{m['module']:32} {m['cumulative_ms']:12.1f} {m['self_ms']:10.1f}")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"import_ms": wall_ms, "modules": modules}, f, ensure_ascii=False, indent=2)
+    if args.max_ms is not None and wall_ms > args.max_ms:
+        print(f"❌ import main chậm hơn ngưỡng {args.max_ms:.0f} ms")
+        sys.exit(1)
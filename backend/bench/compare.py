@@ -0,0 +1,53 @@
+"""
+So sánh hai file kết quả của loadtest.py (ví dụ trước và sau một thay đổi).
+
+    python bench/compare.py before.json after.json
+
+Với mỗi mức đồng thời in throughput và p50/p95/p99 của từng endpoint / công đoạn,
+kèm phần trăm thay đổi (độ trễ âm = nhanh hơn, throughput dương = tốt hơn).
+"""
+import argparse
+import json
+
+METRICS = ("throughput_rps", "p50_ms", "p95_ms", "p99_ms")
+
+
+def change(old, new):
+    if old in (None, 0) or new is None:
+        return "     -"
+    return f"{(new - old) / old * 100:+6.1f}%"
+
+
+def load(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare(base, head):
+    base_levels = {level["concurrency"]: level for level in base["levels"]}
+    for level in head["levels"]:
+        old_level = base_levels.get(level["concurrency"])
+        if old_level is None:
+            continue
+        print(f"\n== concurrency {level['concurrency']}: "
+              f"{old_level['throughput_rps']} -> {level['throughput_rps']} req/s "
+              f"({change(old_level['throughput_rps'], level['throughput_rps']).strip()})")
+        print(f"{'':20}" + "".join(f" {m:>26}" for m in METRICS))
+        for section in ("endpoints", "stages"):
+            for name, new in level[section].items():
+                old = old_level[section].get(name)
+                if old is None:
+                    continue
+                cells = "".join(f" {str(old[m]):>8} -> {str(new[m]):>8} {change(old[m], new[m])}"
+                                for m in METRICS)
+                print(f"{name:20}{cells}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="So sánh hai kết quả loadtest")
+    parser.add_argument("base")
+    parser.add_argument("head")
+    args = parser.parse_args()
+    base, head = load(args.base), load(args.head)
+    print(f"base: {base['meta'].get('commit')}  head: {head['meta'].get('commit')}")
+    compare(base, head)
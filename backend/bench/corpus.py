@@ -0,0 +1,97 @@
+"""Tin nhắn tiếng Việt thực tế dùng chung cho các script benchmark."""
+
+# (tin nhắn, tỉnh/thành mong đợi hoặc None)
+CITY_MESSAGES = [
+    ("thời tiết hà nội hôm nay thế nào", "Hà Nội"),
+    ("thoi tiet ha noi ngay mai", "Hà Nội"),
+    ("hn có mưa không", "Hà Nội"),
+    ("sài gòn hôm nay nóng không", "TP Hồ Chí Minh"),
+    ("thời tiết tp hcm ngày mốt", "TP Hồ Chí Minh"),
+    ("thời tiết thành phố hồ chí minh hiện tại", "TP Hồ Chí Minh"),
+    ("đà nẵng có bão không", "Đà Nẵng"),
+    ("thoi tiet da nang thu 7", "Đà Nẵng"),
+    ("huế mưa không bạn", "Huế"),
+    ("thời tiết thừa thiên huế ngày 20/10", "Huế"),
+    ("đà lạt tối nay lạnh không", "Lâm Đồng"),
+    ("nha trang cuối tuần có nắng không", "Khánh Hòa"),
+    ("phú quốc có mưa không", "Kiên Giang"),
+    ("thời tiết hạ long ngày mai", "Quảng Ninh"),
+    ("vịnh hạ long hôm nay có sóng lớn không", "Quảng Ninh"),
+    ("vũng tàu chủ nhật trời sao", "Bà Rịa - Vũng Tàu"),
+    ("cần thơ hôm nay ra sao", "Cần Thơ"),
+    ("hải phòng có mưa không", "Hải Phòng"),
+    ("thời tiết vĩnh long", "Vĩnh Long"),
+    ("thời tiết vinh nghệ an", "Nghệ An"),
+    ("bắc ninh nắng không", "Bắc Ninh"),
+    ("thời tiết bình dương ngày mai", "Bình Dương"),
+    ("đồng nai hôm nay có mưa à", "Đồng Nai"),
+    ("trời ở lào cai bây giờ thế nào", "Lào Cai"),
+    ("sapa lào cai có tuyết không", "Lào Cai"),
+    ("thời tiết quảng ngãi", "Quảng Ngãi"),
+    ("cà mau mưa không", "Cà Mau"),
+    ("thời tiết đắk lắk ngày 5 tháng 11", "Đắk Lắk"),
+    ("gia lai có nắng không", "Gia Lai"),
+    ("kon tum trời sao", "Kon Tum"),
+    ("thời tiết thanh hóa thứ hai", "Thanh Hóa"),
+    ("thời tiết hôm nay", None),
+    ("trời có mưa không", None),
+    ("ngày mai nắng không", None),
+    ("nhắc tôi uống nước sau 10 phút", None),
+    ("bật đèn pin", None),
+    ("mấy giờ rồi", None),
+    ("john ơi hôm nay trời đẹp quá", None),
+    ("tạo ghi chú mua sữa cho con", None),
+    ("kể cho tôi một câu chuyện cười", None),
+    ("bạn là ai vậy", None),
+]
+
+# (tin nhắn đã chữ thường, intent mong đợi; None = chuyển cho LLM)
+INTENT_MESSAGES = [
+    ("bật đèn pin giúp tôi", "device.flash"),
+    ("tắt flash đi", "device.flash"),
+    ("bật thông báo", "device.notification"),
+    ("tắt thông báo giúp mình", "device.notification"),
+    ("tăng âm lượng lên", "device.volume"),
+    ("giảm âm lượng", "device.volume"),
+    ("chỉnh âm lượng đến 40%", "device.volume"),
+    ("tăng độ sáng màn hình", "device.brightness"),
+    ("đặt độ sáng mức 70 phần trăm", "device.brightness"),
+    ("mở thanh điều hướng", "device.navigation"),
+    ("nhắc tôi uống nước sau 10 phút", "reminder"),
+    ("nhắc giúp tôi gọi mẹ trong 2 giờ nữa", "reminder"),
+    ("sau 30 phút nhắc tôi tắt bếp", "reminder"),
+    ("15 phút nữa nhắc tôi đi học", "reminder"),
+    ("làm ơn nhắc tôi họp sau 1 ngày", "reminder"),
+    ("bây giờ là mấy giờ", "time"),
+    ("mấy giờ rồi bạn", "time"),
+    ("hôm nay là ngày mấy", "date"),
+    ("ngày mấy rồi", "date"),
+    ("thời tiết hà nội hôm nay", "weather"),
+    ("ngày mai sài gòn có mưa không", "weather"),
+    ("nhiệt độ đà nẵng bây giờ", "weather"),
+    ("chiều nay có nắng không", "weather"),
+    ("tạo ghi chú mua sữa cho con", "note"),
+    ("thêm ghi chú họp lớp thứ 7", "note"),
+    ("bạn là ai", None),
+    ("xin chào ruby", None),
+    ("kể chuyện cười đi", None),
+    ("thủ đô của pháp là gì", None),
+    ("dịch giúp tôi câu good morning", None),
+    ("viết một bài thơ ngắn về mùa thu", None),
+    ("làm sao để học tiếng anh nhanh", None),
+    ("cảm ơn bạn nhiều", None),
+    ("1 cộng 1 bằng mấy", None),
+    # Rule ưu tiên hơn khớp nhưng slot trả về None: rule sau vẫn được thử
+    ("âm lượng thế nào, thời tiết huế ra sao", "weather"),
+    ("nhắc tôi xem thời tiết cần thơ", "weather"),
+]
+
+# Rule thêm sau bảng mặc định, khớp cùng vị trí với "âm lượng": chỉ được chọn khi slot của
+# device.volume trả về None (câu hỏi, không phải lệnh)
+SHADOWED_RULES = [("device.volume.query", r"âm lượng (?:bao nhiêu|hiện tại|thế nào)")]
+SHADOWED_INTENT_MESSAGES = [
+    ("âm lượng bao nhiêu rồi", "device.volume.query"),
+    ("âm lượng hiện tại thế nào", "device.volume.query"),
+    ("tăng âm lượng lên", "device.volume"),
+    ("âm lượng thế nào, giảm bớt đi", "device.volume"),
+]
@@ -0,0 +1,124 @@
+"""
+Server giả lập OpenRouter (/api/v1/chat/completions) để chạy và đo /chat
+khi không có mạng. Hỗ trợ cả trả lời thường lẫn "stream": true (SSE).
+
+    python bench/fake_openrouter.py --port 8901 --first-token-ms 400 --token-ms 30
+    OPENROUTER_BASE_URL=http://127.0.0.1:8901/api/v1 python main.py
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_REPLY = (
+    "Chào bạn, mình là Ruby. Hôm nay trời Hà Nội nắng nhẹ, khoảng 30 độ. "
+    "Bạn nhớ mang theo nước và kem chống nắng nhé! Chúc bạn một ngày vui vẻ."
+)
+
+
+def split_tokens(text):
+    # Cắt theo từ, giữ khoảng trắng phía trước giống token thật của LLM
+    words = text.split(" ")
+    return [words[0]] + [" " + w for w in words[1:]]
+
+
+def send_json(handler, status, data):
+    body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+    handler.send_response(status)
+    handler.send_header("Content-Type", "application/json")
+    handler.send_header("Content-Length", str(len(body)))
+    handler.end_headers()
+    handler.wfile.write(body)
+
+
+class FakeOpenRouterHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # header và body gửi riêng, tránh trễ 40 ms do delayed ACK
+    reply = DEFAULT_REPLY
+    first_token_ms = 300
+    token_ms = 20
+    error_rate = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        time.sleep(self.first_token_ms / 1000)
+        if random.random() < self.error_rate:
+            send_json(self, 503, {"error": {"code": 503, "message": "fake upstream error"}})
+            return
+        if payload.get("stream"):
+            self._send_stream(payload)
+        else:
+            time.sleep(self.token_ms * len(split_tokens(self.reply)) / 1000)
+            send_json(self, 200, {
+                "id": "gen-fake",
+                "model": payload.get("model"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": self.reply}}],
+            })
+
+    def _send_stream(self, payload):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        self._write_chunk(": OPENROUTER PROCESSING\n\n")
+        for token in split_tokens(self.reply):
+            chunk = {
+                "id": "gen-fake",
+                "model": payload.get("model"),
+                "choices": [{"index": 0, "delta": {"content": token}}],
+            }
+            self._write_chunk(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n")
+            time.sleep(self.token_ms / 1000)
+        self._write_chunk("data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, text):
+        data = text.encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+
+class QuietThreadingHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        pass  # client đóng kết nối keep-alive giữa chừng là bình thường
+
+
+def serve_in_background(handler_cls, port=0, **attrs):
+    """Chạy handler (với các thuộc tính cấu hình) ở luồng nền, trả về (server, "http://host:port")."""
+    handler = type(handler_cls.__name__, (handler_cls,), attrs)
+    server = QuietThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def start_fake_openrouter(port=0, reply=DEFAULT_REPLY, first_token_ms=300, token_ms=20, error_rate=0.0):
+    """Chạy server ở luồng nền, trả về (server, base URL dùng cho OPENROUTER_BASE_URL)."""
+    server, root = serve_in_background(
+        FakeOpenRouterHandler, port,
+        reply=reply, first_token_ms=first_token_ms, token_ms=token_ms, error_rate=error_rate,
+    )
+    return server, root + "/api/v1"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake OpenRouter server")
+    parser.add_argument("--port", type=int, default=8901)
+    parser.add_argument("--first-token-ms", type=int, default=300)
+    parser.add_argument("--token-ms", type=int, default=20)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--reply", default=DEFAULT_REPLY)
+    args = parser.parse_args()
+    server, url = start_fake_openrouter(args.port, args.reply, args.first_token_ms, args.token_ms, args.error_rate)
+    print(f"🤖 Fake OpenRouter: {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,92 @@
+"""
+Server giả lập OpenWeather (/data/2.5/weather và /data/2.5/forecast) để chạy
+/weather và intent thời tiết khi không có mạng. Độ trễ và tỉ lệ lỗi cấu hình được.
+
+    python bench/fake_openweather.py --port 8902 --latency-ms 150 --error-rate 0.02
+    OPENWEATHER_BASE_URL=http://127.0.0.1:8902/data/2.5 python main.py
+"""
+import argparse
+import random
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import parse_qs, urlsplit
+
+from fake_openrouter import send_json, serve_in_background
+
+DESCRIPTIONS = ["trời quang", "mây thưa", "mây rải rác", "mưa nhẹ", "mưa vừa", "có giông"]
+
+
+def fake_conditions(city, when):
+    """Thời tiết giả nhưng ổn định theo (thành phố, thời điểm) để kết quả lặp lại được."""
+    seed = zlib.crc32(f"{city}|{when:%Y%m%d%H}".encode("utf-8"))
+    rng = random.Random(seed)
+    return {
+        "weather": [{"id": 800, "main": "Clouds", "description": rng.choice(DESCRIPTIONS)}],
+        "main": {"temp": round(rng.uniform(22, 36), 2), "humidity": rng.randint(55, 95)},
+        "wind": {"speed": round(rng.uniform(0.5, 8), 2)},
+    }
+
+
+class FakeOpenWeatherHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # header và body gửi riêng, tránh trễ 40 ms do delayed ACK
+    latency_ms = 150
+    error_rate = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        city = parse_qs(url.query).get("q", [""])[0]
+        time.sleep(self.latency_ms / 1000)
+        if random.random() < self.error_rate:
+            send_json(self, 503, {"cod": 503, "message": "fake upstream error"})
+        elif not city:
+            send_json(self, 404, {"cod": "404", "message": "city not found"})
+        elif url.path.endswith("/weather"):
+            now = datetime.now(timezone.utc)
+            send_json(self, 200, {"name": city, "cod": 200, **fake_conditions(city, now)})
+        elif url.path.endswith("/forecast"):
+            send_json(self, 200, self._forecast(city))
+        else:
+            send_json(self, 404, {"cod": "404", "message": "not found"})
+
+    def _forecast(self, city):
+        # 40 mốc cách nhau 3 giờ (UTC) như API thật: đủ 5 ngày tới
+        now = datetime.now(timezone.utc)
+        start = now.replace(minute=0, second=0, microsecond=0) + timedelta(hours=3 - now.hour % 3)
+        items = []
+        for i in range(40):
+            when = start + timedelta(hours=3 * i)
+            items.append({
+                "dt": int(when.timestamp()),
+                "dt_txt": when.strftime("%Y-%m-%d %H:%M:%S"),
+                **fake_conditions(city, when),
+            })
+        return {"cod": "200", "cnt": len(items), "list": items, "city": {"name": city}}
+
+
+def start_fake_openweather(port=0, latency_ms=150, error_rate=0.0):
+    """Chạy server ở luồng nền, trả về (server, base URL dùng cho OPENWEATHER_BASE_URL)."""
+    server, root = serve_in_background(
+        FakeOpenWeatherHandler, port, latency_ms=latency_ms, error_rate=error_rate,
+    )
+    return server, root + "/data/2.5"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake OpenWeather server")
+    parser.add_argument("--port", type=int, default=8902)
+    parser.add_argument("--latency-ms", type=int, default=150)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    server, url = start_fake_openweather(args.port, args.latency_ms, args.error_rate)
+    print(f"🌤️ Fake OpenWeather: {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,95 @@
+"""
+Server giả lập dịch vụ TTS của Google mà gTTS gọi tới. gTTS không cho đổi URL,
+nên benchmark thay hàm tải của ChunkedSynthesizer bằng http_fetch_chunk(url)
+(hoặc TTSCache.synthesize bằng http_synthesize(url)) để vẫn đi qua HTTP thật.
+Google xử lý tối đa ~100 ký tự mỗi request; văn bản dài hơn bị tính như nhiều
+đoạn gọi nối tiếp: latency_ms cho mỗi đoạn.
+
+    python bench/fake_tts.py --port 8903 --latency-ms 250
+"""
+import argparse
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+import requests
+
+from fake_openrouter import send_json, serve_in_background
+
+CHUNK_CHARS = 100
+# Một frame MPEG-1 Layer III 128 kbit/s 44.1 kHz (~26 ms âm thanh), phần dữ liệu để trống
+MP3_FRAME = b"\xff\xfb\x90\x64" + bytes(413)
+FRAMES_PER_CHAR = 3
+
+
+class FakeTTSHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # header và body gửi riêng, tránh trễ 40 ms do delayed ACK
+    latency_ms = 250
+    error_rate = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        text = payload.get("text", "")
+        chunks = max(1, math.ceil(len(text) / CHUNK_CHARS))
+        time.sleep(self.latency_ms * chunks / 1000)
+        if random.random() < self.error_rate:
+            send_json(self, 503, {"error": "fake upstream error"})
+            return
+        body = MP3_FRAME * (FRAMES_PER_CHAR * max(1, len(text)))
+        self.send_response(200)
+        self.send_header("Content-Type", "audio/mpeg")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def http_synthesize(url, session=None):
+    """Hàm synthesize(text, lang, tld, filepath) dùng được cho TTSCache, gọi tới fake TTS."""
+    session = session or requests.Session()
+
+    def synthesize(text, lang, tld, filepath):
+        res = session.post(url, json={"text": text, "lang": lang, "tld": tld}, timeout=30)
+        res.raise_for_status()
+        with open(filepath, "wb") as f:
+            f.write(res.content)
+
+    return synthesize
+
+
+def http_fetch_chunk(url, session=None):
+    """Hàm fetch_chunk(chunk, lang, tld) -> bytes dùng cho ChunkedSynthesizer, gọi tới fake TTS."""
+    session = session or requests.Session()
+
+    def fetch_chunk(chunk, lang, tld):
+        res = session.post(url, json={"text": chunk, "lang": lang, "tld": tld}, timeout=30)
+        res.raise_for_status()
+        return res.content
+
+    return fetch_chunk
+
+
+def start_fake_tts(port=0, latency_ms=250, error_rate=0.0):
+    """Chạy server ở luồng nền, trả về (server, URL dùng cho http_fetch_chunk / http_synthesize)."""
+    server, root = serve_in_background(FakeTTSHandler, port, latency_ms=latency_ms, error_rate=error_rate)
+    return server, root + "/tts"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake TTS server")
+    parser.add_argument("--port", type=int, default=8903)
+    parser.add_argument("--latency-ms", type=int, default=250)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    server, url = start_fake_tts(args.port, args.latency_ms, args.error_rate)
+    print(f"🔊 Fake TTS: {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,290 @@
+"""
+Benchmark đầu-cuối cho backend, chạy hoàn toàn offline: Flask app (main.py) được
+khởi động trong process này với DB và thư mục âm thanh tạm, gọi tới các server giả
+lập OpenRouter / OpenWeather / TTS có độ trễ và tỉ lệ lỗi cấu hình được.
+
+    cd backend && python bench/loadtest.py --concurrency 1,4,16 --requests 300 --out before.json
+    python bench/compare.py before.json after.json
+
+Mỗi mức đồng thời chạy cùng một chuỗi request (seed cố định) trộn /chat, /weather,
+/note và /appointment với tin nhắn tiếng Việt trong corpus.py. Kết quả JSON gồm
+throughput và p50/p95/p99 cho từng endpoint và từng công đoạn bên trong:
+
+    intent    định tuyến intent (intent_router.route)
+    llm       gọi OpenRouter (kể cả retry)
+    weather   gọi OpenWeather (chỉ khi cache miss)
+    tts       tổng hợp giọng nói ở worker TTS (chỉ khi cache miss)
+    tts_chunk tải một đoạn ~100 ký tự (chỉ khi cache đoạn miss)
+    audio     đưa câu trả lời vào hàng đợi TTS (queue_reply_audio)
+    notes_db  đọc/ghi notes.db
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import requests  # noqa: E402
+from corpus import CITY_MESSAGES, INTENT_MESSAGES  # noqa: E402
+from fake_openrouter import start_fake_openrouter  # noqa: E402
+from fake_openweather import start_fake_openweather  # noqa: E402
+from fake_tts import http_fetch_chunk, start_fake_tts  # noqa: E402
+
+NOTE_CONTENTS = [
+    "tạo ghi chú mua sữa và bánh mì",
+    "tạo ghi chú họp nhóm lúc 3 giờ chiều",
+    "tạo ghi chú gọi điện cho mẹ",
+    "tạo ghi chú đóng tiền điện tháng này",
+    "tạo ghi chú đặt vé xe về quê",
+    "tạo ghi chú đọc xong chương 5",
+]
+NOTE_QUERIES = ["sữa", "họp", "tien dien", "về quê", "đọc"]
+
+# (tên endpoint, trọng số, hàm sinh request từ rng)
+WORKLOAD = [
+    ("POST /chat", 6, lambda rng: ("POST", "/chat", {"message": rng.choice(INTENT_MESSAGES)[0]})),
+    ("POST /weather", 2, lambda rng: ("POST", "/weather", {"message": rng.choice(CITY_MESSAGES)[0]})),
+    ("POST /note", 1, lambda rng: ("POST", "/note", {"content": rng.choice(NOTE_CONTENTS)})),
+    ("GET /note", 1, lambda rng: ("GET", "/note?limit=20", None)),
+    ("GET /note?q", 1, lambda rng: ("GET", f"/note?q={rng.choice(NOTE_QUERIES)}", None)),
+    ("GET /appointment", 1, lambda rng: ("GET", "/appointment", None)),
+]
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def summarize(samples, wall_seconds):
+    """samples: list (ms, lỗi?) -> số liệu tổng hợp."""
+    latencies = sorted(ms for ms, _ in samples)
+    errors = sum(1 for _, error in samples if error)
+    summary = {
+        "count": len(samples),
+        "errors": errors,
+        "throughput_rps": round(len(samples) / wall_seconds, 2) if wall_seconds else None,
+        "mean_ms": round(sum(latencies) / len(latencies), 2) if latencies else None,
+    }
+    for name, q in (("p50_ms", 0.50), ("p95_ms", 0.95), ("p99_ms", 0.99)):
+        value = percentile(latencies, q)
+        summary[name] = round(value, 2) if value is not None else None
+    summary["max_ms"] = round(latencies[-1], 2) if latencies else None
+    return summary
+
+
+class Recorder:
+    """Gom mẫu độ trễ theo tên (endpoint hoặc công đoạn), an toàn giữa các luồng."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {}
+
+    def record(self, name, elapsed_ms, error=False):
+        with self._lock:
+            self.samples.setdefault(name, []).append((elapsed_ms, error))
+
+    def reset(self):
+        with self._lock:
+            self.samples = {}
+
+    def timed(self, name, fn, is_error=None):
+        """Bọc fn để ghi thời gian mỗi lần gọi vào công đoạn name."""
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception:
+                self.record(name, (time.perf_counter() - start) * 1000, error=True)
+                raise
+            error = bool(is_error and is_error(result))
+            self.record(name, (time.perf_counter() - start) * 1000, error=error)
+            return result
+        return wrapper
+
+
+def git_meta():
+    def git(*args):
+        try:
+            return subprocess.run(["git", *args], cwd=BACKEND_DIR, capture_output=True,
+                                  text=True, timeout=10).stdout.strip()
+        except Exception:
+            return None
+    return {"commit": git("rev-parse", "HEAD"), "dirty": bool(git("status", "--porcelain"))}
+
+
+def start_stack(args, workdir):
+    """Chạy các server giả lập, rồi import main với cấu hình trỏ tới chúng và thư mục tạm."""
+    _, llm_url = start_fake_openrouter(first_token_ms=args.llm_first_token_ms,
+                                       token_ms=args.llm_token_ms, error_rate=args.llm_error_rate)
+    _, weather_url = start_fake_openweather(latency_ms=args.weather_ms, error_rate=args.weather_error_rate)
+    _, tts_url = start_fake_tts(latency_ms=args.tts_ms, error_rate=args.tts_error_rate)
+
+    os.environ.update({
+        "OPENROUTER_BASE_URL": llm_url,
+        "OPENWEATHER_BASE_URL": weather_url,
+        "OPENROUTER_API_KEY": "bench",
+        "OPENWEATHER_API_KEY": "bench",
+        "APPOINTMENTS_DB_URI": "sqlite:///" + os.path.join(workdir, "appointments.db"),
+        "NOTES_DB_PATH": os.path.join(workdir, "notes.db"),
+        "AUDIO_FOLDER": os.path.join(workdir, "audio"),
+    })
+    if args.weather_ttl is not None:
+        os.environ["WEATHER_CURRENT_TTL"] = os.environ["WEATHER_FORECAST_TTL"] = str(args.weather_ttl)
+    os.chdir(workdir)
+
+    import main
+    return main, tts_url
+
+
+def instrument(main, recorder, tts_url):
+    main.tts_engine.fetch_chunk = recorder.timed("tts_chunk", http_fetch_chunk(tts_url))
+    main.tts_cache.synthesize = recorder.timed("tts", main.tts_cache.synthesize)
+    main.queue_reply_audio = recorder.timed("audio", main.queue_reply_audio)
+    main.intent_router.route = recorder.timed("intent", main.intent_router.route)
+    main.openrouter.request = recorder.timed(
+        "llm", main.openrouter.request, lambda res: res.status_code >= 400)
+    main.openweather.request = recorder.timed(
+        "weather", main.openweather.request, lambda res: res.status_code >= 500)
+    for method in ("insert", "all", "page", "search"):
+        setattr(main.notes_store, method, recorder.timed("notes_db", getattr(main.notes_store, method)))
+
+
+def serve(app):
+    from werkzeug.serving import make_server
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def build_requests(count, seed):
+    rng = random.Random(seed)
+    names = [name for name, _, _ in WORKLOAD]
+    weights = [weight for _, weight, _ in WORKLOAD]
+    makers = {name: make for name, _, make in WORKLOAD}
+    return [(name, *makers[name](rng)) for name in rng.choices(names, weights, k=count)]
+
+
+def run_level(base_url, plan, concurrency, recorder):
+    local = threading.local()
+
+    def send(item):
+        name, method, path, body = item
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        start = time.perf_counter()
+        try:
+            res = session.request(method, base_url + path, json=body, timeout=60)
+            error = res.status_code >= 400
+        except requests.RequestException:
+            error = True
+        recorder.record(name, (time.perf_counter() - start) * 1000, error=error)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(send, plan))
+    return time.perf_counter() - start
+
+
+def print_table(results, out):
+    for level in results["levels"]:
+        print(f"\n== concurrency {level['concurrency']}: {level['throughput_rps']} req/s "
+              f"({level['wall_seconds']} s)", file=out)
+        print(f"{'':20} {'count':>6} {'err':>4} {'rps':>8} {'p50':>9} {'p95':>9} {'p99':>9}", file=out)
+        for section in ("endpoints", "stages"):
+            for name, s in level[section].items():
+                print(f"{name:20} {s['count']:6} {s['errors']:4} {s['throughput_rps']:8} "
+                      f"{s['p50_ms']:9} {s['p95_ms']:9} {s['p99_ms']:9}", file=out)
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Offline end-to-end load test")
+    parser.add_argument("--concurrency", default="1,4,16", help="các mức đồng thời, cách nhau dấu phẩy")
+    parser.add_argument("--requests", type=int, default=300, help="số request mỗi mức")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--llm-first-token-ms", type=int, default=300)
+    parser.add_argument("--llm-token-ms", type=int, default=10)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--weather-ms", type=int, default=150)
+    parser.add_argument("--weather-error-rate", type=float, default=0.0)
+    parser.add_argument("--weather-ttl", type=int, default=None,
+                        help="TTL cache thời tiết (giây); 0 = luôn gọi upstream")
+    parser.add_argument("--tts-ms", type=int, default=250, help="độ trễ mỗi request TTS (một đoạn <= 100 ký tự)")
+    parser.add_argument("--tts-error-rate", type=float, default=0.0)
+    parser.add_argument("--out", help="ghi kết quả JSON vào file (mặc định in ra stdout)")
+    parser.add_argument("--keep", action="store_true", help="giữ lại thư mục tạm (DB, audio)")
+    parser.add_argument("--verbose", action="store_true", help="hiện log của app")
+    args = parser.parse_args()
+    levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+
+    workdir = tempfile.mkdtemp(prefix="ruby-loadtest-")
+    out_path = os.path.abspath(args.out) if args.out else None
+    recorder = Recorder()
+    stdout = sys.stdout
+    if not args.verbose:
+        # Log của app (kể cả từ luồng nền) không được lẫn vào JSON, in ra terminal cũng tốn thời gian
+        sys.stdout = open(os.devnull, "w")
+    try:
+        app_module, tts_url = start_stack(args, workdir)
+        instrument(app_module, recorder, tts_url)
+        server, base_url = serve(app_module.app)
+
+        results = {
+            "meta": {
+                **git_meta(),
+                "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "config": {k: v for k, v in vars(args).items() if k not in ("out", "keep", "verbose")},
+            },
+            "levels": [],
+        }
+        # Làm nóng: migration, kết nối, cache; không tính vào kết quả
+        run_level(base_url, build_requests(len(WORKLOAD) * 5, args.seed - 1), 2, recorder)
+        for concurrency in levels:
+            recorder.reset()
+            wall = run_level(base_url, build_requests(args.requests, args.seed), concurrency, recorder)
+            samples = recorder.samples
+            endpoint_names = [name for name, _, _ in WORKLOAD if name in samples]
+            all_requests = [s for name in endpoint_names for s in samples[name]]
+            results["levels"].append({
+                "concurrency": concurrency,
+                "wall_seconds": round(wall, 3),
+                "throughput_rps": round(len(all_requests) / wall, 2),
+                "total": summarize(all_requests, wall),
+                "endpoints": {name: summarize(samples[name], wall) for name in endpoint_names},
+                "stages": {name: summarize(s, wall) for name, s in sorted(samples.items())
+                           if name not in endpoint_names},
+            })
+        server.shutdown()
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print_table(results, sys.stderr)
+    text = json.dumps(results, ensure_ascii=False, indent=2)
+    if out_path:
+        with open(out_path, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        print(f"\n💾 Đã ghi kết quả vào {out_path}", file=sys.stderr)
+    else:
+        print(text, file=stdout)
+
+
+if __name__ == "__main__":
+    main_cli()
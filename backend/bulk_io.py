@@ -0,0 +1,95 @@
+import json
+
+DEFAULT_BATCH_SIZE = 1000
+# Một bản ghi (một dòng NDJSON) không được dài quá chừng này byte
+MAX_LINE_BYTES = 64 * 1024
+READ_SIZE = 64 * 1024
+
+
+class BadRecord(ValueError):
+    """Dòng thứ line của dữ liệu nhập không hợp lệ; imported = số bản ghi đã ghi trước nó."""
+
+    def __init__(self, line, message):
+        super().__init__(f"dòng {line}: {message}")
+        self.line = line
+        self.imported = 0
+
+
+def _iter_lines(stream, max_line_bytes):
+    # readline() của stream WSGI (werkzeug LimitedStream) đọc từng byte một: tự tách dòng
+    # trên các khối READ_SIZE byte, chỉ giữ lại phần dòng còn dở
+    pending = b""
+    while True:
+        chunk = stream.read(READ_SIZE)
+        if not chunk:
+            break
+        lines = (pending + chunk).split(b"\n")
+        pending = lines.pop()
+        yield from lines
+        if len(pending) > max_line_bytes:
+            yield pending  # để iter_ndjson báo lỗi dòng quá dài
+            return
+    if pending:
+        yield pending
+
+
+def iter_ndjson(stream, max_line_bytes=MAX_LINE_BYTES):
+    """
+    (số dòng, dict) cho từng dòng JSON của stream (body request, file, ...).
+    Đọc theo khối nên bộ nhớ không phụ thuộc kích thước dữ liệu; bỏ qua dòng trống.
+    """
+    for line_no, line in enumerate(_iter_lines(stream, max_line_bytes), start=1):
+        if len(line) > max_line_bytes:
+            raise BadRecord(line_no, f"dài quá {max_line_bytes} byte")
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            raise BadRecord(line_no, "không phải JSON hợp lệ")
+        if not isinstance(record, dict):
+            raise BadRecord(line_no, "phải là một object JSON")
+        yield line_no, record
+
+
+def import_ndjson(stream, parse, insert_batch, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Nhập NDJSON theo lô: parse(record) chuyển một bản ghi thành tham số cho câu INSERT
+    (ValueError/KeyError/TypeError nếu sai), insert_batch(rows) ghi cả lô trong một
+    transaction bằng executemany. Trả về số bản ghi đã nhập.
+    Gặp dòng lỗi thì vẫn ghi các dòng hợp lệ trước nó rồi ném BadRecord: client sửa
+    dòng đó và gửi tiếp phần còn lại, không phải nhập lại từ đầu.
+    """
+    batch = []
+    imported = 0
+    try:
+        for line_no, record in iter_ndjson(stream):
+            try:
+                batch.append(parse(record))
+            except (KeyError, TypeError, ValueError) as e:
+                raise BadRecord(line_no, f"bản ghi không hợp lệ ({e})")
+            if len(batch) >= batch_size:
+                insert_batch(batch)
+                imported += len(batch)
+                batch = []
+    except BadRecord as e:
+        if batch:
+            insert_batch(batch)
+            imported += len(batch)
+        e.imported = imported
+        raise
+    if batch:
+        insert_batch(batch)
+        imported += len(batch)
+    return imported
+
+
+def require_text(record, field, max_length=None):
+    """Trường chữ bắt buộc, không rỗng."""
+    value = record[field]
+    if not isinstance(value, str) or not value.strip():
+        raise ValueError(f"{field} phải là chuỗi không rỗng")
+    if max_length is not None and len(value) > max_length:
+        raise ValueError(f"{field} dài quá {max_length} ký tự")
+    return value
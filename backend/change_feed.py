@@ -0,0 +1,125 @@
+import json
+import threading
+import time
+from metrics import FEED_SUBSCRIBERS
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 500
+
+
+class FeedBusy(Exception):
+    """Đã đủ số kết nối chờ thay đổi (SSE/long-poll) cho process này."""
+
+
+class ChangeFeed:
+    """
+    Luồng thay đổi của một bảng có cột version tăng dần (gán trong chính transaction ghi,
+    nên thứ tự version trùng thứ tự commit). Client giữ cursor = version lớn nhất đã nhận:
+    - changes(cursor) trả về đúng các dòng đã đổi sau cursor (đồng bộ delta);
+    - wait(cursor) chặn tới khi có thay đổi mới (long-poll, SSE).
+    Trong process, notify() đánh thức ngay các client đang chờ; thay đổi do worker khác
+    ghi được thấy nhờ một luồng hỏi MAX(version) mỗi poll_interval giây, luồng này chỉ
+    chạy khi có client đang chờ và dùng chung cho mọi client của process.
+    """
+
+    def __init__(self, app, db, model, serialize, poll_interval=1.0, max_subscribers=64):
+        self.app = app
+        self.db = db
+        self.model = model
+        self.serialize = serialize
+        self.poll_interval = poll_interval
+        self.max_subscribers = max_subscribers
+        self.version = 0  # version lớn nhất đã biết trong process này
+        self.subscribers = 0
+        self._cond = threading.Condition()
+        self._poller = None
+        FEED_SUBSCRIBERS.set_function(lambda: self.subscribers)
+
+    def latest_version(self):
+        Model = self.model
+        with self.app.app_context():
+            return self.db.session.query(self.db.func.max(Model.version)).scalar() or 0
+
+    def changes(self, cursor, limit=DEFAULT_LIMIT):
+        """(các dòng đã đổi sau cursor theo thứ tự version, cursor mới, còn nữa không)."""
+        Model = self.model
+        with self.app.app_context():
+            query = self.db.session.query(Model).filter(Model.version > cursor)
+            rows = query.order_by(Model.version, Model.id).limit(limit + 1).all()
+            has_more = len(rows) > limit
+            rows = rows[:limit]
+            if has_more:
+                # Các dòng cùng version được commit cùng nhau: không cắt ngang giữa chúng,
+                # nếu không cursor mới sẽ bỏ sót phần còn lại
+                last = rows[-1]
+                rows += (query.filter(Model.version == last.version, Model.id > last.id)
+                         .order_by(Model.id).all())
+            items = [self.serialize(row) for row in rows]
+        next_cursor = rows[-1].version if rows else cursor
+        return items, next_cursor, has_more
+
+    def notify(self):
+        """Gọi sau khi commit thay đổi trong process này."""
+        self._refresh()
+
+    def wait(self, cursor, timeout):
+        """Chờ tới khi có version > cursor; False nếu hết timeout mà chưa có gì mới."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self.version <= cursor:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    def subscribe(self):
+        """Giữ một chỗ cho kết nối chờ thay đổi; trả về hàm để nhả chỗ."""
+        with self._cond:
+            if self.subscribers >= self.max_subscribers:
+                raise FeedBusy()
+            self.subscribers += 1
+            if self._poller is None:
+                self._poller = threading.Thread(target=self._poll, name="change-feed", daemon=True)
+                self._poller.start()
+
+        def unsubscribe():
+            with self._cond:
+                self.subscribers -= 1
+        return unsubscribe
+
+    def sse(self, cursor, keepalive=15):
+        """
+        Sự kiện SSE: mỗi dòng thay đổi là một event có id = version (trình duyệt tự gửi lại
+        qua Last-Event-ID khi kết nối lại). Gọi subscribe() trước và nhả chỗ khi đóng kết nối.
+        """
+        yield f"retry: 3000\n: cursor {cursor}\n\n"
+        while True:
+            items, cursor, has_more = self.changes(cursor)
+            for item in items:
+                event = "reminder" if item.get("notified") else "appointment"
+                data = json.dumps(item, ensure_ascii=False)
+                yield f"id: {item['version']}\nevent: {event}\ndata: {data}\n\n"
+            if has_more:
+                continue
+            if not self.wait(cursor, keepalive):
+                yield ": keep-alive\n\n"
+
+    def _refresh(self):
+        version = self.latest_version()
+        with self._cond:
+            if version > self.version:
+                self.version = version
+                self._cond.notify_all()
+
+    def _poll(self):
+        while True:
+            with self._cond:
+                if self.subscribers == 0:
+                    self._poller = None
+                    return
+            try:
+                self._refresh()
+            except Exception as e:
+                print(f"⚠️ Lỗi khi đọc thay đổi: {e}")
+            time.sleep(self.poll_interval)
@@ -0,0 +1,152 @@
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from tts_cache import cache_key
+from metrics import STAGE_SECONDS, TTS_CHUNKS
+
+
+MAX_CHUNK_CHARS = 100  # giới hạn mỗi request của Google TTS (gTTS.GOOGLE_TTS_MAX_CHARS)
+
+SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?…])\s+|\n+")
+CLAUSE_SPLIT_RE = re.compile(r"(?<=[,;:])\s+")
+# Đoạn chỉ có dấu câu không có gì để đọc (Google TTS từ chối)
+WORD_RE = re.compile(r"\w")
+
+
+def _pack(pieces, sep, max_chars):
+    """Gộp các mẩu liên tiếp thành đoạn dài nhất có thể nhưng không quá max_chars."""
+    chunks = []
+    current = ""
+    for piece in pieces:
+        candidate = f"{current}{sep}{piece}" if current else piece
+        if len(candidate) <= max_chars:
+            current = candidate
+            continue
+        if current:
+            chunks.append(current)
+        current = piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def split_chunks(text, max_chars=MAX_CHUNK_CHARS):
+    """
+    Cắt văn bản thành các đoạn <= max_chars. Mỗi câu bắt đầu một đoạn mới (câu lặp lại
+    giữa các câu trả lời cho ra cùng một đoạn, dùng lại được cache); câu dài được cắt ở
+    dấu phẩy/chấm phẩy, mệnh đề quá dài mới phải cắt giữa các từ. Dấu câu được giữ lại
+    để giọng đọc vẫn ngắt nghỉ tự nhiên. Đoạn không có chữ/số nào bị bỏ.
+    """
+    chunks = []
+    for sentence in SENTENCE_SPLIT_RE.split(text.strip()):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        if len(sentence) <= max_chars:
+            chunks.append(sentence)
+            continue
+        clauses = []
+        for clause in CLAUSE_SPLIT_RE.split(sentence):
+            if len(clause) <= max_chars:
+                clauses.append(clause)
+            else:
+                clauses.extend(_pack(clause.split(), " ", max_chars))
+        chunks.extend(_pack(clauses, " ", max_chars))
+    return [chunk for chunk in chunks if WORD_RE.search(chunk)]
+
+
+def gtts_fetch_chunk(chunk, lang, tld):
+    """Âm thanh mp3 của một đoạn (một request tới Google TTS)."""
+    from gtts import gTTS  # import khi cần, không làm chậm lúc khởi động worker
+    return b"".join(gTTS(text=chunk, lang=lang, tld=tld, lang_check=False).stream())
+
+
+class ChunkedSynthesizer:
+    """
+    Thay cho gTTS(...).save(): gTTS cắt văn bản dài thành nhiều đoạn và gọi Google
+    lần lượt từng đoạn. Ở đây các đoạn (<= 100 ký tự) được tải song song, tối đa
+    max_workers request cùng lúc cho cả process, rồi nối frame mp3 theo đúng thứ tự,
+    giống cách gTTS ghi nối tiếp từng đoạn vào một file.
+    Âm thanh từng đoạn được cache trong bộ nhớ: cụm câu lặp lại giữa các câu trả lời
+    ("Đã tạo ghi chú", "Bây giờ là", ...) không phải tải lại.
+
+    Dùng được trực tiếp làm TTSCache.synthesize(text, lang, tld, filepath).
+    """
+
+    def __init__(self, max_workers=8, cache_max_bytes=32 * 1024 * 1024,
+                 split=split_chunks, fetch_chunk=gtts_fetch_chunk):
+        self.split = split
+        self.fetch_chunk = fetch_chunk
+        self.cache_max_bytes = cache_max_bytes
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tts-chunk")
+        self._cache = OrderedDict()  # key -> bytes, cũ nhất ở đầu
+        self._cache_bytes = 0
+        self._inflight = {}          # key -> Future của lần tải đang chạy
+        self._lock = threading.Lock()
+
+    def __call__(self, text, lang, tld, filepath):
+        with open(filepath, "wb") as f:
+            for part in self.iter_audio(text, lang, tld):
+                f.write(part)
+
+    def iter_audio(self, text, lang="vi", tld="com.vn"):
+        """
+        Trả về lần lượt mp3 của từng đoạn theo thứ tự; mọi đoạn đã được tải song song.
+        ValueError nếu không có đoạn nào để đọc (chuỗi rỗng, chỉ có khoảng trắng/dấu câu):
+        job TTS bị đánh dấu failed thay vì để lại một file mp3 0 byte "sẵn sàng".
+        """
+        chunks = self.split(text)
+        if not chunks:
+            raise ValueError("không có nội dung để đọc")
+        futures = [self._chunk_future(chunk, lang, tld) for chunk in chunks]
+        for future in futures:
+            yield future.result()
+
+    def synthesize_bytes(self, text, lang="vi", tld="com.vn"):
+        return b"".join(self.iter_audio(text, lang, tld))
+
+    def stats(self):
+        with self._lock:
+            return {"cached_chunks": len(self._cache), "cached_bytes": self._cache_bytes,
+                    "inflight_chunks": len(self._inflight)}
+
+    def _chunk_future(self, chunk, lang, tld):
+        key = cache_key(chunk, lang, tld)
+        with self._lock:
+            data = self._cache.get(key)
+            if data is not None:
+                self._cache.move_to_end(key)
+                TTS_CHUNKS.inc("hit")
+                future = Future()
+                future.set_result(data)
+                return future
+            future = self._inflight.get(key)
+            if future is not None:
+                TTS_CHUNKS.inc("joined")
+                return future
+            TTS_CHUNKS.inc("miss")
+            future = self._inflight[key] = self._pool.submit(self._fetch, key, chunk, lang, tld)
+            return future
+
+    def _fetch(self, key, chunk, lang, tld):
+        try:
+            with STAGE_SECONDS.time("tts_worker", "chunk"):
+                data = self.fetch_chunk(chunk, lang, tld)
+            self._store(key, data)
+            return data
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def _store(self, key, data):
+        if len(data) > self.cache_max_bytes:
+            return
+        with self._lock:
+            if key in self._cache:
+                return
+            self._cache[key] = data
+            self._cache_bytes += len(data)
+            while self._cache_bytes > self.cache_max_bytes:
+                _, old = self._cache.popitem(last=False)
+                self._cache_bytes -= len(old)
@@ -1,6 +1,6 @@
 import re
 import unicodedata
-from map import VIETNAM_CITIES, ALIAS_MAP,CITY_MAP 
+from map import VIETNAM_CITIES, ALIAS_MAP,CITY_MAP
 
 def remove_accents(text: str) -> str:
     return ''.join(
@@ -8,28 +8,82 @@ def remove_accents(text: str) -> str:
         if unicodedata.category(c) != 'Mn'
     )
 
+def fold(text: str) -> str:
+    """Chữ thường, bỏ dấu, đ -> d: dạng chuẩn dùng cho so khớp tên tỉnh."""
+    return remove_accents(text.lower()).replace('đ', 'd')
+
 def clean_city(city: str) -> str:
     city = re.sub(r"^(thành phố|tỉnh)\s+", "", city, flags=re.IGNORECASE)
     city = re.sub(r"(ra sao|thế nào|hôm nay|hiện tại|như thế nào).*$", "", city, flags=re.IGNORECASE)
     return city.strip().title()
 
-def extract_city(message: str) -> str | None:
-    message = message.lower()
-    normalized_msg = remove_accents(message)
+def _trie_pattern(words) -> str:
+    """
+    Gộp danh sách từ thành một regex dạng cây tiền tố (trie), ví dụ
+    ["ha noi", "ha nam"] -> "ha n(?:oi|am)". Regex engine chỉ phải đi theo
+    một nhánh tại mỗi ký tự thay vì thử lần lượt từng alias.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[''] = {}
 
-    # 1. So khớp alias
-    for alias, real_city in ALIAS_MAP.items():
-        if alias in message or remove_accents(alias) in normalized_msg:
-            print(f"[DEBUG] Phát hiện alias: {alias} -> {real_city}")
-            return real_city
+    def build(node) -> str:
+        terminal = '' in node
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        # Nhánh dài hơn được thử trước (tham lam) -> luôn lấy chuỗi khớp dài nhất
+        if terminal:
+            body = ('(?:' + body + ')?') if len(branches) > 1 or len(body) > 1 else body + '?'
+        return body
 
-    # 2. So khớp không dấu với danh sách chính thức
-    for city_name in VIETNAM_CITIES:
-        if remove_accents(city_name.lower()) in normalized_msg:
-            print(f"[DEBUG] So khớp không dấu với danh sách: {city_name}")
-            return city_name
+    return build(trie)
 
-    return None
+class CityMatcher:
+    """
+    Chỉ mục tìm tên tỉnh/thành dựng một lần lúc import: alias và tên chính thức
+    (đã bỏ dấu) gộp thành một regex duy nhất, có ranh giới từ và ưu tiên khớp dài nhất.
+    """
+
+    def __init__(self, aliases: dict, cities: list):
+        self.lookup = {}
+        self.priority = {}  # tên đã bỏ dấu -> thứ tự ưu tiên (thứ tự trong ALIAS_MAP, rồi tới tên chính thức)
+        # Alias đứng trước để giữ thứ tự ưu tiên cũ khi hai tên trùng nhau sau khi bỏ dấu
+        for name, city in list(aliases.items()) + [(c, c) for c in cities]:
+            key = fold(name)
+            if key not in self.lookup:
+                self.lookup[key] = city
+                self.priority[key] = len(self.priority)
+        self.regex = re.compile(r'(?<!\w)(' + _trie_pattern(self.lookup) + r')(?!\w)')
+
+    def finditer(self, message: str):
+        for m in self.regex.finditer(fold(message)):
+            yield self.lookup[m.group(1)]
+
+    def first(self, message: str) -> str | None:
+        """
+        Tỉnh khớp với tên có độ ưu tiên cao nhất (như khi duyệt ALIAS_MAP theo thứ tự),
+        không phải tên đứng trước trong câu: "vịnh hạ long" bỏ dấu thành "vinh ha long",
+        phải ra Quảng Ninh chứ không phải Nghệ An (alias "vinh").
+        """
+        best = min(self.regex.finditer(fold(message)), key=lambda m: self.priority[m.group(1)], default=None)
+        return self.lookup[best.group(1)] if best else None
+
+    def all(self, message: str) -> list:
+        """Mọi tỉnh được nhắc tới, theo thứ tự xuất hiện, không lặp ("hn" và "Hà Nội" là một)."""
+        return list(dict.fromkeys(self.finditer(message)))
+
+CITY_MATCHER = CityMatcher(ALIAS_MAP, VIETNAM_CITIES)
+
+def extract_city(message: str) -> str | None:
+    return CITY_MATCHER.first(message)
+
+def extract_cities(message: str) -> list:
+    return CITY_MATCHER.all(message)
 
 def get_normalized_city(message: str) -> str | None:
     city_vi = extract_city(message)
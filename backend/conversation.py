@@ -0,0 +1,266 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from storage import SQLitePool, migrate_sqlite
+
+# Ước lượng số token không cần tokenizer: tiếng Việt có dấu trung bình ~3 ký tự/token
+CHARS_PER_TOKEN = 3
+# Một lượt quá dài (dán cả văn bản) chỉ được giữ phần đầu trong bộ nhớ hội thoại
+MAX_TURN_CHARS = 2000
+SUMMARY_QUESTION_CHARS = 80
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _clip(text, max_chars):
+    return text if len(text) <= max_chars else text[:max_chars - 1] + "…"
+
+
+def assemble_prompt(system_prompt, history, message, budget_tokens=1024, summary_tokens=128):
+    """
+    Danh sách messages cho LLM trong giới hạn budget_tokens (tính cả system prompt và tin
+    nhắn hiện tại): giữ các lượt gần nhất còn vừa; với các lượt cũ hơn chỉ còn lại câu hỏi
+    của người dùng, gộp thành một dòng tóm tắt ngắn (tối đa summary_tokens).
+    Nhờ vậy kích thước request và độ trễ LLM không tăng theo độ dài hội thoại.
+    """
+    remaining = budget_tokens - estimate_tokens(system_prompt) - estimate_tokens(message)
+    kept = []
+    index = len(history)
+    # Đi từ lượt mới nhất về trước, theo từng cặp hỏi-đáp để không cắt đôi một lượt
+    while index >= 2 and remaining > summary_tokens:
+        pair = history[index - 2:index]
+        cost = sum(estimate_tokens(m["content"]) for m in pair)
+        if cost > remaining - summary_tokens:
+            break
+        kept[:0] = pair
+        remaining -= cost
+        index -= 2
+
+    messages = [{"role": "system", "content": system_prompt}]
+    # Tóm tắt: các câu hỏi bị bỏ gần nhất (mỗi câu tối đa SUMMARY_QUESTION_CHARS ký tự)
+    questions = []
+    room = summary_tokens * CHARS_PER_TOKEN
+    for m in reversed(history[:index]):
+        if m["role"] != "user":
+            continue
+        question = _clip(m["content"], SUMMARY_QUESTION_CHARS)
+        if len(question) + 2 > room:
+            break
+        questions.append(question)
+        room -= len(question) + 2
+    if questions:
+        summary = "; ".join(reversed(questions))
+        messages.append({"role": "system", "content": f"Trước đó người dùng đã hỏi: {summary}"})
+    messages += kept
+    messages.append({"role": "user", "content": message})
+    return messages
+
+
+class _Session:
+    __slots__ = ("turns", "size", "last_used")
+
+    def __init__(self, max_messages):
+        self.turns = deque(maxlen=max_messages)
+        self.size = 0
+        self.last_used = 0.0
+
+
+class InProcessMemory:
+    """
+    Bộ nhớ hội thoại trong process: mỗi phiên là một ring buffer max_turns lượt hỏi-đáp
+    gần nhất. Phiên không dùng quá idle_ttl giây bị xoá; tổng dung lượng mọi phiên (tính
+    theo số ký tự) không vượt max_bytes, phiên ít dùng nhất bị xoá trước. Các phiên nằm
+    trong một OrderedDict theo thứ tự dùng gần nhất nên việc dọn chỉ xét đầu danh sách.
+    """
+
+    def __init__(self, max_turns=10, idle_ttl=1800, max_bytes=32 * 1024 * 1024):
+        self.max_turns = max_turns
+        self.idle_ttl = idle_ttl
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def history(self, session_id):
+        with self._lock:
+            self._evict_locked(time.monotonic())
+            session = self._sessions.get(session_id)
+            if session is None:
+                return []
+            return [{"role": role, "content": content} for role, content in session.turns]
+
+    def append(self, session_id, message, reply):
+        turns = [("user", _clip(message, MAX_TURN_CHARS)), ("assistant", _clip(reply, MAX_TURN_CHARS))]
+        now = time.monotonic()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._sessions[session_id] = _Session(self.max_turns * 2)
+            for turn in turns:
+                if len(session.turns) == session.turns.maxlen:
+                    self._resize_locked(session, -len(session.turns[0][1]))
+                session.turns.append(turn)
+                self._resize_locked(session, len(turn[1]))
+            session.last_used = now
+            self._sessions.move_to_end(session_id)
+            self._evict_locked(now)
+
+    def clear(self, session_id):
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+            if session is not None:
+                self.bytes -= session.size
+
+    def _resize_locked(self, session, delta):
+        session.size += delta
+        self.bytes += delta
+
+    def _evict_locked(self, now):
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if now - session.last_used < self.idle_ttl and self.bytes <= self.max_bytes:
+                return
+            del self._sessions[session_id]
+            self.bytes -= session.size
+
+    def stats(self):
+        with self._lock:
+            return {"backend": "memory", "sessions": len(self._sessions), "bytes": self.bytes}
+
+
+SCHEMA_V1 = [
+    '''
+    CREATE TABLE IF NOT EXISTS conversation_turns (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_id TEXT NOT NULL,
+        role TEXT NOT NULL,
+        content TEXT NOT NULL,
+        created_at REAL NOT NULL
+    )
+    ''',
+    'CREATE INDEX IF NOT EXISTS idx_conversation_session ON conversation_turns(session_id, id)',
+    'CREATE INDEX IF NOT EXISTS idx_conversation_created_at ON conversation_turns(created_at)',
+]
+
+INSERT_TURN = 'INSERT INTO conversation_turns (session_id, role, content, created_at) VALUES (?, ?, ?, ?)'
+SELECT_HISTORY = '''
+    SELECT role, content FROM (
+        SELECT id, role, content FROM conversation_turns
+        WHERE session_id = ? ORDER BY id DESC LIMIT ?
+    ) ORDER BY id
+'''
+LAST_USED = 'SELECT MAX(created_at) FROM conversation_turns WHERE session_id = ?'
+# Chỉ giữ limit lượt mới nhất của phiên (ring buffer trên đĩa)
+TRIM_SESSION = '''
+    DELETE FROM conversation_turns WHERE session_id = ? AND id <= (
+        SELECT id FROM conversation_turns WHERE session_id = ? ORDER BY id DESC LIMIT 1 OFFSET ?
+    )
+'''
+DELETE_SESSION = 'DELETE FROM conversation_turns WHERE session_id = ?'
+DELETE_IDLE_SESSION = '''
+    DELETE FROM conversation_turns
+    WHERE session_id = ?1 AND (SELECT MAX(created_at) FROM conversation_turns WHERE session_id = ?1) < ?2
+'''
+DELETE_IDLE = '''
+    DELETE FROM conversation_turns WHERE session_id IN (
+        SELECT session_id FROM conversation_turns GROUP BY session_id HAVING MAX(created_at) < ?
+    )
+'''
+SESSIONS_BY_AGE = '''
+    SELECT session_id, SUM(length(content)) FROM conversation_turns
+    GROUP BY session_id ORDER BY MAX(created_at)
+'''
+
+
+class SQLiteMemory:
+    """
+    Bộ nhớ hội thoại dùng chung cho mọi worker gunicorn trên cùng máy (một file SQLite),
+    cùng giới hạn như InProcessMemory. Phiên hết hạn được bỏ qua ngay khi đọc; việc xoá
+    hẳn phiên hết hạn và giữ tổng dung lượng dưới max_bytes chạy gộp, tối đa mỗi
+    sweep_interval giây một lần.
+    """
+
+    def __init__(self, path, max_turns=10, idle_ttl=1800, max_bytes=32 * 1024 * 1024,
+                 sweep_interval=60, pool_size=4):
+        self.pool = SQLitePool(path, size=pool_size)
+        self.max_turns = max_turns
+        self.idle_ttl = idle_ttl
+        self.max_bytes = max_bytes
+        self.sweep_interval = sweep_interval
+        self._next_sweep = 0.0
+        self._migrated = False
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        if not self._migrated:
+            with self._lock:
+                if not self._migrated:
+                    with self.pool.connection() as conn:
+                        migrate_sqlite(conn, [self._schema_v1])
+                    self._migrated = True
+        return self.pool.connection()
+
+    @staticmethod
+    def _schema_v1(conn):
+        for statement in SCHEMA_V1:
+            conn.execute(statement)
+
+    def history(self, session_id):
+        with self._connection() as conn:
+            last_used = conn.execute(LAST_USED, (session_id,)).fetchone()[0]
+            if last_used is None or time.time() - last_used >= self.idle_ttl:
+                return []
+            rows = conn.execute(SELECT_HISTORY, (session_id, self.max_turns * 2)).fetchall()
+        return [{"role": role, "content": content} for role, content in rows]
+
+    def append(self, session_id, message, reply):
+        now = time.time()
+        with self._connection() as conn:
+            with conn:
+                # Lượt cũ đã hết hạn thì phiên bắt đầu lại từ đầu
+                conn.execute(DELETE_IDLE_SESSION, (session_id, now - self.idle_ttl))
+                conn.executemany(INSERT_TURN, [
+                    (session_id, "user", _clip(message, MAX_TURN_CHARS), now),
+                    (session_id, "assistant", _clip(reply, MAX_TURN_CHARS), now),
+                ])
+                conn.execute(TRIM_SESSION, (session_id, session_id, self.max_turns * 2))
+        if now >= self._next_sweep:
+            self._next_sweep = now + self.sweep_interval
+            self.sweep(now)
+
+    def clear(self, session_id):
+        with self._connection() as conn:
+            with conn:
+                conn.execute(DELETE_SESSION, (session_id,))
+
+    def sweep(self, now=None):
+        """Xoá các phiên hết hạn, rồi các phiên cũ nhất tới khi tổng dung lượng dưới max_bytes."""
+        now = now or time.time()
+        with self._connection() as conn:
+            with conn:
+                conn.execute(DELETE_IDLE, (now - self.idle_ttl,))
+                sessions = conn.execute(SESSIONS_BY_AGE).fetchall()
+                excess = sum(size for _, size in sessions) - self.max_bytes
+                for session_id, size in sessions:
+                    if excess <= 0:
+                        break
+                    conn.execute(DELETE_SESSION, (session_id,))
+                    excess -= size
+
+    def stats(self):
+        with self._connection() as conn:
+            sessions, size = conn.execute(
+                'SELECT COUNT(DISTINCT session_id), COALESCE(SUM(length(content)), 0) FROM conversation_turns'
+            ).fetchone()
+        return {"backend": "sqlite", "sessions": sessions, "bytes": size}
+
+
+def create_memory(backend, path=None, **limits):
+    """backend: "memory" (mặc định, riêng từng worker) hoặc "sqlite" (dùng chung qua file path)."""
+    if backend == "sqlite":
+        return SQLiteMemory(path, **limits)
+    if backend != "memory":
+        raise ValueError(f"CONVERSATION_BACKEND không hợp lệ: {backend}")
+    return InProcessMemory(**limits)
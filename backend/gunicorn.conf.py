@@ -0,0 +1,61 @@
+"""
+Cấu hình gunicorn cho nhiều worker:
+
+    gunicorn -c backend/gunicorn.conf.py main:app
+
+Mỗi worker là một process riêng: task, nhắc nhở và lịch sử hội thoại nằm trong SQLite
+(WAL), job nền (lịch nhắc nhở, dọn file âm thanh) chỉ chạy ở worker giữ lease leader,
+metrics của các worker được cộng dồn qua METRICS_DIR.
+"""
+import multiprocessing
+import os
+import secrets
+import shutil
+import tempfile
+
+# Import phẳng (from city_utils import ...) nên phải chạy trong thư mục backend
+chdir = os.path.dirname(os.path.abspath(__file__))
+
+bind = os.getenv("GUNICORN_BIND", f"0.0.0.0:{os.getenv('PORT', '5000')}")
+workers = int(os.getenv("WEB_CONCURRENCY", min(multiprocessing.cpu_count() * 2, 8)))
+# Request chủ yếu chờ I/O (LLM, thời tiết, TTS): mỗi worker phục vụ nhiều request bằng luồng
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+# /chat chờ LLM tới ~20 s, /chat/stream còn lâu hơn
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = 30
+keepalive = 5
+# Nạp app một lần ở master rồi fork: worker khởi động gần như tức thì và dùng chung bộ nhớ
+# (bảng tỉnh, regex intent, ...). Import main không tạo luồng hay kết nối DB nào; luồng nền
+# (bầu leader, TTS, metrics) được tạo trong post_fork, sau khi đã fork.
+preload_app = os.getenv("GUNICORN_PRELOAD", "1") == "1"
+if preload_app:
+    os.environ["DEFER_PROCESS_START"] = "1"
+
+accesslog = os.getenv("GUNICORN_ACCESS_LOG", "-")
+errorlog = "-"
+
+os.environ.setdefault("METRICS_DIR", os.path.join(tempfile.gettempdir(), "ruby-metrics"))
+# Lượt hội thoại kế tiếp có thể rơi vào worker khác: lịch sử phải nằm trong file chung
+os.environ.setdefault("CONVERSATION_BACKEND", "sqlite")
+# Token /audio/stream ký ở worker này phải được worker khác chấp nhận
+os.environ.setdefault("AUDIO_TOKEN_SECRET", secrets.token_hex(32))
+
+
+def on_starting(server):
+    # Số liệu của lần chạy trước không được cộng vào lần này
+    shutil.rmtree(os.environ["METRICS_DIR"], ignore_errors=True)
+
+
+def child_exit(server, worker):
+    # Worker đã chết: bỏ snapshot metrics của nó để /metrics không gộp số liệu cũ mãi
+    try:
+        os.remove(os.path.join(os.environ["METRICS_DIR"], f"{worker.pid}.json"))
+    except OSError:
+        pass
+
+
+def post_fork(server, worker):
+    if preload_app:
+        from main import start_process
+        start_process()
@@ -8,44 +8,25 @@ def extract_level(message):
         return max(0, min(level, 100))
     return None
 
-def handle_device_command(message):
-    msg = message.lower()
-      # Flash
-    if "bật đèn" in msg or "bật flash" in msg:
-        return "Đã bật đèn pin cho bạn."
-    elif "tắt đèn" in msg or "tắt flash" in msg:
-        return "Đã tắt đèn pin cho bạn."
-
-    # Thông báo
-    elif "bật thông báo" in msg:
-        return "Đã bật thông báo."
-    elif "tắt thông báo" in msg:
-        return "Đã tắt thông báo."
-
-    # Âm lượng
-    elif "âm lượng" in msg:
-        if "tăng" in msg:
-            return "Đã tăng âm lượng."
-        elif "giảm" in msg:
-            return "Đã giảm âm lượng."
-        elif "tắt" in msg:
-            return "Đã tắt âm lượng."
-        elif "bật" in msg:
-            return "Đã bật âm lượng."
-        elif (level := extract_level(msg)) is not None:
-            return f"Đang chỉnh âm lượng đến mức {level}%."
-
-    # Độ sáng
-    elif "độ sáng" in msg:
-        if "tăng" in msg:
-            return "Đã tăng độ sáng."
-        elif "giảm" in msg:
-            return "Đã giảm độ sáng."
-        elif (level := extract_level(msg)) is not None:
-            return f"Đang chỉnh độ sáng đến mức {level}%."
-
-    # Điều hướng
-    elif "mở điều hướng" in msg or "mở thanh điều hướng" in msg:
+DEVICE_REPLIES = {
+    ("device.flash", "on"): "Đã bật đèn pin cho bạn.",
+    ("device.flash", "off"): "Đã tắt đèn pin cho bạn.",
+    ("device.notification", "on"): "Đã bật thông báo.",
+    ("device.notification", "off"): "Đã tắt thông báo.",
+    ("device.volume", "up"): "Đã tăng âm lượng.",
+    ("device.volume", "down"): "Đã giảm âm lượng.",
+    ("device.volume", "off"): "Đã tắt âm lượng.",
+    ("device.volume", "on"): "Đã bật âm lượng.",
+    ("device.brightness", "up"): "Đã tăng độ sáng.",
+    ("device.brightness", "down"): "Đã giảm độ sáng.",
+}
+
+def device_reply(intent):
+    """Câu trả lời cho intent thiết bị từ intent_router."""
+    slots = intent.slots
+    if intent.name == "device.navigation":
         return "Đã mở thanh điều hướng."
-
-    return None
\ No newline at end of file
+    if slots.get("action") == "set":
+        target = "âm lượng" if intent.name == "device.volume" else "độ sáng"
+        return f"Đang chỉnh {target} đến mức {slots['level']}%."
+    return DEVICE_REPLIES.get((intent.name, slots.get("state") or slots.get("action")))
@@ -0,0 +1,133 @@
+import os
+import random
+import threading
+import time
+from collections import deque
+import requests
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from metrics import UPSTREAM_RESPONSES, UPSTREAM_SECONDS
+
+load_dotenv()
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class LatencyStats:
+    """Thống kê độ trễ của một upstream (giữ N mẫu gần nhất để tính phân vị)."""
+
+    def __init__(self, window=1024):
+        self._lock = threading.Lock()
+        self._samples = deque(maxlen=window)
+        self.count = 0
+        self.errors = 0
+        self.retries = 0
+        self.total_ms = 0.0
+        self.status_counts = {}
+
+    def record(self, elapsed_ms, status=None, error=False):
+        with self._lock:
+            self.count += 1
+            self.total_ms += elapsed_ms
+            self._samples.append(elapsed_ms)
+            if error:
+                self.errors += 1
+            if status is not None:
+                self.status_counts[status] = self.status_counts.get(status, 0) + 1
+
+    def record_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def snapshot(self):
+        with self._lock:
+            samples = sorted(self._samples)
+            snap = {
+                "count": self.count,
+                "errors": self.errors,
+                "retries": self.retries,
+                "avg_ms": round(self.total_ms / self.count, 2) if self.count else None,
+                "status": dict(self.status_counts),
+            }
+        for name, q in (("p50_ms", 0.50), ("p95_ms", 0.95), ("p99_ms", 0.99)):
+            snap[name] = round(samples[min(len(samples) - 1, int(q * len(samples)))], 2) if samples else None
+        return snap
+
+
+class UpstreamClient:
+    """
+    Client HTTP dùng chung cho một upstream: giữ kết nối keep-alive trong pool,
+    timeout connect/read riêng, tự thử lại (backoff có jitter) cho request idempotent.
+    """
+
+    def __init__(self, name, base_url, connect_timeout=3.05, read_timeout=20,
+                 retries=2, backoff=0.2, pool_size=20):
+        self.name = name
+        self.base_url = base_url.rstrip("/")
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.stats = LatencyStats()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def url(self, path):
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def get(self, path, params=None, **kwargs):
+        return self.request("GET", path, params=params, idempotent=True, **kwargs)
+
+    def post(self, path, json=None, headers=None, idempotent=False, **kwargs):
+        return self.request("POST", path, json=json, headers=headers, idempotent=idempotent, **kwargs)
+
+    def request(self, method, path, idempotent=False, read_timeout=None, **kwargs):
+        timeout = (self.connect_timeout, read_timeout or self.read_timeout)
+        attempts = 1 + (self.retries if idempotent else 0)
+        for attempt in range(attempts):
+            last_attempt = attempt == attempts - 1
+            start = time.perf_counter()
+            try:
+                response = self.session.request(method, self.url(path), timeout=timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                elapsed = time.perf_counter() - start
+                self.stats.record(elapsed * 1000, error=True)
+                UPSTREAM_SECONDS.observe(elapsed, self.name)
+                UPSTREAM_RESPONSES.inc(self.name, "error")
+                if last_attempt:
+                    raise
+            else:
+                elapsed = time.perf_counter() - start
+                retryable = response.status_code in RETRY_STATUS
+                self.stats.record(elapsed * 1000, response.status_code, error=response.status_code >= 500)
+                UPSTREAM_SECONDS.observe(elapsed, self.name)
+                UPSTREAM_RESPONSES.inc(self.name, str(response.status_code))
+                if not retryable or last_attempt:
+                    return response
+                response.close()
+            self.stats.record_retry()
+            # Exponential backoff với full jitter
+            time.sleep(random.uniform(0, self.backoff * (2 ** attempt)))
+
+
+openrouter = UpstreamClient(
+    "openrouter",
+    os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1"),
+    connect_timeout=float(os.getenv("OPENROUTER_CONNECT_TIMEOUT", "3.05")),
+    read_timeout=float(os.getenv("OPENROUTER_READ_TIMEOUT", "20")),
+)
+
+openweather = UpstreamClient(
+    "openweather",
+    os.getenv("OPENWEATHER_BASE_URL", "https://api.openweathermap.org/data/2.5"),
+    connect_timeout=float(os.getenv("OPENWEATHER_CONNECT_TIMEOUT", "3.05")),
+    read_timeout=float(os.getenv("OPENWEATHER_READ_TIMEOUT", "8")),
+)
+
+UPSTREAMS = {c.name: c for c in (openrouter, openweather)}
+
+
+def upstream_stats():
+    return {name: client.stats.snapshot() for name, client in UPSTREAMS.items()}
@@ -0,0 +1,157 @@
+import re
+from collections import namedtuple
+from handle_device_command import device_reply, extract_level
+from city_utils import extract_cities
+from time_utils import extract_forecast_date, parse_reminder
+
+# name: tên intent, slots: dict thông tin trích xuất, speak: có tạo âm thanh cho câu trả lời không
+Intent = namedtuple("Intent", ["name", "slots", "speak"])
+
+_Rule = namedtuple("_Rule", ["name", "pattern", "slots", "speak"])
+
+
+class IntentRouter:
+    """
+    Bảng intent dùng chung cho /chat. Mọi mẫu kích hoạt được gộp thành một regex
+    duy nhất nên tin nhắn chỉ bị quét một lần; intent đăng ký trước được ưu tiên.
+    Slot chỉ được trích xuất cho intent thắng cuộc; nếu slot của nó trả về None thì các rule
+    sau vẫn được thử, kể cả rule khớp cùng vị trí nhưng bị rule ưu tiên hơn che.
+    """
+
+    def __init__(self):
+        self._rules = []
+        self._handlers = {}
+        self._regex = None
+        self._prefix_regexes = []
+        self._rule_regexes = []
+
+    def register(self, name, pattern, slots=None, speak=True):
+        """
+        pattern: regex kích hoạt (trên tin nhắn chữ thường), khớp từ đầu một từ.
+        slots(message, match) -> dict, hoặc None nếu thực ra không khớp intent này.
+        """
+        self._rules.append(_Rule(name, pattern, slots, speak))
+        self._regex = None
+
+    def on(self, name):
+        """Decorator gắn hàm xử lý cho intent: handler(intent, message) -> câu trả lời."""
+        def decorator(fn):
+            self._handlers[name] = fn
+            return fn
+        return decorator
+
+    def handler_for(self, intent):
+        return self._handlers.get(intent.name)
+
+    def compile(self):
+        """Dựng regex gộp ngay (lúc import) thay vì ở request đầu tiên."""
+        return self._regex or self._compile()
+
+    def _compile(self):
+        # Mẫu kích hoạt luôn bắt đầu ở đầu một từ: (?<!\w) loại nhanh các vị trí giữa từ.
+        # Lookahead rỗng để tại mỗi đầu từ regex thử các rule theo thứ tự ưu tiên.
+        groups = [f"(?P<r{i}>{rule.pattern})" for i, rule in enumerate(self._rules)]
+        # _prefix_regexes[k]: chỉ gồm k rule ưu tiên nhất, để tìm rule ưu tiên hơn rule đang thắng
+        self._prefix_regexes = [None] + [re.compile(f"(?<!\\w)(?=(?:{'|'.join(groups[:k])}))")
+                                         for k in range(1, len(groups) + 1)]
+        # Regex riêng từng rule (cùng dạng group): chỉ dùng khi slot của rule thắng từ chối
+        self._rule_regexes = [re.compile(f"(?<!\\w)(?={group})") for group in groups]
+        self._regex = self._prefix_regexes[-1]
+        return self._regex
+
+    def route(self, message):
+        regex = self._regex or self._compile()
+        # Vị trí khớp sớm nhất cho biết rule thắng ở đó; phía sau chỉ còn cần tìm rule ưu tiên
+        # hơn nó (thường không có), nên không phải quét hết tin nhắn với mọi rule
+        m = regex.search(message)
+        if m is None:
+            return None
+        index = int(m.lastgroup[1:])
+        while index > 0:
+            better = self._prefix_regexes[index].search(message, m.start() + 1)
+            if better is None:
+                break
+            m, index = better, int(better.lastgroup[1:])
+        while m is not None:
+            rule = self._rules[index]
+            slots = rule.slots(message, m) if rule.slots else {}
+            if slots is not None:
+                return Intent(rule.name, slots, rule.speak)
+            index, m = self._next_match(message, index + 1)
+        return None
+
+    def _next_match(self, message, start):
+        """
+        Rule đầu tiên từ start trở đi khớp ở đâu đó trong tin nhắn, kể cả nơi nó bị một rule
+        ưu tiên hơn che ở cùng vị trí (regex gộp chỉ cho biết rule thắng tại mỗi vị trí).
+        """
+        for index in range(start, len(self._rules)):
+            m = self._rule_regexes[index].search(message)
+            if m is not None:
+                return index, m
+        return None, None
+
+
+def _volume_slots(message, _):
+    if "tăng" in message:
+        return {"action": "up"}
+    if "giảm" in message:
+        return {"action": "down"}
+    if "tắt" in message:
+        return {"action": "off"}
+    if "bật" in message:
+        return {"action": "on"}
+    level = extract_level(message)
+    return {"action": "set", "level": level} if level is not None else None
+
+
+def _brightness_slots(message, _):
+    if "tăng" in message:
+        return {"action": "up"}
+    if "giảm" in message:
+        return {"action": "down"}
+    level = extract_level(message)
+    return {"action": "set", "level": level} if level is not None else None
+
+
+def _reminder_slots(message, _):
+    dt, content = parse_reminder(message)
+    return {"datetime": dt, "content": content} if dt else None
+
+
+def _weather_slots(message, _):
+    cities = extract_cities(message)
+    return {"city": cities[0] if cities else None, "cities": cities, "date": extract_forecast_date(message)}
+
+
+def _note_slots(message, m):
+    # Match là lookahead rỗng, phần chữ khớp nằm trong group của rule
+    content = message.replace(m.group(m.lastgroup), "", 1).strip(" :,.")
+    return {"content": content} if content else None
+
+
+def register_default_intents(router):
+    router.register("device.flash", r"bật (?:đèn|flash)", lambda msg, m: {"state": "on"}, speak=False)
+    router.register("device.flash", r"tắt (?:đèn|flash)", lambda msg, m: {"state": "off"}, speak=False)
+    router.register("device.notification", r"bật thông báo", lambda msg, m: {"state": "on"}, speak=False)
+    router.register("device.notification", r"tắt thông báo", lambda msg, m: {"state": "off"}, speak=False)
+    router.register("device.volume", r"âm lượng", _volume_slots, speak=False)
+    router.register("device.brightness", r"độ sáng", _brightness_slots, speak=False)
+    router.register("device.navigation", r"mở (?:thanh )?điều hướng", speak=False)
+    router.register("reminder", r"nhắc|\d+\s*(?:giây|phút|giờ|ngày|tuần)", _reminder_slots)
+    router.register("time", r"mấy giờ")
+    router.register("date", r"ngày mấy")
+    router.register("weather", r"thời tiết|nhiệt độ|(?:mưa|nắng)\b", _weather_slots)
+    router.register("note", r"(?:tạo|thêm) ghi chú", _note_slots)
+    for name in ("device.flash", "device.notification", "device.volume",
+                 "device.brightness", "device.navigation"):
+        router.on(name)(lambda intent, message: device_reply(intent))
+    router.compile()
+    return router
+
+
+ROUTER = register_default_intents(IntentRouter())
+
+
+def route(message):
+    return ROUTER.route(message)
@@ -0,0 +1,115 @@
+import atexit
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from storage import BUSY_TIMEOUT_MS, apply_pragmas
+
+LEASE_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS leases (
+        name TEXT PRIMARY KEY,
+        holder TEXT NOT NULL,
+        expires_at REAL NOT NULL
+    )
+'''
+
+
+class LeaderElection:
+    """
+    Bầu một process duy nhất (trong các worker gunicorn trên cùng máy) chạy job nền.
+    Quyền leader là một lease có hạn trong SQLite: leader gia hạn mỗi ttl/3 giây;
+    nếu leader chết, lease hết hạn sau tối đa ttl giây và worker khác lên thay.
+    """
+
+    def __init__(self, path, name="background-jobs", ttl=30, on_elected=None, on_demoted=None):
+        self.path = path
+        self.name = name
+        self.ttl = ttl
+        self.on_elected = on_elected
+        self.on_demoted = on_demoted
+        self.identity = None  # gán lúc start(): app có thể được import trước khi gunicorn fork worker
+        self.is_leader = False
+        self._conn = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self.identity = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._thread = threading.Thread(target=self._run, name="leader-election", daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        """Thôi làm leader và trả lease ngay để worker khác khỏi phải chờ hết hạn."""
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5)
+        if self.is_leader:
+            self._set_leader(False)
+        try:
+            self.release()
+        except sqlite3.Error as e:
+            print(f"⚠️ Không trả được lease {self.name}: {e}")
+
+    def try_acquire(self):
+        """Nhận hoặc gia hạn lease; True nếu process này đang giữ lease."""
+        conn = self._connection()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT holder, expires_at FROM leases WHERE name = ?", (self.name,)).fetchone()
+            won = row is None or row[0] == self.identity or row[1] <= now
+            if won:
+                conn.execute("INSERT OR REPLACE INTO leases (name, holder, expires_at) VALUES (?, ?, ?)",
+                             (self.name, self.identity, now + self.ttl))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return won
+
+    def release(self):
+        conn = self._connection()
+        conn.execute("DELETE FROM leases WHERE name = ? AND holder = ?", (self.name, self.identity))
+        conn.commit()
+
+    def holder(self):
+        row = self._connection().execute(
+            "SELECT holder, expires_at FROM leases WHERE name = ?", (self.name,)).fetchone()
+        return row[0] if row and row[1] > time.time() else None
+
+    def _connection(self):
+        # Chỉ luồng bầu chọn (và stop() lúc tắt) dùng kết nối này
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_MS / 1000,
+                                   isolation_level=None, check_same_thread=False)
+            apply_pragmas(conn)
+            conn.execute(LEASE_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                leader = self.try_acquire()
+            except sqlite3.Error as e:
+                # Không chắc còn giữ lease: thôi chạy job nền cho an toàn
+                print(f"⚠️ Lỗi lease {self.name}: {e}")
+                leader = False
+            if leader != self.is_leader:
+                self._set_leader(leader)
+            self._stop.wait(self.ttl / 3)
+
+    def _set_leader(self, leader):
+        self.is_leader = leader
+        callback = self.on_elected if leader else self.on_demoted
+        print(f"👑 {self.identity} {'giữ' if leader else 'thôi giữ'} vai trò leader ({self.name})")
+        if callback:
+            try:
+                callback()
+            except Exception as e:
+                print(f"❌ Lỗi khi đổi vai trò leader: {e}")
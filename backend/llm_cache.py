@@ -0,0 +1,81 @@
+import re
+from city_utils import fold
+from weather_cache import TTLCache
+from metrics import LLM_CACHE
+
+PUNCT_RE = re.compile(r"[^\w\s]+")
+
+# Câu hỏi mà câu trả lời đổi theo thời gian: không được trả lại từ cache (so khớp trên dạng đã bỏ dấu)
+TIME_SENSITIVE_RE = re.compile(
+    r"\b(bay gio|hien (tai|nay|gio)|luc nay|hom (nay|qua)|ngay (mai|kia|may)|tuan (nay|sau|truoc)"
+    r"|thang (nay|sau|truoc)|nam (nay|sau|ngoai)|may gio|thu may|moi nhat|gan day|tin tuc|thoi su"
+    r"|gia (vang|xang|dien|bitcoin|usd)|ty gia|chung khoan|co phieu|ket qua|ti so|ty so)\b"
+)
+
+
+def normalize_message(message):
+    """Dạng chuẩn để so khớp: chữ thường, bỏ dấu, bỏ dấu câu, gộp khoảng trắng."""
+    return " ".join(PUNCT_RE.sub(" ", fold(message)).split())
+
+
+def is_time_sensitive(normalized):
+    return TIME_SENSITIVE_RE.search(normalized) is not None
+
+
+class LLMResponseCache:
+    """
+    Cache câu trả lời của LLM theo (model, system prompt, tin nhắn đã chuẩn hoá):
+    "Bạn là ai?", "ban la ai" và "bạn  là   ai" dùng chung một câu trả lời.
+    Có hạn sống (ttl giây) và giới hạn số mục (LRU); các lần hỏi trùng đồng thời
+    chỉ gọi LLM một lần. Câu hỏi phụ thuộc thời gian luôn đi thẳng tới LLM.
+    """
+
+    def __init__(self, ttl=3600, max_entries=1024):
+        self.ttl = ttl
+        self.cache = TTLCache(max_entries=max_entries)
+
+    def key_for(self, model, system_prompt, message, bypass=False):
+        """Key cache, hoặc None nếu tin nhắn không được cache (tắt cache, bị bỏ qua, theo thời gian)."""
+        normalized = normalize_message(message)
+        if self.ttl <= 0 or bypass or not normalized or is_time_sensitive(normalized):
+            LLM_CACHE.inc("bypass")
+            return None
+        return model, system_prompt, normalized
+
+    def get_or_load(self, key, loader):
+        """Trả về câu trả lời đã cache cho key, hoặc gọi loader() một lần rồi cache lại."""
+        if key is None:
+            return loader()
+        loaded = []
+
+        def load():
+            loaded.append(True)
+            return loader()
+
+        reply = self.cache.get_or_load(key, load, self._ttl_for)
+        LLM_CACHE.inc("miss" if loaded else "hit")
+        return reply
+
+    def get(self, key):
+        if key is None:
+            return None
+        reply = self.cache.get(key)
+        LLM_CACHE.inc("miss" if reply is None else "hit")
+        return reply
+
+    def record(self, key, tokens):
+        """Chuyển tiếp luồng token và cache câu trả lời ghép lại khi luồng kết thúc bình thường."""
+        parts = []
+        for token in tokens:
+            parts.append(token)
+            yield token
+        if key is not None:
+            reply = "".join(parts)
+            self.cache.put(key, reply, self._ttl_for(reply))
+
+    def stats(self):
+        return {"ttl": self.ttl, **self.cache.stats()}
+
+    def _ttl_for(self, reply):
+        # Câu trả lời rỗng thường là lỗi phía model: không giữ lại
+        return self.ttl if reply and reply.strip() else 0
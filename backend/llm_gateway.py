@@ -0,0 +1,184 @@
+import threading
+import time
+from contextlib import contextmanager
+import requests
+from metrics import LLM_CIRCUIT_STATE, LLM_GATEWAY, LLM_GATEWAY_SLOTS, STAGE_SECONDS
+
+BUSY_REPLY = "Ruby đang bận trả lời nhiều người cùng lúc, bạn thử lại sau giây lát nhé."
+DOWN_REPLY = "Ruby đang mất kết nối tới máy chủ trả lời, bạn thử lại sau ít phút nhé."
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+STATE_VALUES = {CLOSED: 0, OPEN: 1, HALF_OPEN: 2}
+
+
+class LLMUnavailable(Exception):
+    """LLM bị từ chối ngay (quá tải hoặc circuit mở); reply là câu trả lời thay thế cho người dùng."""
+
+    def __init__(self, reason, reply, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.reply = reply
+        self.retry_after = retry_after
+
+
+def is_upstream_failure(error):
+    """Lỗi cho thấy upstream đang hỏng: timeout, lỗi kết nối, mã 5xx."""
+    if isinstance(error, (requests.Timeout, requests.ConnectionError)):
+        return True
+    if isinstance(error, requests.HTTPError):
+        return error.response is not None and error.response.status_code >= 500
+    return False
+
+
+class CircuitBreaker:
+    """
+    Sau failure_threshold lỗi liên tiếp thì mở mạch: mọi lần gọi bị từ chối ngay trong
+    reset_timeout giây. Hết thời gian đó chuyển sang nửa mở và cho đúng một request đi
+    thử; thành công thì đóng mạch, lỗi thì mở lại từ đầu.
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN:
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    return False
+                self._set_state_locked(HALF_OPEN)
+            if self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._probing = False
+            if self.state != CLOSED:
+                self._set_state_locked(CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                self._set_state_locked(OPEN)
+
+    def cancel_probe(self):
+        """Lượt thử ở trạng thái nửa mở không được dùng tới (request bị từ chối trước khi gọi)."""
+        with self._lock:
+            self._probing = False
+
+    def retry_after(self):
+        with self._lock:
+            if self.state != OPEN:
+                return 1
+            return max(1, int(self.reset_timeout - (time.monotonic() - self.opened_at)) + 1)
+
+    def _set_state_locked(self, state):
+        if state != self.state:
+            print(f"🔌 Circuit {self.name}: {self.state} -> {state}")
+        self.state = state
+
+    def stats(self):
+        with self._lock:
+            return {"state": self.state, "consecutive_failures": self.failures}
+
+
+class LLMGateway:
+    """
+    Cửa vào duy nhất tới LLM: tối đa max_concurrent request chạy cùng lúc, thêm tối đa
+    max_waiting request xếp hàng, mỗi request chờ không quá wait_timeout giây. Quá tải
+    hoặc circuit mở thì từ chối ngay (LLMUnavailable) thay vì giữ luồng của server
+    suốt 20 giây chờ upstream, nên các route rẻ (/note, /appointment) vẫn nhanh.
+    """
+
+    def __init__(self, breaker, max_concurrent=4, max_waiting=8, wait_timeout=1.0):
+        self.breaker = breaker
+        self.max_concurrent = max_concurrent
+        self.max_waiting = max_waiting
+        self.wait_timeout = wait_timeout
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.waiting = 0
+        LLM_GATEWAY_SLOTS.set_function(lambda: self.in_flight, "in_flight")
+        LLM_GATEWAY_SLOTS.set_function(lambda: self.waiting, "waiting")
+        LLM_CIRCUIT_STATE.set_function(lambda: STATE_VALUES[self.breaker.state])
+
+    def acquire(self, timeout=None):
+        """
+        Giữ một chỗ gọi LLM; phải gọi release() đúng một lần sau đó.
+        timeout: số giây tối đa chờ trong hàng đợi (mặc định wait_timeout).
+        """
+        if not self.breaker.allow():
+            LLM_GATEWAY.inc("circuit_open")
+            raise LLMUnavailable("circuit_open", DOWN_REPLY, self.breaker.retry_after())
+        if not self._slots.acquire(blocking=False):
+            self._wait_for_slot(self.wait_timeout if timeout is None else timeout)
+        with self._lock:
+            self.in_flight += 1
+        LLM_GATEWAY.inc("admitted")
+
+    def _wait_for_slot(self, timeout):
+        with self._lock:
+            if self.waiting >= self.max_waiting:
+                full = True
+            else:
+                full = False
+                self.waiting += 1
+        if full:
+            self._reject("queue_full")
+        try:
+            with STAGE_SECONDS.time("llm_gateway", "wait"):
+                acquired = self._slots.acquire(timeout=timeout)
+        finally:
+            with self._lock:
+                self.waiting -= 1
+        if not acquired:
+            self._reject("wait_timeout")
+
+    def _reject(self, reason):
+        # Request bị từ chối không gọi upstream: trả lại lượt thử của circuit nửa mở
+        self.breaker.cancel_probe()
+        LLM_GATEWAY.inc(reason)
+        raise LLMUnavailable(reason, BUSY_REPLY, 1)
+
+    def release(self, error=None):
+        """Trả chỗ và báo kết quả cho circuit breaker (error=None là thành công)."""
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+        if error is not None and is_upstream_failure(error):
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+    @contextmanager
+    def slot(self, timeout=None):
+        self.acquire(timeout)
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            self.release(error)
+
+    def stats(self):
+        with self._lock:
+            usage = {"in_flight": self.in_flight, "waiting": self.waiting}
+        return {"max_concurrent": self.max_concurrent, "max_waiting": self.max_waiting,
+                **usage, "circuit": self.breaker.stats()}
@@ -0,0 +1,123 @@
+import json
+import queue
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Kết thúc câu: dấu câu (có thể kèm ngoặc/nháy đóng) rồi khoảng trắng, hoặc xuống dòng
+SENTENCE_END_RE = re.compile(r'(?<=[.!?…])["\')\]]*\s+|\n+')
+
+
+def iter_sse_tokens(response):
+    """Đọc luồng SSE của OpenRouter (định dạng OpenAI) và trả về từng đoạn text."""
+    for line in response.iter_lines():
+        # SSE luôn là UTF-8, không dựa vào encoding đoán từ header
+        raw = line.decode("utf-8")
+        if not raw or raw.startswith(":"):
+            continue  # dòng trống hoặc comment keep-alive
+        if not raw.startswith("data:"):
+            continue
+        data = raw[5:].strip()
+        if data == "[DONE]":
+            return
+        chunk = json.loads(data)
+        if "error" in chunk:
+            raise RuntimeError(chunk["error"].get("message", "OpenRouter stream error"))
+        choices = chunk.get("choices") or []
+        if not choices:
+            continue
+        text = (choices[0].get("delta") or {}).get("content")
+        if text:
+            yield text
+
+
+class SentenceSplitter:
+    """Gom token thành câu hoàn chỉnh để tổng hợp giọng nói từng câu một."""
+
+    def __init__(self, min_chars=12):
+        self.min_chars = min_chars
+        self._buffer = ""
+
+    def feed(self, text):
+        self._buffer += text
+        sentences = []
+        start = 0
+        for m in SENTENCE_END_RE.finditer(self._buffer):
+            candidate = self._buffer[start:m.end()].strip()
+            # Câu quá ngắn ("Ừ.", "1.") thì gộp với câu sau
+            if len(candidate) >= self.min_chars:
+                sentences.append(candidate)
+                start = m.end()
+        self._buffer = self._buffer[start:]
+        return sentences
+
+    def flush(self):
+        rest = self._buffer.strip()
+        self._buffer = ""
+        return [rest] if rest else []
+
+
+def stream_reply_events(tokens, text_to_audio_url, tts_workers=2):
+    """
+    Chuyển luồng token thành chuỗi sự kiện:
+      {"type": "token", "text": ...}                  ngay khi nhận được từ LLM
+      {"type": "sentence", "index": i, "text": ...}   khi cắt được một câu
+      {"type": "audio", "index": i, "audio_url": ...} khi TTS của câu đó xong
+      {"type": "done", "reply": ...}                  cuối cùng
+    Token được đọc ở luồng riêng và TTS chạy song song, nên chữ và audio
+    được đẩy ra ngay khi có, không chờ nhau.
+    """
+    events = queue.Queue()
+
+    def produce():
+        try:
+            for token in tokens:
+                events.put(("token", token))
+        except Exception as e:
+            events.put(("error", e))
+        else:
+            events.put(("end", None))
+
+    def synthesize(index, sentence):
+        try:
+            audio_url = text_to_audio_url(sentence)
+        except Exception as tts_err:
+            print("⚠️ TTS lỗi:", tts_err)
+            audio_url = None
+        events.put(("audio", {"type": "audio", "index": index, "audio_url": audio_url}))
+
+    splitter = SentenceSplitter()
+    parts = []
+    sentence_count = 0
+    outstanding = 0
+    llm_done = False
+    threading.Thread(target=produce, daemon=True).start()
+
+    with ThreadPoolExecutor(max_workers=tts_workers) as pool:
+        while not llm_done or outstanding:
+            kind, value = events.get()
+            if kind == "audio":
+                outstanding -= 1
+                yield value
+                continue
+            if kind == "error":
+                raise value
+            if kind == "token":
+                parts.append(value)
+                yield {"type": "token", "text": value}
+                sentences = splitter.feed(value)
+            else:
+                llm_done = True
+                sentences = splitter.flush()
+            for sentence in sentences:
+                pool.submit(synthesize, sentence_count, sentence)
+                yield {"type": "sentence", "index": sentence_count, "text": sentence}
+                sentence_count += 1
+                outstanding += 1
+
+    yield {"type": "done", "reply": "".join(parts).strip()}
+
+
+def to_ndjson(events):
+    for event in events:
+        yield json.dumps(event, ensure_ascii=False) + "\n"
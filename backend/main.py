@@ -1,99 +1,291 @@
+import math
 import os
 import re
-import sqlite3
-import uuid
-import requests
+import secrets
 import threading
-import urllib.parse
 import time
 import traceback
+import click
+import requests
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from flask import Flask, jsonify, request, send_from_directory
+from flask import Flask, Response, g, jsonify, request, send_from_directory
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.exc import OperationalError
 from flask_cors import CORS
 from dotenv import load_dotenv
-from gtts import gTTS
-from handle_device_command import handle_device_command 
-from city_utils import CITY_MAP, extract_city  
-from time_utils import extract_forecast_date, parse_reminder 
+from city_utils import CITY_MAP, extract_cities
+from time_utils import extract_forecast_date
+from tts_cache import CACHE_FILE_RE, TTSCache
+from tts_jobs import TTSJobQueue
+from chunked_tts import ChunkedSynthesizer
+from audio_stream import audio_stream_response, decode_audio_token, encode_audio_token
+from audio_janitor import AudioJanitor
+from http_clients import openrouter, openweather, upstream_stats
+from weather_cache import WeatherCache
+from llm_cache import LLMResponseCache
+from llm_gateway import BUSY_REPLY, CircuitBreaker, LLMGateway, LLMUnavailable
+from conversation import assemble_prompt, create_memory
+from intent_router import ROUTER as intent_router
+from reminder_scheduler import ReminderScheduler
+from change_feed import DEFAULT_LIMIT as FEED_DEFAULT_LIMIT, MAX_LIMIT as FEED_MAX_LIMIT, ChangeFeed, FeedBusy
+from leader import LeaderElection
+from storage import Storage
+from notes_store import DEFAULT_PAGE_SIZE, NotesStore, note_import_row
+from bulk_io import BadRecord, import_ndjson, require_text
+from llm_stream import iter_sse_tokens, stream_reply_events, to_ndjson
+from profiler import Profiler
+from metrics import CONTENT_TYPE, HTTP_SECONDS, REGISTRY, STAGE_SECONDS, TTS_FAILURES
 
 # Load API key từ .env
 load_dotenv()
 api_key = os.getenv("OPENROUTER_API_KEY")
 weather_api_key = os.getenv("OPENWEATHER_API_KEY")
 
+LLM_MODEL = "nousresearch/deephermes-3-llama-3-8b-preview:free"
+SYSTEM_PROMPT = "Bạn là Ruby – trợ lý ảo lanh lợi, trả lời CỰC KỲ NGẮN GỌN, đúng trọng tâm, súc tích. Không nói lan man, không giải thích thừa. Ưu tiên trả lời nhanh.Trả lời đúng chính tả Tiếng Việt"
+
 app = Flask(__name__)
 CORS(app)
 
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///appointments.db'
+# Đo hiệu năng theo yêu cầu (header X-Profile hoặc /admin/profile); không đặt PROFILE_TOKEN
+# thì middleware không được gắn và request không tốn thêm gì
+profiler = Profiler(
+    os.getenv("PROFILE_TOKEN"),
+    max_profiles=int(os.getenv("PROFILE_BUFFER_SIZE", "20")),
+    sample_interval=float(os.getenv("PROFILE_SAMPLE_MS", "5")) / 1000,
+)
+app.wsgi_app = profiler.wrap(app.wsgi_app)
+
+# Câu hỏi lặp lại (chào hỏi, "bạn là ai", ...) không phải gọi lại LLM
+llm_cache = LLMResponseCache(
+    ttl=int(os.getenv("LLM_CACHE_TTL_SECONDS", "3600")),
+    max_entries=int(os.getenv("LLM_CACHE_SIZE", "1024")),
+)
+
+# OpenRouter chậm/hỏng không được kéo cả server theo: giới hạn số request LLM đồng thời,
+# hàng đợi ngắn có hạn chờ, circuit breaker từ chối ngay khi upstream lỗi liên tiếp
+llm_gateway = LLMGateway(
+    CircuitBreaker(
+        "openrouter",
+        failure_threshold=int(os.getenv("LLM_BREAKER_FAILURES", "5")),
+        reset_timeout=float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30")),
+    ),
+    max_concurrent=int(os.getenv("LLM_MAX_CONCURRENCY", "4")),
+    max_waiting=int(os.getenv("LLM_MAX_WAITING", "8")),
+    wait_timeout=float(os.getenv("LLM_QUEUE_TIMEOUT_SECONDS", "1")),
+)
+
+# Vài lượt hội thoại gần nhất theo session_id, để câu hỏi nối tiếp ("còn ngày mai thì sao?")
+# có ngữ cảnh. "memory": riêng từng worker; "sqlite": mọi worker gunicorn dùng chung một file
+conversations = create_memory(
+    os.getenv("CONVERSATION_BACKEND", "memory"),
+    path=os.getenv("CONVERSATION_DB_PATH", "conversations.db"),
+    max_turns=int(os.getenv("CONVERSATION_MAX_TURNS", "10")),
+    idle_ttl=int(os.getenv("CONVERSATION_IDLE_MINUTES", "30")) * 60,
+    max_bytes=int(os.getenv("CONVERSATION_MAX_MB", "32")) * 1024 * 1024,
+)
+# Giới hạn token (ước lượng) cho cả prompt gửi LLM: system prompt + lịch sử + tin nhắn
+PROMPT_BUDGET_TOKENS = int(os.getenv("LLM_PROMPT_BUDGET_TOKENS", "1024"))
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_duration(response):
+    started = g.get("request_started")
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        HTTP_SECONDS.observe(time.perf_counter() - started, request.method, route, str(response.status_code))
+    return response
+
+app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv("APPOINTMENTS_DB_URI", 'sqlite:///appointments.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {"pool_size": 8, "max_overflow": 8}
 
 db = SQLAlchemy(app)
 
+# Version mới lấy trong chính câu INSERT/UPDATE: SQLite chỉ cho một transaction ghi tại
+# một thời điểm nên version tăng đúng theo thứ tự commit, kể cả giữa nhiều worker
+NEXT_APPOINTMENT_VERSION = db.text("(SELECT COALESCE(MAX(version), 0) + 1 FROM appointment)")
+
 class Appointment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     datetime = db.Column(db.DateTime, nullable=False)
     description = db.Column(db.String(255), nullable=False)
     notified = db.Column(db.Boolean, default=False)
+    # Đổi mỗi lần ghi, kể cả UPDATE hàng loạt của lịch nhắc: cursor cho đồng bộ delta
+    version = db.Column(db.Integer, index=True,
+                        default=NEXT_APPOINTMENT_VERSION, onupdate=NEXT_APPOINTMENT_VERSION)
+
+    # Phục vụ truy vấn "chưa nhắc và đã đến hạn" của lịch nhắc nhở
+    __table_args__ = (db.Index("ix_appointment_notified_datetime", "notified", "datetime"),)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'datetime': self.datetime.strftime("%Y-%m-%d %H:%M"),
+            'description': self.description,
+            'notified': self.notified,
+            'version': self.version,
+        }
+
+class Task(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    task = db.Column(db.String(255))
+    remind_time = db.Column(db.String(64))
+    created_at = db.Column(db.DateTime, default=datetime.now)
+
+    def to_dict(self):
+        return {'id': self.id, 'task': self.task, 'remind_time': self.remind_time}
 
-AUDIO_FOLDER = "static/audio"
+AUDIO_FOLDER = os.getenv("AUDIO_FOLDER", "static/audio")
 os.makedirs(AUDIO_FOLDER, exist_ok=True)
 
-def init_notes_db():
-    conn = sqlite3.connect('notes.db')
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS notes (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            title TEXT,
-            content TEXT NOT NULL,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    conn.commit()
-    conn.close()
-    print("✅ Notes database initialized")
-
-init_notes_db()
-
-with app.app_context():
-    db.create_all()
-
-tasks = []
-appointments = []
-
-def auto_delete_file(path, delay_minutes=10):
-    def delete():
-        time.sleep(delay_minutes * 60)
-        try:
-            if os.path.exists(path):
-                os.remove(path)
-                print(f"Đã xóa file âm thanh: {path}")
-        except Exception as e:
-            print(f"Lỗi khi xóa file {path}: {e}")
-    threading.Thread(target=delete, daemon=True).start()
+# Câu trả lời dài: các đoạn ~100 ký tự được tải song song thay vì lần lượt như gTTS
+tts_engine = ChunkedSynthesizer(
+    max_workers=int(os.getenv("TTS_CHUNK_CONCURRENCY", "8")),
+    cache_max_bytes=int(os.getenv("TTS_CHUNK_CACHE_MB", "32")) * 1024 * 1024,
+)
+
+# Cache TTS theo nội dung: câu trả lời lặp lại dùng lại file mp3 đã có
+tts_cache = TTSCache(
+    AUDIO_FOLDER,
+    max_bytes=int(os.getenv("TTS_CACHE_MAX_MB", "200")) * 1024 * 1024,
+    max_entries=int(os.getenv("TTS_CACHE_MAX_ENTRIES", "5000")),
+    synthesize=tts_engine,
+)
+
+# Một luồng dọn dẹp duy nhất cho toàn bộ thư mục âm thanh, chỉ chạy ở process leader
+audio_janitor = AudioJanitor(
+    AUDIO_FOLDER,
+    ttl_seconds=int(os.getenv("AUDIO_TTL_MINUTES", "1440")) * 60,
+    max_bytes=int(os.getenv("AUDIO_MAX_MB", "500")) * 1024 * 1024,
+    on_delete=tts_cache.forget,
+    sweep_interval=int(os.getenv("AUDIO_SWEEP_MINUTES", "10")) * 60,
+)
+
+# TTS chạy ở nhóm worker riêng: câu trả lời chữ không phải chờ Google TTS
+tts_jobs = TTSJobQueue(
+    tts_cache,
+    workers=int(os.getenv("TTS_WORKERS", "4")),
+    max_queue=int(os.getenv("TTS_QUEUE_SIZE", "256")),
+    on_done=audio_janitor.schedule,
+)
+# /static/audio chờ tối đa chừng này giây cho file đang render, sau đó trả 202
+AUDIO_WAIT_SECONDS = float(os.getenv("AUDIO_WAIT_SECONDS", "3"))
+# "file": audio_url trỏ tới file mp3 render sẵn (mặc định);
+# "stream": audio_url trỏ tới /audio/stream, phát thẳng từ bộ nhớ, không ghi đĩa
+AUDIO_DELIVERY = os.getenv("AUDIO_DELIVERY", "file")
+# Khoá ký token /audio/stream; mọi worker phải dùng chung (gunicorn.conf.py tự tạo nếu thiếu).
+# Không đặt thì mỗi process một khoá ngẫu nhiên: URL cũ hết hiệu lực sau khi khởi động lại.
+AUDIO_TOKEN_SECRET = (os.getenv("AUDIO_TOKEN_SECRET") or secrets.token_hex(32)).encode("utf-8")
+
+# notes.db (pool sqlite3) và appointments.db (SQLAlchemy) đều bật WAL qua storage
+storage = Storage(os.getenv("NOTES_DB_PATH", 'notes.db'))
+notes_store = NotesStore(storage.notes)
+# Nhập/xuất hàng loạt (NDJSON): số dòng mỗi lần executemany/fetchmany
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", "1000"))
+storage.migration(notes_store.migrate)
+
+@storage.migration
+def migrate_appointments():
+    with app.app_context():
+        db.create_all()
+        # create_all không thêm cột cho bảng đã tồn tại từ trước
+        columns = {c["name"] for c in db.inspect(db.engine).get_columns("appointment")}
+        if "version" not in columns:
+            with db.engine.begin() as conn:
+                try:
+                    conn.execute(db.text("ALTER TABLE appointment ADD COLUMN version INTEGER"))
+                    conn.execute(db.text("UPDATE appointment SET version = id"))
+                except OperationalError as e:
+                    # Worker khác vừa thêm cột trước
+                    if "duplicate column" not in str(e):
+                        raise
+        # create_all không thêm index cho bảng đã tồn tại từ trước
+        for index in Appointment.__table__.indexes:
+            index.create(bind=db.engine, checkfirst=True)
+
+# Migration chạy một lần mỗi process, trước request đầu tiên (hoặc qua `flask migrate`)
+app.before_request(storage.ensure_migrated)
+
+@app.cli.command("migrate")
+def migrate_command():
+    storage.migrate()
+
+def audio_stream_url(text):
+    token = encode_audio_token(text, AUDIO_TOKEN_SECRET)
+    return f"/audio/stream/{token}" if token else None
+
+def text_to_audio_url(text):
+    """Render (qua hàng đợi TTS) và chờ xong; chỉ dùng ngoài luồng request."""
+    if AUDIO_DELIVERY == "stream" and audio_stream_url(text):
+        return audio_stream_url(text)
+    filename = tts_jobs.render(text, lang="vi", tld="com.vn")
+    audio_janitor.schedule(filename)
+    return f"/static/audio/{filename}"
+
+def queue_reply_audio(text, endpoint):
+    """
+    Đưa câu trả lời vào hàng đợi TTS và trả về ngay các trường âm thanh của response:
+    audio_url luôn là URL cuối cùng của file (tên theo nội dung), audio_status cho
+    biết file đã sẵn sàng ("ready"), đang render ("pending") hay bị bỏ qua ("rejected").
+    audio_stream_url phát cùng nội dung mà không cần file; với AUDIO_DELIVERY=stream
+    audio_url chính là URL đó ("stream") và không có file nào được tạo.
+    """
+    stream_url = audio_stream_url(text)
+    if AUDIO_DELIVERY == "stream" and stream_url:
+        return {"audio_url": stream_url, "audio_stream_url": stream_url,
+                "audio_id": None, "audio_status": "stream"}
+    with STAGE_SECONDS.time(endpoint, "tts_enqueue"):
+        filename, state = tts_jobs.submit(text, lang="vi", tld="com.vn")
+    if filename is None:
+        TTS_FAILURES.inc(endpoint)
+        print("⚠️ Hàng đợi TTS đầy, bỏ qua âm thanh")
+        return {"audio_url": None, "audio_stream_url": stream_url, "audio_id": None, "audio_status": state}
+    if state == "ready":
+        audio_janitor.schedule(filename)
+    return {"audio_url": f"/static/audio/{filename}", "audio_stream_url": stream_url,
+            "audio_id": filename[:-4], "audio_status": state}
+
+# Cache thời tiết: hiện tại 10 phút, dự báo 30 phút (gộp các request trùng nhau)
+weather_cache = WeatherCache(
+    openweather,
+    weather_api_key,
+    current_ttl=int(os.getenv("WEATHER_CURRENT_TTL", "600")),
+    forecast_ttl=int(os.getenv("WEATHER_FORECAST_TTL", "1800")),
+    known_cities=CITY_MAP.values(),
+)
+# Số tỉnh được làm nóng định kỳ (0: tắt)
+WEATHER_WARM_TOP_N = int(os.getenv("WEATHER_WARM_TOP_N", "0"))
+
+def fetch_weather(city, endpoint):
+    """(status, data) từ cache/OpenWeather; lỗi mạng sau khi hết lượt thử lại coi như không có dữ liệu."""
+    try:
+        with STAGE_SECONDS.time("weather", "fetch"):
+            return weather_cache.fetch(city, endpoint)
+    except requests.RequestException as e:
+        print(f"⚠️ OpenWeather lỗi ({city}, {endpoint}): {e}")
+        return None, None
 
 def get_weather(city, date=None):
-    encoded_city = urllib.parse.quote(city)
     today = datetime.now().date()
 
     if date is None or date == today.strftime("%Y-%m-%d"):
-        url = f'https://api.openweathermap.org/data/2.5/weather?q={encoded_city}&units=metric&lang=vi&appid={weather_api_key}'
-        res = requests.get(url)
-        if res.status_code == 200:
-            data = res.json()
+        status, data = fetch_weather(city, "weather")
+        if status == 200:
             desc = data['weather'][0]['description']
             temp = data['main']['temp']
             return f"🌤️ Thời tiết tại {city} hiện tại: {desc}, nhiệt độ {temp}°C"
         else:
             return "❌ Không tìm thấy thông tin thời tiết cho địa điểm bạn yêu cầu."
 
-    url = f'https://api.openweathermap.org/data/2.5/forecast?q={encoded_city}&units=metric&lang=vi&appid={weather_api_key}'
-    res = requests.get(url)
-    if res.status_code != 200:
+    status, data = fetch_weather(city, "forecast")
+    if status != 200:
         return "❌ Không tìm thấy thông tin dự báo thời tiết cho địa điểm bạn yêu cầu."
 
-    data = res.json()
     forecasts = data.get("list", [])
     try:
         target_date = datetime.strptime(date, "%Y-%m-%d").date()
@@ -115,79 +307,387 @@ def get_weather(city, date=None):
         return f"📅 Dự báo {city} ngày {target_date.strftime('%d/%m/%Y')}:\n" + "\n".join(lines)
     return f"❗ Không có dữ liệu dự báo thời tiết cho {city} vào ngày {date}."
 
+# Hỏi nhiều tỉnh một lúc: gọi OpenWeather song song, giới hạn chung cho cả process
+MAX_WEATHER_CITIES = int(os.getenv("MAX_WEATHER_CITIES", "6"))
+weather_pool = ThreadPoolExecutor(max_workers=int(os.getenv("WEATHER_CONCURRENCY", "8")),
+                                  thread_name_prefix="weather")
+
+def get_weather_many(cities_vi, date=None):
+    """Thời tiết của nhiều tỉnh, mỗi tỉnh một đoạn theo thứ tự được hỏi; tổng thời gian ~ một lần gọi."""
+    cities_en = [CITY_MAP.get(c, c) for c in cities_vi[:MAX_WEATHER_CITIES]]
+    if len(cities_en) == 1:
+        return get_weather(cities_en[0], date)
+    with STAGE_SECONDS.time("weather", "fanout"):
+        replies = list(weather_pool.map(lambda city: get_weather(city, date), cities_en))
+    return "\n\n".join(replies)
+
 @app.route("/weather", methods=["POST"])
 def weather():
     data = request.json
     message = data.get("message", "")
     city_from_client = data.get("city", "").strip()
-    city_vi = extract_city(message) or city_from_client or "TP Hồ Chí Minh"
-    city_en = CITY_MAP.get(city_vi, city_vi)
+    cities_vi = extract_cities(message) or [city_from_client or "TP Hồ Chí Minh"]
     forecast_date = extract_forecast_date(message)
-    result = get_weather(city_en, forecast_date)
+    result = get_weather_many(cities_vi, forecast_date)
     return jsonify({"reply": result})
 
+def build_llm_request(user_message, stream=False, history=()):
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json"
+    }
+    payload = {
+        "model": LLM_MODEL,
+        "messages": assemble_prompt(SYSTEM_PROMPT, history, user_message, PROMPT_BUDGET_TOKENS),
+    }
+    if stream:
+        payload["stream"] = True
+    return headers, payload
+
+def create_reminders(intents):
+    """Ghi các nhắc nhở (intent "reminder") trong một transaction; trả về câu trả lời cho từng cái."""
+    new_appts = [Appointment(datetime=i.slots["datetime"], description=i.slots["content"]) for i in intents]
+    with STAGE_SECONDS.time("reminder", "db_commit"):
+        db.session.add_all(new_appts)
+        # flush để có id mà không phải đọc lại từng bản ghi sau commit
+        db.session.flush()
+        scheduled = [(a.id, a.datetime) for a in new_appts]
+        db.session.commit()
+    for appt_id, dt in scheduled:
+        reminder_scheduler.add(appt_id, dt)
+    change_feed.notify()
+    return [f"Đã tạo nhắc nhở lúc {dt.strftime('%H:%M %d/%m/%Y')}" for _, dt in scheduled]
+
+@intent_router.on("reminder")
+def reminder_reply(intent, message):
+    return create_reminders([intent])[0]
+
+@intent_router.on("time")
+def time_reply(intent, message):
+    return f"Bây giờ là {datetime.now().strftime('%H:%M:%S')}"
+
+@intent_router.on("date")
+def date_reply(intent, message):
+    return f"Hôm nay là ngày {datetime.now().strftime('%d/%m/%Y')}"
+
+@intent_router.on("weather")
+def weather_reply(intent, message):
+    return get_weather_many(intent.slots["cities"] or ["TP Hồ Chí Minh"], intent.slots["date"])
+
+@intent_router.on("note")
+def note_reply(intent, message):
+    content = intent.slots["content"]
+    with STAGE_SECONDS.time("note", "db"):
+        notes_store.insert(content, content)
+    return f"Đã tạo ghi chú '{content}' thành công!"
+
+def resolve_intent(user_message, endpoint="chat"):
+    """Trả về (intent, câu trả lời) nếu tin nhắn khớp một intent có handler, ngược lại (None, None)."""
+    with STAGE_SECONDS.time(endpoint, "intent"):
+        intent = intent_router.route(user_message)
+    handler = intent_router.handler_for(intent) if intent else None
+    if handler is None:
+        return None, None
+    print(f"🧭 [Intent] {intent.name} {intent.slots}")
+    with STAGE_SECONDS.time(endpoint, "handler"):
+        return intent, handler(intent, user_message)
+
+def llm_cache_bypassed(body):
+    """Client tự tắt cache LLM bằng "cache": false hoặc header Cache-Control: no-cache."""
+    return body.get("cache") is False or bool(request.cache_control.no_cache)
+
+def conversation_id(body):
+    """Phiên hội thoại do client đặt (body "session_id" hoặc header X-Session-Id); None = không nhớ."""
+    value = body.get("session_id") or request.headers.get("X-Session-Id")
+    return str(value)[:128] if value else None
+
+def conversation_history(session_id):
+    if not session_id:
+        return []
+    try:
+        return conversations.history(session_id)
+    except Exception as e:
+        print(f"⚠️ Không đọc được lịch sử hội thoại: {e}")
+        return []
+
+def remember(session_id, user_message, reply):
+    if not session_id or not reply:
+        return
+    try:
+        conversations.append(session_id, user_message, reply)
+    except Exception as e:
+        print(f"⚠️ Không lưu được lượt hội thoại: {e}")
+
+def remembered(session_id, user_message, tokens):
+    """Chuyển tiếp token của câu trả lời, lưu lượt hội thoại khi câu trả lời đã đủ."""
+    parts = []
+    for token in tokens:
+        parts.append(token)
+        yield token
+    remember(session_id, user_message, "".join(parts))
+
+def llm_cache_key(user_message, bypass_cache, history):
+    # Câu trả lời khi đã có lịch sử phụ thuộc ngữ cảnh: chỉ cache câu mở đầu hội thoại
+    return llm_cache.key_for(LLM_MODEL, SYSTEM_PROMPT, user_message, bypass=bypass_cache or bool(history))
+
+def llm_reply(user_message, bypass_cache=False, history=(), wait_timeout=None):
+    key = llm_cache_key(user_message, bypass_cache, history)
+    return llm_cache.get_or_load(key, lambda: fetch_llm_reply(user_message, history, wait_timeout))
+
+def fetch_llm_reply(user_message, history=(), wait_timeout=None):
+    """wait_timeout: số giây tối đa chờ chỗ trong llm_gateway (mặc định của gateway)."""
+    headers, payload = build_llm_request(user_message, history=history)
+    with llm_gateway.slot(wait_timeout), STAGE_SECONDS.time("chat", "llm"):
+        response = openrouter.post("chat/completions", json=payload, headers=headers)
+        response.raise_for_status()
+        data = response.json()
+    return data["choices"][0]["message"]["content"]
+
+def llm_unavailable_response(e):
+    """Trả lời thay thế ngay khi LLM quá tải hoặc circuit đang mở."""
+    print(f"🚧 [LLM] Từ chối: {e.reason}")
+    return jsonify({"reply": e.reply, "error": e.reason}), 503, {"Retry-After": str(e.retry_after)}
+
+def measured_audio_url(text, endpoint):
+    try:
+        with STAGE_SECONDS.time(endpoint, "tts"):
+            return text_to_audio_url(text)
+    except Exception:
+        TTS_FAILURES.inc(endpoint)
+        raise
+
+
 @app.route("/chat", methods=["POST"])
 def chat_endpoint():
     try:
         body = request.get_json()
         user_message = body.get("message", "").lower().strip()
-        now = datetime.now()
+
+        session_id = conversation_id(body)
 
         print(f"📥 [Chat] Tin nhắn nhận được: {user_message}")
 
-        device_response = handle_device_command(user_message)
-        if device_response:
-            return jsonify({"reply": device_response})
+        intent, reply = resolve_intent(user_message)
+        if intent and not intent.speak:
+            remember(session_id, user_message, reply)
+            return jsonify({"reply": reply})
 
-        dt, content = parse_reminder(user_message)
-        if dt:
-            new_appt = Appointment(datetime=dt, description=content)
-            db.session.add(new_appt)
-            db.session.commit()
-            reply = f"Đã tạo nhắc nhở lúc {dt.strftime('%H:%M %d/%m/%Y')}"
-        elif "mấy giờ" in user_message:
-            reply = f"Bây giờ là {now.strftime('%H:%M:%S')}"
-        elif "ngày mấy" in user_message:
-            reply = f"Hôm nay là ngày {now.strftime('%d/%m/%Y')}"
-        else:
-            headers = {
-                "Authorization": f"Bearer {api_key}",
-                "Content-Type": "application/json"
-            }
-            payload = {
-                "model": "nousresearch/deephermes-3-llama-3-8b-preview:free",
-                "messages": [
-                    {"role": "system", "content": "Bạn là Ruby – trợ lý ảo lanh lợi, trả lời CỰC KỲ NGẮN GỌN, đúng trọng tâm, súc tích. Không nói lan man, không giải thích thừa. Ưu tiên trả lời nhanh.Trả lời đúng chính tả Tiếng Việt"},
-                    {"role": "user", "content": user_message}
-                ]
-            }
-            response = requests.post("https://openrouter.ai/api/v1/chat/completions", json=payload, headers=headers, timeout=20)
-            response.raise_for_status()
-            data = response.json()
-            reply = data["choices"][0]["message"]["content"]
+        if reply is None:
+            reply = llm_reply(user_message, llm_cache_bypassed(body), conversation_history(session_id))
+        remember(session_id, user_message, reply)
 
-        try:
-            tts = gTTS(text=reply, lang="vi", tld="com.vn")
-            filename = f"{uuid.uuid4()}.mp3"
-            filepath = os.path.join(AUDIO_FOLDER, filename)
-            tts.save(filepath)
-            auto_delete_file(filepath)
-            audio_url = f"/static/audio/{filename}"
-        except Exception as tts_err:
-            print("⚠️ TTS lỗi:", tts_err)
-            audio_url = None
-
-        return jsonify({"reply": reply, "audio_url": audio_url})
+        return jsonify({"reply": reply, **queue_reply_audio(reply, "chat")})
 
+    except LLMUnavailable as e:
+        return llm_unavailable_response(e)
     except Exception as e:
         print("❌ Lỗi chat_endpoint:", e)
         traceback.print_exc()
         return jsonify({"reply": "Xin lỗi, có lỗi xảy ra", "error": str(e)}), 500
 
+# /chat/batch: số tin nhắn tối đa mỗi lô, số tin nhắn chạy song song (chung cả process),
+# và thời gian tối đa các tin nhắn LLM của một lô được chờ chỗ trong llm_gateway
+MAX_CHAT_BATCH = int(os.getenv("CHAT_BATCH_MAX_MESSAGES", "20"))
+chat_batch_pool = ThreadPoolExecutor(max_workers=int(os.getenv("CHAT_BATCH_CONCURRENCY", "8")),
+                                     thread_name_prefix="chat-batch")
+CHAT_BATCH_TIMEOUT_SECONDS = float(os.getenv("CHAT_BATCH_TIMEOUT_SECONDS", "30"))
+# Một lô chỉ được chiếm chừng này chỗ của llm_gateway cùng lúc: phần còn lại luôn dành cho
+# /chat, /chat/stream của người đang chờ trả lời
+CHAT_BATCH_LLM_SHARE = max(1, llm_gateway.max_concurrent // 2)
+
+def needs_llm(intent):
+    return not (intent and intent_router.handler_for(intent))
+
+def batch_item_reply(user_message, intent, bypass_cache, history, deadline):
+    """Một tin nhắn của /chat/batch, chạy trong chat_batch_pool; lỗi chỉ ảnh hưởng tin nhắn đó."""
+    try:
+        handler = intent_router.handler_for(intent) if intent else None
+        if handler is not None:
+            print(f"🧭 [Intent] {intent.name} {intent.slots}")
+            with STAGE_SECONDS.time("chat_batch", "handler"):
+                reply = handler(intent, user_message)
+            if not intent.speak:
+                return {"reply": reply}
+        else:
+            # Các tin nhắn khác của lô không chiếm quá CHAT_BATCH_LLM_SHARE chỗ, nên tin
+            # nhắn này được chờ chỗ tới hạn chung của cả lô thay vì wait_timeout của gateway
+            reply = llm_reply(user_message, bypass_cache, history, wait_timeout=max(0, deadline - time.monotonic()))
+        return {"reply": reply, **queue_reply_audio(reply, "chat_batch")}
+    except LLMUnavailable as e:
+        return {"reply": e.reply, "error": e.reason}
+    except Exception as e:
+        print("❌ Lỗi chat_batch_endpoint:", e)
+        traceback.print_exc()
+        return {"reply": "Xin lỗi, có lỗi xảy ra", "error": str(e)}
+
+@app.route("/chat/batch", methods=["POST"])
+def chat_batch_endpoint():
+    """
+    Nhiều tin nhắn trong một request (vd. tin nhắn gõ lúc offline), body
+    {"messages": ["...", ...], "session_id"?}: trả về {"results": [...]} đúng thứ tự, mỗi
+    phần tử giống response của /chat. Các nhắc nhở được ghi trong một transaction; các
+    tin nhắn còn lại (thời tiết, LLM, ...) chạy song song trong chat_batch_pool nên cả lô
+    mất xấp xỉ thời gian của tin nhắn chậm nhất (tin nhắn LLM thì tối đa CHAT_BATCH_LLM_SHARE
+    tin cùng lúc). Mọi tin nhắn trong lô cùng thấy lịch sử hội thoại
+    lúc bắt đầu lô; các lượt mới được lưu theo thứ tự sau khi xong.
+    """
+    body = request.get_json(silent=True) or {}
+    messages = body.get("messages")
+    if not isinstance(messages, list) or not messages:
+        return jsonify({"error": "messages phải là danh sách tin nhắn"}), 400
+    if len(messages) > MAX_CHAT_BATCH:
+        return jsonify({"error": f"Tối đa {MAX_CHAT_BATCH} tin nhắn mỗi lô"}), 400
+    messages = [str(m.get("message", "") if isinstance(m, dict) else m).lower().strip() for m in messages]
+    session_id = conversation_id(body)
+    print(f"📥 [Chat batch] {len(messages)} tin nhắn")
+
+    with STAGE_SECONDS.time("chat_batch", "intent"):
+        intents = [intent_router.route(message) for message in messages]
+    results = [None] * len(messages)
+
+    reminders = [i for i, intent in enumerate(intents) if intent and intent.name == "reminder"]
+    if reminders:
+        try:
+            replies = create_reminders([intents[i] for i in reminders])
+            for i, reply in zip(reminders, replies):
+                results[i] = {"reply": reply, **queue_reply_audio(reply, "chat_batch")}
+        except Exception as e:
+            db.session.rollback()
+            print("❌ Lỗi chat_batch_endpoint:", e)
+            traceback.print_exc()
+            for i in reminders:
+                results[i] = {"reply": "Xin lỗi, có lỗi xảy ra", "error": str(e)}
+
+    history = conversation_history(session_id) if None in intents else []
+    bypass_cache = llm_cache_bypassed(body)
+    deadline = time.monotonic() + CHAT_BATCH_TIMEOUT_SECONDS
+    pending = [i for i in range(len(messages)) if results[i] is None]
+    futures = [(i, chat_batch_pool.submit(batch_item_reply, messages[i], intents[i], bypass_cache, history, deadline))
+               for i in pending if not needs_llm(intents[i])]
+    llm_slots = threading.BoundedSemaphore(CHAT_BATCH_LLM_SHARE)
+    with STAGE_SECONDS.time("chat_batch", "wait"):
+        # Tin nhắn LLM chỉ vào pool khi lô đã giữ được chỗ: luồng của pool (dùng chung mọi lô)
+        # không bao giờ nằm chờ, tin nhắn thời tiết/giờ của lô khác không phải xếp sau
+        for i in pending:
+            if not needs_llm(intents[i]):
+                continue
+            if not llm_slots.acquire(timeout=max(0, deadline - time.monotonic())):
+                results[i] = {"reply": BUSY_REPLY, "error": "wait_timeout"}
+                continue
+            future = chat_batch_pool.submit(batch_item_reply, messages[i], intents[i], bypass_cache, history, deadline)
+            future.add_done_callback(lambda _: llm_slots.release())
+            futures.append((i, future))
+        for i, future in futures:
+            results[i] = future.result()
+
+    for message, result in zip(messages, results):
+        if "error" not in result:
+            remember(session_id, message, result["reply"])
+    return jsonify({"results": results})
+
+@app.route("/chat/stream", methods=["POST"])
+def chat_stream_endpoint():
+    """
+    Giống /chat nhưng trả về NDJSON: token của LLM được đẩy ngay khi nhận,
+    và audio_url của từng câu được gửi ngay khi câu đó tổng hợp xong.
+    """
+    try:
+        body = request.get_json()
+        user_message = body.get("message", "").lower().strip()
+        session_id = conversation_id(body)
+        print(f"📥 [Chat stream] Tin nhắn nhận được: {user_message}")
+
+        intent, reply = resolve_intent(user_message, "chat_stream")
+        if intent and not intent.speak:
+            remember(session_id, user_message, reply)
+            return Response(to_ndjson([{"type": "done", "reply": reply}]),
+                            mimetype="application/x-ndjson")
+
+        upstream = None
+        cache_key = None
+        history = []
+        if reply is None:
+            history = conversation_history(session_id)
+            cache_key = llm_cache_key(user_message, llm_cache_bypassed(body), history)
+            reply = llm_cache.get(cache_key)
+        if reply is not None:
+            tokens = iter([reply])
+        else:
+            headers, payload = build_llm_request(user_message, stream=True, history=history)
+            # Chỗ trong gateway được giữ tới khi luồng token kết thúc (trả lại trong generate)
+            llm_gateway.acquire()
+            try:
+                with STAGE_SECONDS.time("chat_stream", "llm_headers"):
+                    upstream = openrouter.post("chat/completions", json=payload, headers=headers, stream=True)
+                    upstream.raise_for_status()
+            except Exception as e:
+                llm_gateway.release(e)
+                raise
+            tokens = llm_cache.record(cache_key, iter_sse_tokens(upstream))
+        tokens = remembered(session_id, user_message, tokens)
+    except LLMUnavailable as e:
+        return llm_unavailable_response(e)
+    except Exception as e:
+        print("❌ Lỗi chat_stream_endpoint:", e)
+        traceback.print_exc()
+        return jsonify({"reply": "Xin lỗi, có lỗi xảy ra", "error": str(e)}), 500
+
+    stream_error = []
+
+    def generate():
+        try:
+            yield from to_ndjson(stream_reply_events(
+                tokens, lambda sentence: measured_audio_url(sentence, "chat_stream")))
+        except Exception as e:
+            stream_error.append(e)
+            print("❌ Lỗi chat_stream_endpoint:", e)
+            traceback.print_exc()
+            yield from to_ndjson([{"type": "error", "reply": "Xin lỗi, có lỗi xảy ra", "error": str(e)}])
+
+    def finish():
+        # Chạy cả khi client ngắt trước khi generate() bắt đầu: chỗ trong gateway luôn được trả
+        if upstream is not None:
+            upstream.close()
+            llm_gateway.release(stream_error[0] if stream_error else None)
+
+    response = Response(generate(), mimetype="application/x-ndjson",
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    response.call_on_close(finish)
+    return response
+
 @app.route("/static/audio/<filename>")
 def serve_audio(filename):
+    # File còn đang render (ở worker này hoặc worker khác): chờ một chút, quá hạn thì báo
+    # client thử lại sau
+    if tts_jobs.status(filename) == "pending":
+        state = tts_jobs.wait(filename, AUDIO_WAIT_SECONDS)
+        if state == "pending":
+            return jsonify({"status": "pending"}), 202, {"Retry-After": "1"}
+        if state == "failed":
+            return jsonify({"status": "failed"}), 404
     return send_from_directory(AUDIO_FOLDER, filename)
 
+@app.route("/audio/stream/<token>", methods=["GET"])
+def stream_audio(token):
+    """
+    mp3 của nội dung trong token, tổng hợp và đẩy thẳng ra response (hỗ trợ Range, ETag).
+    Chỉ nhận token do chính server ký (URL trong response /chat, /note, ...).
+    """
+    try:
+        text = decode_audio_token(token, AUDIO_TOKEN_SECRET)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return audio_stream_response(tts_engine, text, request)
+
+@app.route("/audio/<audio_id>", methods=["GET"])
+def audio_status(audio_id):
+    """Trạng thái một job TTS (audio_id trong response của /chat, /note)."""
+    filename = f"{audio_id}.mp3"
+    if not CACHE_FILE_RE.match(filename):
+        return jsonify({"error": "audio_id không hợp lệ"}), 400
+    state = tts_jobs.status(filename)
+    return jsonify({"audio_id": audio_id, "status": state, "audio_url": f"/static/audio/{filename}"})
+
 @app.route("/note", methods=["POST"])
 def create_note():
     data = request.json
@@ -197,30 +697,16 @@ def create_note():
         content = content.lower().replace('tạo ghi chú', '').strip()
         note_title = content or "Ghi chú"
 
-    conn = sqlite3.connect('notes.db')
-    cursor = conn.cursor()
-    cursor.execute('INSERT INTO notes (title, content) VALUES (?, ?)', (note_title, content))
-    note_id = cursor.lastrowid
+    with STAGE_SECONDS.time("note", "db"):
+        note_id = notes_store.insert(note_title, content)
     created_at = datetime.now().isoformat()
-    conn.commit()
-    conn.close()
 
     reply_text = f"Đã tạo ghi chú '{content}' thành công!"
 
-    try:
-        tts = gTTS(text=reply_text, lang="vi", tld="com.vn")
-        filename = f"{uuid.uuid4()}.mp3"
-        filepath = os.path.join(AUDIO_FOLDER, filename)
-        tts.save(filepath)
-        auto_delete_file(filepath)
-        audio_url = f"/static/audio/{filename}"
-    except:
-        audio_url = None
-
     return jsonify({
         'reply': reply_text,
         'type': 'note_created',
-        'audio_url': audio_url,
+        **queue_reply_audio(reply_text, "note"),
         'note_data': {
             'id': note_id,
             'title': note_title,
@@ -231,41 +717,162 @@ def create_note():
 
 @app.route("/note", methods=["GET"])
 def get_notes():
-    conn = sqlite3.connect('notes.db')
-    cursor = conn.cursor()
-    cursor.execute('SELECT id, title, content, created_at FROM notes ORDER BY created_at DESC')
-    rows = cursor.fetchall()
-    conn.close()
-    return jsonify([
-        {"id": r[0], "title": r[1], "content": r[2], "created_at": r[3]} for r in rows
-    ])
+    """
+    Không có tham số: trả về toàn bộ danh sách như cũ.
+    ?limit=&cursor= : phân trang keyset, ?q= : tìm toàn văn (có đoạn trích, xếp hạng).
+    """
+    args = request.args
+    if not any(k in args for k in ("limit", "cursor", "q")):
+        return jsonify(notes_store.all())
+    try:
+        limit = int(args.get("limit", DEFAULT_PAGE_SIZE))
+        q = args.get("q", "").strip()
+        if q:
+            return jsonify(notes_store.search(q, limit, args.get("cursor")))
+        return jsonify(notes_store.page(limit, args.get("cursor")))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+def bulk_import_response(parse, insert_batch):
+    try:
+        imported = import_ndjson(request.stream, parse, insert_batch, BULK_BATCH_SIZE)
+    except BadRecord as e:
+        return jsonify({"error": str(e), "line": e.line, "imported": e.imported}), 400
+    return jsonify({"imported": imported})
+
+@app.route("/note/export", methods=["GET"])
+def export_notes():
+    """Toàn bộ ghi chú dạng NDJSON, đọc và gửi dần từng lô thay vì dựng cả danh sách."""
+    return Response(to_ndjson(notes_store.iter_all(BULK_BATCH_SIZE)), mimetype="application/x-ndjson")
+
+@app.route("/note/import", methods=["POST"])
+def import_notes():
+    """
+    Body NDJSON, mỗi dòng {"title", "content", "created_at"?}: ghi theo lô, không tạo âm thanh.
+    Dòng lỗi: 400 kèm số dòng và số bản ghi đã nhập trước đó.
+    """
+    def insert_batch(rows):
+        with STAGE_SECONDS.time("note_import", "db"):
+            notes_store.insert_many(rows)
+    return bulk_import_response(note_import_row, insert_batch)
 
 @app.route("/task", methods=["POST"])
 def create_task():
     data = request.json
-    task = {
-        'id': len(tasks) + 1,
-        'task': data.get('task'),
-        'remind_time': data.get('remind_time')
-    }
-    tasks.append(task)
-    return jsonify({'reply': f"🛎️ Đã tạo nhắc việc: {task['task']}"}), 201
+    task = Task(task=data.get('task'), remind_time=data.get('remind_time'))
+    db.session.add(task)
+    db.session.commit()
+    return jsonify({'reply': f"🛎️ Đã tạo nhắc việc: {task.task}", 'task': task.to_dict()}), 201
 
 @app.route("/task", methods=["GET"])
 def get_tasks():
-    return jsonify(tasks)
+    return jsonify([t.to_dict() for t in Task.query.order_by(Task.id).all()])
 
 @app.route("/appointment", methods=["GET"])
 def get_appointments():
     with app.app_context():
-        return jsonify([
-            {
-                'id': a.id,
-                'datetime': a.datetime.strftime("%Y-%m-%d %H:%M"),
-                'description': a.description,
-                'notified': a.notified
-            } for a in Appointment.query.all()
-        ])
+        return jsonify([a.to_dict() for a in Appointment.query.all()])
+
+def appointment_import_row(record):
+    due = record["datetime"]
+    if not isinstance(due, str):
+        raise ValueError("datetime phải là chuỗi")
+    due = datetime.fromisoformat(due)
+    if due.tzinfo is not None:
+        # Cột datetime lưu giờ địa phương không kèm múi giờ (so với datetime.now() của lịch nhắc)
+        due = due.astimezone().replace(tzinfo=None)
+    notified = record.get("notified", False)
+    if not isinstance(notified, bool):
+        raise ValueError("notified phải là true hoặc false")
+    return {
+        "datetime": due,
+        "description": require_text(record, "description", max_length=255),
+        "notified": notified,
+    }
+
+@app.route("/appointment/export", methods=["GET"])
+def export_appointments():
+    """Toàn bộ nhắc nhở dạng NDJSON, đọc dần qua cursor của DB (yield_per)."""
+    engine = db.engine
+    table = Appointment.__table__
+
+    def rows():
+        with engine.connect() as conn:
+            result = conn.execution_options(yield_per=BULK_BATCH_SIZE).execute(
+                db.select(table).order_by(table.c.id))
+            for row in result:
+                # Row có cùng tên thuộc tính với model
+                yield Appointment.to_dict(row)
+
+    return Response(to_ndjson(rows()), mimetype="application/x-ndjson")
+
+@app.route("/appointment/import", methods=["POST"])
+def import_appointments():
+    """
+    Body NDJSON, mỗi dòng {"datetime", "description", "notified"?} (như /appointment/export;
+    id và version được cấp mới). Mỗi lô là một INSERT executemany trong một transaction.
+    """
+    engine = db.engine
+    insert = db.insert(Appointment.__table__)
+
+    def insert_batch(rows):
+        with STAGE_SECONDS.time("appointment_import", "db"), engine.begin() as conn:
+            conn.execute(insert, rows)
+
+    response = bulk_import_response(appointment_import_row, insert_batch)
+    # Lịch nhắc và client đang theo dõi thay đổi thấy ngay các nhắc nhở vừa nhập
+    reminder_scheduler.resync()
+    change_feed.notify()
+    return response
+
+def feed_cursor():
+    # SSE tự gửi lại id của event cuối qua Last-Event-ID khi kết nối lại
+    value = request.args.get("cursor") or request.headers.get("Last-Event-ID") or "0"
+    return max(0, int(value))
+
+@app.route("/appointment/changes", methods=["GET"])
+def get_appointment_changes():
+    """
+    Đồng bộ delta: các nhắc nhở đã tạo/đổi sau cursor (version), kèm cursor mới.
+    wait=N (giây, tối đa 30): nếu chưa có gì mới thì giữ kết nối tới khi có (long-poll).
+    """
+    try:
+        cursor = feed_cursor()
+        limit = min(int(request.args.get("limit", FEED_DEFAULT_LIMIT)), FEED_MAX_LIMIT)
+        wait = min(float(request.args.get("wait", 0)), 30)
+    except ValueError:
+        return jsonify({"error": "cursor, limit, wait phải là số"}), 400
+
+    items, next_cursor, has_more = change_feed.changes(cursor, limit)
+    if not items and wait > 0:
+        try:
+            unsubscribe = change_feed.subscribe()
+        except FeedBusy:
+            return jsonify({"items": [], "cursor": cursor, "has_more": False}), 200, {"Retry-After": "5"}
+        try:
+            with STAGE_SECONDS.time("appointment_changes", "wait"):
+                change_feed.wait(cursor, wait)
+        finally:
+            unsubscribe()
+        items, next_cursor, has_more = change_feed.changes(cursor, limit)
+    return jsonify({"items": items, "cursor": next_cursor, "has_more": has_more})
+
+@app.route("/appointment/stream", methods=["GET"])
+def stream_appointment_changes():
+    """SSE: đẩy từng thay đổi ngay khi có, event "reminder" khi nhắc nhở vừa đến hạn."""
+    try:
+        cursor = feed_cursor()
+    except ValueError:
+        return jsonify({"error": "cursor phải là số"}), 400
+    try:
+        unsubscribe = change_feed.subscribe()
+    except FeedBusy:
+        return jsonify({"error": "Quá nhiều kết nối, hãy dùng /appointment/changes"}), 503, {"Retry-After": "30"}
+    response = Response(change_feed.sse(cursor), mimetype="text/event-stream",
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    # Nhả chỗ cả khi client ngắt trước khi luồng sự kiện bắt đầu
+    response.call_on_close(unsubscribe)
+    return response
 
 @app.route("/appointment/<int:reminder_id>/notified", methods=["POST"])
 def mark_as_notified(reminder_id):
@@ -274,26 +881,141 @@ def mark_as_notified(reminder_id):
         if appt:
             appt.notified = True
             db.session.commit()
+            change_feed.notify()
             return jsonify({"status": "ok"})
         return jsonify({"status": "not found"}), 404
 
-def check_appointments():
-    while True:
-        with app.app_context():   
-            now = datetime.now()
-            upcoming = Appointment.query.filter(Appointment.datetime <= now, Appointment.notified == False).all()
-            for appt in upcoming:
-                print(f"🔔 Nhắc nhở: {appt.description} lúc {appt.datetime}")
-                appt.notified = True
-                db.session.commit()
-            time.sleep(60)
+# Nhắc nhở chạy theo sự kiện: ngủ đến đúng hạn gần nhất thay vì quét DB mỗi 60 giây.
+# Nhắc nhở do worker khác tạo được leader thấy qua version sau tối đa REMINDER_POLL_SECONDS;
+# nạp lại toàn bộ mỗi REMINDER_RESYNC_SECONDS chỉ còn là lưới an toàn.
+# Client đang chờ (SSE, long-poll) nhận thay đổi ngay; worker khác thấy qua MAX(version)
+change_feed = ChangeFeed(
+    app, db, Appointment, Appointment.to_dict,
+    poll_interval=float(os.getenv("FEED_POLL_SECONDS", "1")),
+    # Mỗi kết nối chờ giữ một luồng của worker (gunicorn gthread: 8): chừa luồng cho request khác
+    max_subscribers=int(os.getenv("FEED_MAX_SUBSCRIBERS", "4")),
+)
+
+reminder_scheduler = ReminderScheduler(
+    app, db, Appointment,
+    on_fire=lambda fired: change_feed.notify(),
+    prepare=storage.ensure_migrated,
+    resync_interval=int(os.getenv("REMINDER_RESYNC_SECONDS", "300")),
+    poll_interval=float(os.getenv("REMINDER_POLL_SECONDS", "0.5")),
+)
+
+def start_background_jobs():
+    audio_janitor.start()
+    reminder_scheduler.start()
+    # Làm nóng chỉ ở leader: N worker cùng làm mới sẽ nhân số lần gọi OpenWeather lên N;
+    # các worker khác vẫn nạp cache của mình khi có request
+    if WEATHER_WARM_TOP_N > 0:
+        weather_cache.start_refresher(top_n=WEATHER_WARM_TOP_N)
+
+def stop_background_jobs():
+    weather_cache.stop_refresher()
+    reminder_scheduler.stop()
+    audio_janitor.stop()
+
+# Nhiều worker gunicorn: chỉ một process (leader, bầu qua lease SQLite) chạy job nền
+leader = LeaderElection(
+    os.getenv("LEADER_DB_PATH", "leader.db"),
+    ttl=int(os.getenv("LEADER_LEASE_SECONDS", "30")),
+    on_elected=start_background_jobs,
+    on_demoted=stop_background_jobs,
+)
+
+def start_process():
+    """
+    Khởi động các luồng nền của process. Import main không tạo luồng nào, nên gunicorn
+    (preload_app) nạp app một lần ở master rồi fork worker gần như tức thì; mỗi worker
+    gọi hàm này trong post_fork. Chạy thẳng (python main.py, flask run) thì gọi ngay lúc import;
+    các lệnh `flask migrate`, `flask routes`, ... thì không (xem one_shot_cli).
+    """
+    # Nhiều worker gunicorn: mỗi worker ghi snapshot metrics vào thư mục chung để /metrics cộng dồn
+    if os.getenv("METRICS_DIR"):
+        REGISTRY.enable_multiprocess(os.getenv("METRICS_DIR"))
+    # Migration chạy nền ngay khi khởi động để request đầu tiên không phải chờ
+    threading.Thread(target=storage.ensure_migrated, name="migrate", daemon=True).start()
+    leader.start()
+
+def one_shot_cli():
+    """True khi được nạp cho một lệnh `flask ...` chạy một lần (migrate, routes, shell), không phải `flask run`."""
+    if os.getenv("FLASK_RUN_FROM_CLI") != "true":
+        return False
+    ctx = click.get_current_context(silent=True)
+    return ctx is None or ctx.command.name != "run"
+
+# Lệnh CLI một lần không được giành lease leader hay chạy lịch nhắc, dọn file, làm mới thời tiết
+if not os.getenv("DEFER_PROCESS_START") and not one_shot_cli():
+    start_process()
+
+@app.route("/upstream/stats", methods=["GET"])
+def get_upstream_stats():
+    stats = upstream_stats()
+    stats["weather_cache"] = weather_cache.cache.stats()
+    stats["tts_jobs"] = tts_jobs.stats()
+    stats["tts_chunks"] = tts_engine.stats()
+    stats["llm_cache"] = llm_cache.stats()
+    stats["llm_gateway"] = llm_gateway.stats()
+    stats["conversations"] = conversations.stats()
+    stats["leader"] = {"is_leader": leader.is_leader, "identity": leader.identity}
+    return jsonify(stats)
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+def profiler_authorized():
+    return profiler.authorized(request.headers.get("X-Profile-Token"))
+
+@app.route("/admin/profile", methods=["POST"])
+def start_profile_window():
+    """
+    Lấy mẫu mọi luồng của worker này trong "seconds" giây (0 < seconds <= 60).
+    Profile chỉ nằm trong bộ nhớ của worker đã nhận request: với nhiều worker gunicorn,
+    /admin/profiles chỉ thấy nó nếu rơi đúng vào worker đó (gọi lại tới khi thấy, hoặc
+    chạy một worker khi cần đo).
+    """
+    if not profiler_authorized():
+        return jsonify({"error": "not found"}), 404
+    data = request.get_json(silent=True) or {}
+    seconds = data.get("seconds", 10) if isinstance(data, dict) else None
+    try:
+        if isinstance(seconds, bool):
+            raise TypeError(seconds)
+        seconds = float(seconds)
+    except (TypeError, ValueError):
+        return jsonify({"error": "seconds phải là số"}), 400
+    if not (math.isfinite(seconds) and 0 < seconds <= 60):
+        return jsonify({"error": "seconds phải lớn hơn 0 và không quá 60"}), 400
+    if not profiler.start_window(seconds):
+        return jsonify({"error": "Đang có một phiên lấy mẫu khác"}), 409
+    return jsonify({"status": "started", "seconds": seconds}), 202
+
+@app.route("/admin/profiles", methods=["GET"])
+def list_profiles():
+    if not profiler_authorized():
+        return jsonify({"error": "not found"}), 404
+    return jsonify({"profiles": profiler.list(), "window_running": profiler.window_running()})
+
+@app.route("/admin/profiles/<int:profile_id>", methods=["GET"])
+def download_profile(profile_id):
+    """format=pstats|text cho cProfile, collapsed cho profile lấy mẫu (flamegraph)."""
+    profile = profiler.get(profile_id) if profiler_authorized() else None
+    if profile is None:
+        return jsonify({"error": "not found"}), 404
+    try:
+        body, mimetype, filename = profile.render(request.args.get("format"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return Response(body, content_type=mimetype,
+                    headers={"Content-Disposition": f'attachment; filename="{filename}"'})
 
 @app.route("/")
 def index():
     return "✅ Flask server is running!"
 
 if __name__ == "__main__":
-    init_notes_db()
     print("🚀 Starting Flask server...")
-    threading.Thread(target=check_appointments, daemon=True).start()
     app.run(debug=True, host="0.0.0.0", port=5000)
@@ -0,0 +1,331 @@
+import glob
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Giây: từ 1 ms (định tuyến intent, đọc DB) tới 30 s (LLM chậm)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class Metric:
+    """
+    Gốc của Counter/Gauge/Histogram. Mỗi luồng ghi vào bản sao (shard) riêng nên
+    đường ghi không cần khóa; chỉ lúc xuất số liệu mới gộp các shard lại.
+    Shard của luồng đã kết thúc được gộp vào phần "retired" rồi bỏ đi.
+    """
+
+    type = None
+
+    def __init__(self, name, help, labelnames=(), registry=None):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards = {}   # id(shard) -> (thread, shard)
+        self._retired = {}  # labels -> giá trị của các luồng đã kết thúc
+        self._lock = threading.Lock()
+        (REGISTRY if registry is None else registry).register(self)
+
+    def _shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = {}
+            with self._lock:
+                # Server tạo luồng mới cho mỗi request: dọn shard cũ để không phình bộ nhớ
+                if len(self._shards) >= 256:
+                    self._retire_dead_locked()
+                self._shards[id(shard)] = (threading.current_thread(), shard)
+            return shard
+
+    def _retire_dead_locked(self):
+        for key, (thread, shard) in list(self._shards.items()):
+            if not thread.is_alive():
+                for labels, value in shard.items():
+                    self._retired[labels] = self._merge(self._retired.get(labels), value)
+                del self._shards[key]
+
+    def collect(self):
+        """{labels: giá trị} đã gộp mọi luồng của process này."""
+        with self._lock:
+            self._retire_dead_locked()
+            merged = dict(self._retired)
+            shards = [shard for _, shard in self._shards.values()]
+        for shard in shards:
+            # dict(...) sao chép nguyên khối dưới GIL, an toàn khi luồng chủ đang ghi
+            for labels, value in dict(shard).items():
+                merged[labels] = self._merge(merged.get(labels), value)
+        return merged
+
+    def _merge(self, a, b):
+        raise NotImplementedError
+
+    def describe(self):
+        return {"type": self.type, "help": self.help, "labelnames": list(self.labelnames)}
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, *labels, amount=1):
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+    def _merge(self, a, b):
+        return (a or 0) + b
+
+
+class Gauge(Metric):
+    """
+    Giá trị tức thời (số request đang chạy, đang chờ, ...), đọc từ hàm đăng ký lúc xuất số liệu.
+    merge: cách gộp giữa các worker, "sum" cho số lượng, "max" cho trạng thái (mã lớn nhất
+    trong các worker, cộng lại thì vô nghĩa).
+    """
+
+    type = "gauge"
+
+    def __init__(self, name, help, labelnames=(), registry=None, merge="sum"):
+        if merge not in ("sum", "max"):
+            raise ValueError(f"merge không hợp lệ: {merge}")
+        self.merge = merge
+        self._functions = {}  # labels -> hàm trả về giá trị hiện tại
+        super().__init__(name, help, labelnames, registry)
+
+    def set_function(self, fn, *labels):
+        self._functions[labels] = fn
+
+    def collect(self):
+        return {labels: fn() for labels, fn in list(self._functions.items())}
+
+    def _merge(self, a, b):
+        if a is None:
+            return b
+        return max(a, b) if self.merge == "max" else a + b
+
+
+class Histogram(Metric):
+    """Histogram kiểu Prometheus; mỗi dòng là [đếm theo bucket..., +Inf, tổng, số lần]."""
+
+    type = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        self.buckets = tuple(buckets)
+        super().__init__(name, help, labelnames, registry)
+
+    def observe(self, value, *labels):
+        shard = self._shard()
+        row = shard.get(labels)
+        if row is None:
+            row = shard[labels] = [0] * (len(self.buckets) + 3)
+        row[bisect_left(self.buckets, value)] += 1
+        row[-2] += value
+        row[-1] += 1
+
+    @contextmanager
+    def time(self, *labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def _merge(self, a, b):
+        return list(b) if a is None else [x + y for x, y in zip(a, b)]
+
+    def describe(self):
+        return {**super().describe(), "buckets": list(self.buckets)}
+
+
+class Registry:
+    """
+    Danh sách metric của process. Khi chạy nhiều worker (gunicorn), đặt METRICS_DIR:
+    mỗi worker định kỳ ghi snapshot của mình ra <METRICS_DIR>/<pid>.json và /metrics
+    cộng dồn mọi file, nên worker nào trả lời scrape cũng cho số liệu của cả nhóm.
+    Snapshot không được ghi lại trong STALE_FLUSHES chu kỳ (worker đã chết mà master chưa
+    kịp xoá file, xem child_exit trong gunicorn.conf.py) bị bỏ qua.
+    """
+
+    STALE_FLUSHES = 3
+
+    def __init__(self):
+        self._metrics = {}
+        self.directory = None
+        self.interval = None
+        self._flusher = None
+
+    def register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"metric {metric.name} đã được đăng ký")
+        self._metrics[metric.name] = metric
+
+    def snapshot(self):
+        return {
+            name: {**metric.describe(),
+                   "samples": [[list(labels), value] for labels, value in metric.collect().items()]}
+            for name, metric in self._metrics.items()
+        }
+
+    def enable_multiprocess(self, directory, interval=5.0):
+        """Bật gộp số liệu giữa các worker qua thư mục chung."""
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.interval = interval
+        if self._flusher is None:
+            def run():
+                while True:
+                    time.sleep(interval)
+                    try:
+                        self.flush()
+                    except OSError as e:
+                        print(f"⚠️ Ghi metrics lỗi: {e}")
+            self._flusher = threading.Thread(target=run, name="metrics-flusher", daemon=True)
+            self._flusher.start()
+
+    def flush(self):
+        # Ghi ra file tạm rồi đổi tên: process khác không bao giờ đọc phải file dở dang
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp_path, os.path.join(self.directory, f"{os.getpid()}.json"))
+
+    def gather(self):
+        """Snapshot cần xuất: của riêng process này, hoặc của mọi worker nếu bật METRICS_DIR."""
+        if not self.directory:
+            return [self.snapshot()]
+        self.flush()
+        stale_before = time.time() - self.STALE_FLUSHES * self.interval
+        snapshots = []
+        for path in glob.glob(os.path.join(self.directory, "*.json")):
+            try:
+                if os.path.getmtime(path) < stale_before:
+                    continue
+                with open(path) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+    def render(self):
+        """Định dạng văn bản của Prometheus (text exposition format 0.0.4)."""
+        merged = {}
+        for snapshot in self.gather():
+            for name, data in snapshot.items():
+                metric = self._metrics.get(name)
+                if metric is None:
+                    continue
+                entry = merged.setdefault(name, {})
+                for labels, value in data["samples"]:
+                    labels = tuple(labels)
+                    entry[labels] = metric._merge(entry.get(labels), value)
+
+        lines = []
+        for name, metric in self._metrics.items():
+            # Họ metric của counter mang hậu tố _total giống các mẫu của nó
+            family = f"{name}_total" if metric.type == "counter" else name
+            lines.append(f"# HELP {family} {metric.help}")
+            lines.append(f"# TYPE {family} {metric.type}")
+            for labels, value in sorted(merged.get(name, {}).items()):
+                if metric.type in ("counter", "gauge"):
+                    lines.append(f"{family}{_labels(metric.labelnames, labels)} {_number(value)}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(list(metric.buckets) + [math.inf], value):
+                    cumulative += count
+                    le = _labels(metric.labelnames + ("le",), labels + (_number(bound),))
+                    lines.append(f"{name}_bucket{le} {cumulative}")
+                lines.append(f"{name}_sum{_labels(metric.labelnames, labels)} {_number(value[-2])}")
+                lines.append(f"{name}_count{_labels(metric.labelnames, labels)} {value[-1]}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+def _number(value):
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+REGISTRY = Registry()
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Thời gian từng công đoạn bên trong một request, ví dụ endpoint="chat", stage="llm"
+STAGE_SECONDS = Histogram(
+    "ruby_stage_duration_seconds",
+    "Thời gian từng công đoạn xử lý (intent, db, llm, tts, ...).",
+    ["endpoint", "stage"],
+)
+HTTP_SECONDS = Histogram(
+    "ruby_http_request_duration_seconds",
+    "Thời gian xử lý request HTTP tới khi trả header.",
+    ["method", "route", "status"],
+)
+UPSTREAM_SECONDS = Histogram(
+    "ruby_upstream_request_duration_seconds",
+    "Thời gian mỗi lần gọi upstream (mỗi lần thử lại tính riêng).",
+    ["upstream"],
+)
+UPSTREAM_RESPONSES = Counter(
+    "ruby_upstream_responses",
+    "Số phản hồi upstream theo mã trạng thái (\"error\" = lỗi kết nối/timeout).",
+    ["upstream", "status"],
+)
+TTS_FAILURES = Counter(
+    "ruby_tts_failures",
+    "Số lần tạo âm thanh thất bại.",
+    ["endpoint"],
+)
+REMINDERS_FIRED = Counter(
+    "ruby_reminders_fired",
+    "Số nhắc nhở đã đến hạn và được gửi.",
+)
+TTS_JOBS = Counter(
+    "ruby_tts_jobs",
+    "Số yêu cầu TTS theo kết quả (cached, queued, joined, rejected, done, failed).",
+    ["outcome"],
+)
+TTS_CHUNKS = Counter(
+    "ruby_tts_chunks",
+    "Số đoạn TTS (~100 ký tự) theo kết quả cache (hit, miss, joined).",
+    ["outcome"],
+)
+LLM_CACHE = Counter(
+    "ruby_llm_cache",
+    "Số tin nhắn tới LLM theo kết quả cache (hit, miss, bypass).",
+    ["outcome"],
+)
+LLM_GATEWAY = Counter(
+    "ruby_llm_gateway",
+    "Số lần xin gọi LLM theo kết quả (admitted, queue_full, wait_timeout, circuit_open).",
+    ["outcome"],
+)
+LLM_GATEWAY_SLOTS = Gauge(
+    "ruby_llm_gateway_requests",
+    "Số request LLM đang chạy (in_flight) và đang xếp hàng chờ (waiting).",
+    ["state"],
+)
+LLM_CIRCUIT_STATE = Gauge(
+    "ruby_llm_circuit_state",
+    "Trạng thái circuit breaker của OpenRouter: 0 = đóng, 1 = mở, 2 = nửa mở (mã lớn nhất giữa các worker).",
+    merge="max",
+)
+FEED_SUBSCRIBERS = Gauge(
+    "ruby_change_feed_subscribers",
+    "Số kết nối đang chờ thay đổi lịch nhắc (SSE, long-poll).",
+)
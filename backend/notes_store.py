@@ -0,0 +1,231 @@
+import base64
+import itertools
+import json
+import re
+from datetime import datetime, timezone
+from bulk_io import require_text
+from storage import migrate_sqlite
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+# Phiên bản 1 của schema notes.db (xem NotesStore.migrate)
+SCHEMA_V1 = [
+    '''
+    CREATE TABLE IF NOT EXISTS notes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        title TEXT,
+        content TEXT NOT NULL,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    # Phân trang theo (created_at, id) giảm dần không cần sort cả bảng
+    'CREATE INDEX IF NOT EXISTS idx_notes_created_at ON notes(created_at DESC, id DESC)',
+    # Chỉ mục toàn văn, bỏ dấu tiếng Việt (riêng "đ" được xử lý khi dựng câu truy vấn)
+    '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(
+        title, content,
+        content='notes', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS notes_ai AFTER INSERT ON notes BEGIN
+        INSERT INTO notes_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS notes_ad AFTER DELETE ON notes BEGIN
+        INSERT INTO notes_fts(notes_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS notes_au AFTER UPDATE ON notes BEGIN
+        INSERT INTO notes_fts(notes_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+        INSERT INTO notes_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END
+    ''',
+]
+
+# Câu SQL cố định: sqlite3 giữ bản đã biên dịch theo nội dung câu lệnh trên mỗi kết nối
+INSERT_NOTE = 'INSERT INTO notes (title, content) VALUES (?, ?)'
+# Nhập hàng loạt: giữ created_at của bản sao lưu nếu có
+IMPORT_NOTE = 'INSERT INTO notes (title, content, created_at) VALUES (?, ?, COALESCE(?, CURRENT_TIMESTAMP))'
+SELECT_NOTES_BY_ID = 'SELECT id, title, content, created_at FROM notes ORDER BY id'
+SELECT_ALL_NOTES = 'SELECT id, title, content, created_at FROM notes ORDER BY created_at DESC'
+SELECT_FIRST_PAGE = '''
+    SELECT id, title, content, created_at FROM notes
+    ORDER BY created_at DESC, id DESC LIMIT ?
+'''
+SELECT_PAGE_AFTER = '''
+    SELECT id, title, content, created_at FROM notes
+    WHERE (created_at, id) < (?, ?)
+    ORDER BY created_at DESC, id DESC LIMIT ?
+'''
+_SEARCH = '''
+    SELECT n.id, n.title, n.content, n.created_at, m.score, m.snippet
+    FROM (
+        SELECT rowid AS id, bm25(notes_fts, 2.0, 1.0) AS score,
+               snippet(notes_fts, -1, '[', ']', '…', 12) AS snippet
+        FROM notes_fts WHERE notes_fts MATCH ?
+    ) AS m
+    JOIN notes n ON n.id = m.id
+'''
+SEARCH_FIRST_PAGE = _SEARCH + ' ORDER BY m.score, m.id LIMIT ?'
+SEARCH_PAGE_AFTER = _SEARCH + '''
+    WHERE m.score > ? OR (m.score = ? AND m.id > ?)
+    ORDER BY m.score, m.id LIMIT ?
+'''
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+def encode_cursor(values):
+    raw = json.dumps(values, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor, types):
+    """
+    Giá trị keyset trong cursor: một list đúng len(types) phần tử, phần tử thứ i có kiểu
+    types[i]. Cursor hỏng hay bị sửa tay chỉ gây một ValueError (route trả về 400).
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded))
+    except Exception:
+        raise ValueError("cursor không hợp lệ")
+    if (not isinstance(values, list) or len(values) != len(types)
+            or any(isinstance(v, bool) or not isinstance(v, t) for v, t in zip(values, types))):
+        raise ValueError("cursor không hợp lệ")
+    return values
+
+
+def build_match_query(q):
+    """
+    Chuyển câu tìm kiếm thành biểu thức MATCH của FTS5.
+    unicode61 bỏ được dấu thanh nhưng không coi "đ" là "d", nên mỗi từ có chữ d/đ
+    được mở rộng thành các biến thể ("da" -> "da" OR "đa"). Từ cuối khớp theo tiền tố.
+    """
+    tokens = TOKEN_RE.findall(q.lower())
+    terms = []
+    for i, token in enumerate(tokens):
+        prefix = "*" if i == len(tokens) - 1 else ""
+        base = token.replace("đ", "d")
+        positions = [j for j, ch in enumerate(base) if ch == "d"][:3]
+        variants = []
+        for combo in itertools.product("dđ", repeat=len(positions)):
+            chars = list(base)
+            for pos, ch in zip(positions, combo):
+                chars[pos] = ch
+            variants.append(f'"{"".join(chars)}"{prefix}')
+        terms.append(variants[0] if len(variants) == 1 else "(" + " OR ".join(variants) + ")")
+    return " AND ".join(terms)
+
+
+def note_import_row(record):
+    """Một dòng NDJSON ({"title", "content", "created_at"}) -> tham số cho insert_many."""
+    content = require_text(record, "content")
+    title = record.get("title") or "Ghi chú"
+    if not isinstance(title, str):
+        raise ValueError("title phải là chuỗi")
+    created_at = record.get("created_at")
+    if created_at is not None:
+        # Cột lưu dạng CURRENT_TIMESTAMP của SQLite (UTC, "YYYY-MM-DD HH:MM:SS") và được so
+        # sánh như chuỗi khi phân trang: mọi ISO 8601 khác (có "T", múi giờ, phần lẻ giây)
+        # đều phải đổi về đúng dạng đó. Không có múi giờ thì coi là UTC.
+        dt = datetime.fromisoformat(created_at)
+        if dt.tzinfo is not None:
+            dt = dt.astimezone(timezone.utc)
+        created_at = dt.strftime("%Y-%m-%d %H:%M:%S")
+    return title, content, created_at
+
+
+class NotesStore:
+    def __init__(self, pool):
+        self.pool = pool
+
+    def migrate(self):
+        with self.pool.connection() as conn:
+            migrate_sqlite(conn, [self._schema_v1])
+        print("✅ Notes database initialized")
+
+    @staticmethod
+    def _schema_v1(conn):
+        for statement in SCHEMA_V1:
+            conn.execute(statement)
+        # Nạp các ghi chú đã có vào chỉ mục toàn văn
+        conn.execute("INSERT INTO notes_fts(notes_fts) VALUES ('rebuild')")
+
+    def insert(self, title, content):
+        with self.pool.connection() as conn:
+            cursor = conn.execute(INSERT_NOTE, (title, content))
+            conn.commit()
+            return cursor.lastrowid
+
+    def insert_many(self, rows):
+        """rows: các bộ (title, content, created_at hoặc None), ghi trong một transaction."""
+        with self.pool.connection() as conn:
+            with conn:
+                conn.executemany(IMPORT_NOTE, rows)
+
+    def iter_all(self, batch_size=1000):
+        """
+        Toàn bộ ghi chú theo id, đọc dần qua một cursor mở suốt quá trình: chỉ batch_size
+        dòng nằm trong bộ nhớ mỗi lúc. Giữ một kết nối của pool tới khi generator đóng.
+        """
+        with self.pool.connection() as conn:
+            cursor = conn.execute(SELECT_NOTES_BY_ID)
+            try:
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        return
+                    for r in rows:
+                        yield {"id": r[0], "title": r[1], "content": r[2], "created_at": r[3]}
+            finally:
+                cursor.close()
+
+    def all(self):
+        with self.pool.connection() as conn:
+            rows = conn.execute(SELECT_ALL_NOTES).fetchall()
+        return [{"id": r[0], "title": r[1], "content": r[2], "created_at": r[3]} for r in rows]
+
+    def page(self, limit=DEFAULT_PAGE_SIZE, cursor=None):
+        """Một trang ghi chú mới nhất trước, phân trang keyset theo (created_at, id)."""
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        with self.pool.connection() as conn:
+            if cursor:
+                created_at, note_id = decode_cursor(cursor, (str, int))
+                rows = conn.execute(SELECT_PAGE_AFTER, (created_at, note_id, limit + 1)).fetchall()
+            else:
+                rows = conn.execute(SELECT_FIRST_PAGE, (limit + 1,)).fetchall()
+        items = [{"id": r[0], "title": r[1], "content": r[2], "created_at": r[3]} for r in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            last = rows[limit - 1]
+            next_cursor = encode_cursor([last[3], last[0]])
+        return {"items": items, "next_cursor": next_cursor}
+
+    def search(self, q, limit=DEFAULT_PAGE_SIZE, cursor=None):
+        """Tìm toàn văn trong tiêu đề và nội dung, xếp theo bm25, kèm đoạn trích."""
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        match = build_match_query(q)
+        if not match:
+            return {"items": [], "next_cursor": None}
+        with self.pool.connection() as conn:
+            if cursor:
+                score, note_id = decode_cursor(cursor, ((int, float), int))
+                rows = conn.execute(SEARCH_PAGE_AFTER, (match, score, score, note_id, limit + 1)).fetchall()
+            else:
+                rows = conn.execute(SEARCH_FIRST_PAGE, (match, limit + 1)).fetchall()
+        items = [
+            {"id": r[0], "title": r[1], "content": r[2], "created_at": r[3],
+             "score": r[4], "snippet": r[5]}
+            for r in rows[:limit]
+        ]
+        next_cursor = None
+        if len(rows) > limit:
+            last = rows[limit - 1]
+            next_cursor = encode_cursor([last[4], last[0]])
+        return {"items": items, "next_cursor": next_cursor}
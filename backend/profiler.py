@@ -0,0 +1,226 @@
+import hmac
+import io
+import itertools
+import marshal
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from werkzeug.wsgi import ClosingIterator
+
+MODES = ("cprofile", "sample")
+
+
+def _frame_label(frame):
+    # Tên module đầy đủ (sqlalchemy.engine.base, time_utils, ...) để phân biệt file trùng tên
+    module = frame.f_globals.get("__name__") or os.path.basename(frame.f_code.co_filename)
+    return f"{module}:{frame.f_code.co_name}"
+
+
+def _collapse(frame):
+    """Ngăn xếp dạng "gốc;...;ngọn" (định dạng collapsed của flamegraph.pl / speedscope)."""
+    names = []
+    while frame is not None:
+        names.append(_frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class Sampler:
+    """
+    Profiler lấy mẫu: luồng nền chụp ngăn xếp của các luồng cần theo dõi mỗi interval giây
+    qua sys._current_frames(). Không gắn hook vào từng lời gọi hàm như cProfile nên gần như
+    không làm chậm code được đo, và xem được mọi luồng cùng lúc (TTS, lịch nhắc, ...).
+    """
+
+    def __init__(self, thread_ids=None, interval=0.005, exclude=()):
+        self.thread_ids = thread_ids  # None = mọi luồng
+        self.exclude = set(exclude)
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def collapsed(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def _run(self):
+        self.exclude.add(threading.get_ident())
+        while not self._stop.wait(self.interval):
+            self.samples += 1
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id in self.exclude or (self.thread_ids is not None and thread_id not in self.thread_ids):
+                    continue
+                self.stacks[_collapse(frame)] += 1
+
+
+class _LoadedStats:
+    """Cho pstats.Stats đọc lại dữ liệu đã marshal (nó nhận đối tượng có create_stats())."""
+
+    def __init__(self, data):
+        self.stats = marshal.loads(data)
+
+    def create_stats(self):
+        pass
+
+
+class Profile:
+    """Một lần đo đã xong, giữ trong ring buffer của Profiler."""
+
+    def __init__(self, id, mode, label, started, duration, data, samples=None):
+        self.id = id
+        self.mode = mode
+        self.label = label
+        self.started = started
+        self.duration = duration
+        self.data = data  # cprofile: bytes marshal của pstats; sample: text collapsed
+        self.samples = samples
+
+    def summary(self):
+        return {"id": self.id, "mode": self.mode, "label": self.label,
+                "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started)),
+                "duration_ms": round(self.duration * 1000, 2), "samples": self.samples,
+                "formats": ["pstats", "text"] if self.mode == "cprofile" else ["collapsed"]}
+
+    def render(self, fmt):
+        """(body, mimetype, tên file) theo định dạng tải về; ValueError nếu không hỗ trợ."""
+        if self.mode == "sample" and fmt in (None, "collapsed"):
+            return self.data, "text/plain; charset=utf-8", f"profile-{self.id}.folded"
+        if self.mode == "cprofile" and fmt in (None, "pstats"):
+            # Đọc được bằng `python -m pstats profile-N.prof`, snakeviz, ...
+            return self.data, "application/octet-stream", f"profile-{self.id}.prof"
+        if self.mode == "cprofile" and fmt == "text":
+            import pstats
+            out = io.StringIO()
+            pstats.Stats(_LoadedStats(self.data), stream=out).sort_stats("cumulative").print_stats(60)
+            return out.getvalue(), "text/plain; charset=utf-8", f"profile-{self.id}.txt"
+        raise ValueError(f"định dạng {fmt} không hỗ trợ cho profile {self.mode}")
+
+
+class Profiler:
+    """
+    Đo hiệu năng theo yêu cầu, tắt hẳn khi không cấu hình token:
+    - một request: header X-Profile: cprofile|sample kèm X-Profile-Token;
+    - một khoảng thời gian: start_window(seconds) lấy mẫu mọi luồng của process.
+    Kết quả nằm trong ring buffer max_profiles bản gần nhất.
+    """
+
+    def __init__(self, token, max_profiles=20, sample_interval=0.005):
+        self.token = token
+        self.sample_interval = sample_interval
+        self._profiles = deque(maxlen=max_profiles)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._window = None
+        # Từ Python 3.12 cProfile dùng sys.monitoring: cả process chỉ bật được một profiler
+        self._cprofile_lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return bool(self.token)
+
+    def authorized(self, token):
+        return self.enabled and hmac.compare_digest(token or "", self.token)
+
+    def wrap(self, wsgi_app):
+        """Middleware WSGI; khi tắt trả về nguyên wsgi_app nên request thường không tốn gì."""
+        if not self.enabled:
+            return wsgi_app
+
+        def middleware(environ, start_response):
+            mode = environ.get("HTTP_X_PROFILE")
+            if mode not in MODES or not self.authorized(environ.get("HTTP_X_PROFILE_TOKEN")):
+                return wsgi_app(environ, start_response)
+            label = f"{environ.get('REQUEST_METHOD')} {environ.get('PATH_INFO')}"
+            finish = self.begin(mode, label)
+            if finish is None:
+                return wsgi_app(environ, start_response)
+            try:
+                body = wsgi_app(environ, start_response)
+            except BaseException:
+                finish()
+                raise
+            # Kết thúc khi server đóng response: tính cả phần body sinh dần (stream)
+            return ClosingIterator(body, finish)
+
+        return middleware
+
+    def begin(self, mode, label):
+        """
+        Bắt đầu đo luồng hiện tại; trả về hàm kết thúc (gọi trên cùng luồng),
+        hoặc None nếu đang có request khác chạy cProfile.
+        """
+        started = time.time()
+        start = time.perf_counter()
+        if mode == "cprofile":
+            if not self._cprofile_lock.acquire(blocking=False):
+                print(f"⚠️ Bỏ qua profile {label}: đang có request khác chạy cProfile")
+                return None
+            import cProfile  # chỉ nạp khi thật sự profile
+            profile = cProfile.Profile()
+            profile.enable()
+
+            def finish():
+                profile.disable()
+                self._cprofile_lock.release()
+                profile.create_stats()
+                self._store("cprofile", label, started, time.perf_counter() - start,
+                            marshal.dumps(profile.stats))
+        else:
+            sampler = Sampler({threading.get_ident()}, self.sample_interval).start()
+
+            def finish():
+                sampler.stop()
+                self._store("sample", label, started, time.perf_counter() - start,
+                            sampler.collapsed(), sampler.samples)
+        return finish
+
+    def start_window(self, seconds):
+        """Lấy mẫu mọi luồng trong seconds giây ở nền; False nếu đang có một cửa sổ khác."""
+        with self._lock:
+            if self._window is not None:
+                return False
+            self._window = threading.Thread(target=self._run_window, args=(seconds,),
+                                            name="profiler-window", daemon=True)
+            self._window.start()
+        return True
+
+    def _run_window(self, seconds):
+        started = time.time()
+        start = time.perf_counter()
+        sampler = Sampler(None, self.sample_interval, exclude={threading.get_ident()}).start()
+        try:
+            time.sleep(seconds)
+        finally:
+            sampler.stop()
+            self._store("sample", f"window {seconds:g}s", started, time.perf_counter() - start,
+                        sampler.collapsed(), sampler.samples)
+            with self._lock:
+                self._window = None
+
+    def _store(self, mode, label, started, duration, data, samples=None):
+        with self._lock:
+            profile = Profile(next(self._ids), mode, label, started, duration, data, samples)
+            self._profiles.append(profile)
+        print(f"🔬 Profile #{profile.id} ({mode}) {label}: {duration * 1000:.1f} ms")
+
+    def list(self):
+        with self._lock:
+            return [p.summary() for p in reversed(self._profiles)]
+
+    def get(self, profile_id):
+        with self._lock:
+            return next((p for p in self._profiles if p.id == profile_id), None)
+
+    def window_running(self):
+        return self._window is not None
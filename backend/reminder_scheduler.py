@@ -0,0 +1,204 @@
+import heapq
+import threading
+from datetime import datetime, timedelta
+from metrics import REMINDERS_FIRED, STAGE_SECONDS
+
+# Thử lại khi không đọc/ghi được DB: 1, 2, 4, ... tối đa 60 giây
+RETRY_BASE_SECONDS = 1
+RETRY_MAX_SECONDS = 60
+
+
+class ReminderScheduler:
+    """
+    Lịch nhắc nhở hướng sự kiện: thời điểm đến hạn nằm trong một min-heap nạp từ DB,
+    luồng nền ngủ đúng đến hạn gần nhất và được đánh thức khi có nhắc nhở mới.
+    Các nhắc nhở đến hạn cùng lúc được đánh dấu notified trong một lần UPDATE.
+    Nhắc nhở do worker khác tạo (add() ở đó không làm gì) được thấy qua cột version của model:
+    mỗi poll_interval giây luồng nền chỉ đọc các dòng có version mới hơn lần trước (có index).
+    """
+
+    def __init__(self, app, db, model, on_fire=None, prepare=None, resync_interval=300, poll_interval=None):
+        self.app = app
+        self.db = db
+        self.model = model
+        self.on_fire = on_fire
+        self.prepare = prepare  # chạy trong luồng nền trước khi nạp từ DB (vd. migration)
+        # Nạp lại từ DB định kỳ để thấy nhắc nhở do process khác tạo
+        self.resync_interval = resync_interval
+        self.poll_interval = poll_interval
+        self._version = 0  # version lớn nhất đã đọc từ DB
+        self._heap = []  # (datetime, id)
+        self._queued = set()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopped = False
+        self._resync_requested = False
+
+    def start(self):
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._stopped = False
+            self._thread = threading.Thread(target=self._run, name="reminder-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+            thread, self._thread = self._thread, None
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+    def add(self, appt_id, due):
+        """Gọi sau khi commit một Appointment mới."""
+        with self._cond:
+            if self._thread is None:
+                # Process khác đang chạy lịch nhắc: nó thấy bản ghi ở lần hỏi version kế tiếp
+                return
+            self._push_locked(appt_id, due)
+            if self._heap[0][1] == appt_id:
+                self._cond.notify()
+
+    def resync(self):
+        """Nạp lại từ DB ngay (sau khi nhập hàng loạt) thay vì chờ tới chu kỳ kế tiếp."""
+        with self._cond:
+            self._resync_requested = True
+            self._cond.notify()
+
+    def pending(self):
+        with self._cond:
+            return len(self._heap)
+
+    def _push_locked(self, appt_id, due):
+        if appt_id not in self._queued:
+            self._queued.add(appt_id)
+            heapq.heappush(self._heap, (due, appt_id))
+
+    def _seed(self):
+        Appointment = self.model
+        with self.app.app_context(), STAGE_SECONDS.time("reminder_scheduler", "seed"):
+            session = self.db.session
+            # Đọc version trước: dòng commit sau đó sẽ được lần hỏi version kế tiếp nhận
+            version = session.query(self.db.func.max(Appointment.version)).scalar() or 0
+            rows = (session.query(Appointment.id, Appointment.datetime)
+                    .filter(Appointment.notified == False)  # noqa: E712
+                    .all())
+        with self._cond:
+            for appt_id, due in rows:
+                self._push_locked(appt_id, due)
+            self._version = max(self._version, version)
+
+    def _poll_changes(self):
+        """Nạp các dòng tạo/đổi sau lần đọc trước (vd. do worker khác ghi)."""
+        Appointment = self.model
+        with self.app.app_context():
+            rows = (self.db.session.query(Appointment.id, Appointment.datetime,
+                                          Appointment.notified, Appointment.version)
+                    .filter(Appointment.version > self._version)
+                    .all())
+        if not rows:
+            return
+        with self._cond:
+            for appt_id, due, notified, _ in rows:
+                if not notified:
+                    self._push_locked(appt_id, due)
+            self._version = max(self._version, max(row.version for row in rows))
+            if self._heap:
+                self._cond.notify()
+
+    def _run(self):
+        if not self._start_with_retry():
+            return
+        next_seed = datetime.now() + timedelta(seconds=self.resync_interval)
+        next_poll = self._next_poll()
+        retry_delay = RETRY_BASE_SECONDS
+        while True:
+            with self._cond:
+                if self._stopped:
+                    return
+                now = datetime.now()
+                due_ids = []
+                while self._heap and self._heap[0][0] <= now:
+                    _, appt_id = heapq.heappop(self._heap)
+                    self._queued.discard(appt_id)
+                    due_ids.append(appt_id)
+                if not due_ids:
+                    timeout = (min(next_seed, next_poll or next_seed) - now).total_seconds()
+                    if self._resync_requested:
+                        timeout = 0
+                    elif self._heap:
+                        timeout = min(timeout, (self._heap[0][0] - now).total_seconds())
+                    if timeout > 0:
+                        self._cond.wait(timeout)
+                        continue
+            if due_ids:
+                try:
+                    self._fire(due_ids)
+                except Exception as e:
+                    # Các nhắc nhở chưa gửi vẫn notified = False: lần nạp lại (sớm, có backoff) đưa chúng về heap
+                    print(f"❌ Lỗi khi gửi nhắc nhở: {e}, nạp lại sau {retry_delay} giây")
+                    next_seed = datetime.now() + timedelta(seconds=retry_delay)
+                    retry_delay = min(retry_delay * 2, RETRY_MAX_SECONDS)
+            elif self._resync_requested or datetime.now() >= next_seed:
+                self._resync_requested = False
+                try:
+                    self._seed()
+                except Exception as e:
+                    print(f"❌ Lỗi khi nạp nhắc nhở: {e}, thử lại sau {retry_delay} giây")
+                    next_seed = datetime.now() + timedelta(seconds=retry_delay)
+                    retry_delay = min(retry_delay * 2, RETRY_MAX_SECONDS)
+                else:
+                    next_seed = datetime.now() + timedelta(seconds=self.resync_interval)
+                    next_poll = self._next_poll()
+                    retry_delay = RETRY_BASE_SECONDS
+            elif next_poll is not None and datetime.now() >= next_poll:
+                try:
+                    self._poll_changes()
+                except Exception as e:
+                    # Không mất gì: lần hỏi sau vẫn đọc từ version cũ
+                    print(f"⚠️ Lỗi khi hỏi nhắc nhở mới: {e}")
+                next_poll = self._next_poll()
+
+    def _next_poll(self):
+        if self.poll_interval:
+            return datetime.now() + timedelta(seconds=self.poll_interval)
+        return None
+
+    def _start_with_retry(self):
+        """
+        prepare() rồi nạp lần đầu; lỗi (database is locked lúc migration/chuyển WAL, migration
+        hỏng, ...) không được làm chết luồng: thử lại với backoff. False nếu bị stop() trước.
+        """
+        delay = RETRY_BASE_SECONDS
+        while True:
+            try:
+                if self.prepare:
+                    self.prepare()
+                self._seed()
+                return True
+            except Exception as e:
+                print(f"❌ Lỗi khi khởi động lịch nhắc: {e}, thử lại sau {delay} giây")
+            with self._cond:
+                if self._cond.wait_for(lambda: self._stopped, delay):
+                    return False
+            delay = min(delay * 2, RETRY_MAX_SECONDS)
+
+    def _fire(self, ids):
+        Appointment = self.model
+        with self.app.app_context(), STAGE_SECONDS.time("reminder_scheduler", "fire"):
+            session = self.db.session
+            due = (session.query(Appointment)
+                   .filter(Appointment.id.in_(ids), Appointment.notified == False)  # noqa: E712
+                   .all())
+            if not due:
+                return
+            session.query(Appointment).filter(Appointment.id.in_([a.id for a in due])) \
+                .update({Appointment.notified: True}, synchronize_session=False)
+            session.commit()
+            fired = [{"id": a.id, "datetime": a.datetime, "description": a.description} for a in due]
+        REMINDERS_FIRED.inc(amount=len(fired))
+        for appt in fired:
+            print(f"🔔 Nhắc nhở: {appt['description']} lúc {appt['datetime']}")
+        if self.on_fire:
+            self.on_fire(fired)
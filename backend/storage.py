@@ -0,0 +1,146 @@
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+BUSY_TIMEOUT_MS = 5000
+
+# Áp dụng cho mọi kết nối SQLite, kể cả kết nối do SQLAlchemy tạo cho appointments.db:
+# WAL cho phép đọc song song với ghi, NORMAL đủ an toàn với WAL mà ít fsync hơn.
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}",
+    "PRAGMA foreign_keys=ON",
+)
+
+
+def apply_pragmas(conn):
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+
+
+@event.listens_for(Engine, "connect")
+def _sqlalchemy_sqlite_pragmas(dbapi_conn, _):
+    if isinstance(dbapi_conn, sqlite3.Connection):
+        cursor = dbapi_conn.cursor()
+        for pragma in PRAGMAS:
+            cursor.execute(pragma)
+        cursor.close()
+
+
+class SQLitePool:
+    """
+    Pool kết nối sqlite3 dùng chung giữa các luồng. Mỗi kết nối giữ cache
+    câu lệnh đã biên dịch, nên các câu SQL cố định được "prepare" một lần.
+    """
+
+    def __init__(self, path, size=8, timeout=10.0):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _new_connection(self):
+        conn = sqlite3.connect(
+            self.path,
+            timeout=BUSY_TIMEOUT_MS / 1000,
+            check_same_thread=False,
+            cached_statements=256,
+        )
+        apply_pragmas(conn)
+        return conn
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                create = True
+            else:
+                create = False
+        if create:
+            try:
+                return self._new_connection()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        return self._idle.get(timeout=self.timeout)
+
+    @contextmanager
+    def connection(self):
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            # Không trả về pool một kết nối còn giữ transaction (và khóa ghi)
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put(conn)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._lock:
+            self._created = 0
+
+
+class Storage:
+    """
+    Lớp truy cập dữ liệu chung cho notes.db (sqlite3 + pool) và appointments.db
+    (Flask-SQLAlchemy). Migration của cả hai chạy một lần mỗi process, khi cần
+    lần đầu hoặc qua lệnh `flask --app main migrate`, không chạy lúc import.
+    """
+
+    def __init__(self, notes_path, pool_size=8):
+        self.notes = SQLitePool(notes_path, size=pool_size)
+        self._migrations = []
+        self._migrated = False
+        self._migrate_lock = threading.Lock()
+
+    def migration(self, fn):
+        """Đăng ký một bước migration (idempotent), chạy theo thứ tự đăng ký."""
+        self._migrations.append(fn)
+        return fn
+
+    def migrate(self):
+        with self._migrate_lock:
+            if self._migrated:
+                return
+            for fn in self._migrations:
+                fn()
+            self._migrated = True
+
+    def ensure_migrated(self):
+        # Đường nhanh cho mỗi request: chỉ đọc một cờ
+        if not self._migrated:
+            self.migrate()
+
+
+def migrate_sqlite(conn, steps):
+    """
+    Chạy các bước schema chưa áp dụng, theo PRAGMA user_version.
+    BEGIN IMMEDIATE để nhiều worker khởi động cùng lúc không migrate chồng lên nhau.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for target, step in enumerate(steps, start=1):
+            if version < target:
+                step(conn)
+                conn.execute(f"PRAGMA user_version = {target}")
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
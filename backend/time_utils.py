@@ -1,12 +1,7 @@
 from datetime import datetime, timedelta
 import re
-import locale
 
-# Đảm bảo định dạng tiếng Việt nếu dùng hệ điều hành hỗ trợ
-try:
-    locale.setlocale(locale.LC_TIME, "vi_VN.UTF-8")
-except:
-    pass  # Bỏ qua nếu máy không hỗ trợ
+DATE_RE = re.compile(r"(?:ngày|mùng)?\s*(\d{1,2})\s*(?:[/-]|tháng)\s*(\d{1,2})")
 
 def extract_forecast_date(message: str) -> str:
     """
@@ -15,7 +10,7 @@ def extract_forecast_date(message: str) -> str:
     """
     message = message.lower()
     today = datetime.now()
-    match = re.search(r"(?:ngày|mùng)?\s*(\d{1,2})\s*(?:[/-]|tháng)\s*(\d{1,2})", message)
+    match = DATE_RE.search(message)
     if match:
         day, month = map(int, match.groups())
         year = today.year
@@ -56,34 +51,35 @@ def extract_forecast_date(message: str) -> str:
 
     return None  # Không xác định được ngày
 
+# Biên dịch một lần lúc import thay vì mỗi lần gọi parse_reminder
+REMINDER_RE = re.compile(
+    r'''
+    (?:
+        # Trường hợp mở đầu bằng "nhắc"
+        (?:(?:nhắc)(?: giúp)?(?: tôi)?|làm ơn nhắc(?: tôi)?)
+        \s*(?P<action1>.+?)\s*
+        (?:trong|sau)\s*(?P<number1>\d+)\s*(?P<unit1>giây|phút|giờ|ngày|tuần)(?: nữa)?
+    )
+    |
+    (?:
+        # Trường hợp mở đầu bằng "trong/sau"
+        (?:trong|sau)\s*(?P<number2>\d+)\s*(?P<unit2>giây|phút|giờ|ngày|tuần)(?: nữa)?[,]?\s*
+        (?:(?:hãy\s*)?(?:nhắc)(?: giúp)?(?: tôi)?|làm ơn nhắc(?: tôi)?)\s*(?P<action2>.+?)
+    )
+    |
+    (?:
+        # Trường hợp mở đầu bằng số thời gian
+        (?P<number3>\d+)\s*(?P<unit3>giây|phút|giờ|ngày|tuần)(?: nữa)?[,]?\s*
+        (?:(?:hãy\s*)?(?:nhắc)(?: giúp)?(?: tôi)?|làm ơn nhắc(?: tôi)?)?\s*(?P<action3>.+?)
+    )
+    ''',
+    re.IGNORECASE | re.VERBOSE
+)
+
 def parse_reminder(text):
     text = text.lower().strip()
 
-    pattern_relative = re.compile(
-        r'''
-        (?:
-            # Trường hợp mở đầu bằng "nhắc"
-            (?:(?:nhắc)(?: giúp)?(?: tôi)?|làm ơn nhắc(?: tôi)?)
-            \s*(?P<action1>.+?)\s*
-            (?:trong|sau)\s*(?P<number1>\d+)\s*(?P<unit1>giây|phút|giờ|ngày|tuần)(?: nữa)?
-        )
-        |
-        (?:
-            # Trường hợp mở đầu bằng "trong/sau"
-            (?:trong|sau)\s*(?P<number2>\d+)\s*(?P<unit2>giây|phút|giờ|ngày|tuần)(?: nữa)?[,]?\s*
-            (?:(?:hãy\s*)?(?:nhắc)(?: giúp)?(?: tôi)?|làm ơn nhắc(?: tôi)?)\s*(?P<action2>.+?)
-        )
-        |
-        (?:
-            # Trường hợp mở đầu bằng số thời gian
-            (?P<number3>\d+)\s*(?P<unit3>giây|phút|giờ|ngày|tuần)(?: nữa)?[,]?\s*
-            (?:(?:hãy\s*)?(?:nhắc)(?: giúp)?(?: tôi)?|làm ơn nhắc(?: tôi)?)?\s*(?P<action3>.+?)
-        )
-        ''',
-        re.IGNORECASE | re.VERBOSE
-    )
-
-    m = pattern_relative.search(text)
+    m = REMINDER_RE.search(text)
     if not m:
         return None, None
 
@@ -0,0 +1,170 @@
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+
+# Tên file âm thanh trong cache: <sha1 của (lang, tld, text)>.mp3
+CACHE_FILE_RE = re.compile(r"^[0-9a-f]{40}\.mp3$")
+
+
+def gtts_synthesize(text, lang, tld, filepath):
+    from gtts import gTTS  # import khi cần, không làm chậm lúc khởi động worker
+    gTTS(text=text, lang=lang, tld=tld).save(filepath)
+
+
+def cache_key(text: str, lang: str = "vi", tld: str = "com.vn") -> str:
+    raw = f"{lang}\x00{tld}\x00{text}".encode("utf-8")
+    return hashlib.sha1(raw).hexdigest()
+
+
+class TTSCache:
+    """
+    Cache file mp3 theo nội dung (text, lang, tld).
+    Cùng một câu trả lời luôn cho ra cùng một file và cùng audio_url,
+    file ít dùng nhất bị xóa khi vượt giới hạn dung lượng / số lượng.
+    Thư mục dùng chung giữa các worker gunicorn: file do worker khác tạo được dùng lại,
+    và giới hạn được tính trên cả thư mục (quét lại sau mỗi lần tổng hợp), không theo
+    chỉ mục riêng của từng process.
+    """
+
+    def __init__(self, folder, max_bytes=200 * 1024 * 1024, max_entries=5000,
+                 synthesize=gtts_synthesize):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.synthesize = synthesize
+        self._entries = OrderedDict()  # filename -> size, cũ nhất ở đầu
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._pending = {}  # filename -> Event của lần tổng hợp đang chạy
+        os.makedirs(folder, exist_ok=True)
+        self.rebuild_index()
+
+    def rebuild_index(self, keep=None):
+        """
+        Dựng lại chỉ mục từ các file đã có trong thư mục (lúc khởi động, sau mỗi lần tổng
+        hợp) rồi xóa các file ít dùng nhất (mtime cũ nhất) vượt giới hạn.
+        """
+        found = []
+        for entry in os.scandir(self.folder):
+            if entry.is_file() and CACHE_FILE_RE.match(entry.name):
+                st = entry.stat()
+                found.append((st.st_mtime, entry.name, st.st_size))
+        found.sort()
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+            for _, name, size in found:
+                self._entries[name] = size
+                self._total_bytes += size
+            evicted = self._evict_locked(keep=keep)
+        self._remove_files(evicted)
+
+    def get_audio_url(self, text: str, lang: str = "vi", tld: str = "com.vn") -> str:
+        return f"/static/audio/{self.get_file(text, lang, tld)}"
+
+    def get_file(self, text: str, lang: str = "vi", tld: str = "com.vn") -> str:
+        filename = cache_key(text, lang, tld) + ".mp3"
+        while True:
+            with self._lock:
+                if filename in self._entries:
+                    self._entries.move_to_end(filename)
+                    hit = True
+                else:
+                    hit = False
+                    waiter = self._pending.get(filename)
+                    if waiter is None:
+                        done = self._pending[filename] = threading.Event()
+                        break
+            if hit:
+                if self._touch(filename):
+                    return filename
+                continue
+            # Một request khác đang tổng hợp đúng câu này: chờ rồi kiểm tra lại
+            waiter.wait()
+
+        filepath = os.path.join(self.folder, filename)
+        # pid + luồng: thread ident lặp lại giữa các worker gunicorn fork từ cùng master
+        tmp_path = f"{filepath}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            if self._adopt(filename, touch=True):
+                return filename
+            self.synthesize(text, lang, tld, tmp_path)
+            os.replace(tmp_path, filepath)
+            self.rebuild_index(keep=filename)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            with self._lock:
+                self._pending.pop(filename, None)
+            done.set()
+        return filename
+
+    def has_file(self, filename):
+        with self._lock:
+            indexed = filename in self._entries
+        if not indexed:
+            return self._adopt(filename)
+        # File có thể đã bị process dọn dẹp (leader) xóa
+        if os.path.exists(os.path.join(self.folder, filename)):
+            return True
+        self.forget(filename)
+        return False
+
+    def forget(self, filename):
+        """Bỏ một file khỏi chỉ mục (file đã bị xóa từ bên ngoài)."""
+        with self._lock:
+            size = self._entries.pop(filename, None)
+            if size is not None:
+                self._total_bytes -= size
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._total_bytes}
+
+    def _evict_locked(self, keep=None):
+        evicted = []
+        while self._entries and (len(self._entries) > self.max_entries
+                                 or self._total_bytes > self.max_bytes):
+            name, size = next(iter(self._entries.items()))
+            if name == keep:
+                break
+            del self._entries[name]
+            self._total_bytes -= size
+            evicted.append(name)
+        return evicted
+
+    def _adopt(self, filename, touch=False):
+        """File có trên đĩa (do worker khác tạo) mà chưa có trong chỉ mục: thêm vào chỉ mục."""
+        path = os.path.join(self.folder, filename)
+        try:
+            if touch:
+                os.utime(path)
+            size = os.path.getsize(path)
+        except FileNotFoundError:
+            return False
+        with self._lock:
+            if filename not in self._entries:
+                self._entries[filename] = size
+                self._total_bytes += size
+            self._entries.move_to_end(filename)
+        return True
+
+    def _touch(self, filename):
+        # Cập nhật mtime để thứ tự LRU còn đúng sau khi khởi động lại
+        try:
+            os.utime(os.path.join(self.folder, filename))
+            return True
+        except FileNotFoundError:
+            self.forget(filename)
+            return False
+
+    def _remove_files(self, names):
+        for name in names:
+            try:
+                os.remove(os.path.join(self.folder, name))
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                print(f"Lỗi khi xóa file {name}: {e}")
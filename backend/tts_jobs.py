@@ -0,0 +1,206 @@
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from tts_cache import cache_key
+from metrics import STAGE_SECONDS, TTS_FAILURES, TTS_JOBS
+
+
+class _Job:
+    def __init__(self, filename, text, lang, tld):
+        self.filename = filename
+        self.text = text
+        self.lang = lang
+        self.tld = tld
+        self.enqueued_at = time.perf_counter()
+        self.done = threading.Event()
+        self.error = None
+
+
+class TTSJobQueue:
+    """
+    Tổng hợp giọng nói ở một nhóm worker cố định thay vì ngay trong request.
+    Tên file là hàm băm của nội dung nên URL được biết trước khi render xong;
+    các yêu cầu trùng nội dung dùng chung một job. Hàng đợi có giới hạn: khi đầy,
+    request nhận câu trả lời không kèm âm thanh thay vì phải chờ.
+    Job đang chạy/thất bại còn được đánh dấu bằng file <tên>.pending / <tên>.failed cạnh
+    file mp3, để worker gunicorn khác (nơi client tải URL) cũng biết trạng thái của nó.
+    """
+
+    def __init__(self, cache, workers=4, max_queue=256, on_done=None, failed_ttl=300, pending_ttl=120):
+        self.cache = cache
+        self.on_done = on_done  # on_done(filename) sau khi file đã sẵn sàng
+        self.failed_ttl = failed_ttl
+        # Dấu pending cũ hơn chừng này giây là của worker đã chết giữa chừng
+        self.pending_ttl = pending_ttl
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._jobs = {}              # filename -> _Job đang chờ hoặc đang render
+        self._failed = OrderedDict()  # filename -> (hết hạn lúc, lỗi)
+        self._lock = threading.Lock()
+        self.workers = workers
+        self._threads = []  # tạo ở lần submit đầu tiên, sau khi gunicorn đã fork worker
+
+    def submit(self, text, lang="vi", tld="com.vn"):
+        """
+        Trả về (filename, trạng thái): "ready" nếu đã có trong cache, "pending" nếu
+        đang/sắp render, "rejected" nếu hàng đợi đầy (filename khi đó là None).
+        """
+        filename = cache_key(text, lang, tld) + ".mp3"
+        if self.cache.has_file(filename):
+            TTS_JOBS.inc("cached")
+            return filename, "ready"
+        with self._lock:
+            if filename in self._jobs or not self._claim(filename):
+                # Đang render ở process này, hoặc ở worker khác (dấu pending của nó còn mới)
+                TTS_JOBS.inc("joined")
+                return filename, "pending"
+            if not self._threads:
+                self._start_locked()
+            job = _Job(filename, text, lang, tld)
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                self._remove_marker(filename, "pending")
+                TTS_JOBS.inc("rejected")
+                return None, "rejected"
+            self._jobs[filename] = job
+            self._failed.pop(filename, None)
+        self._remove_marker(filename, "failed")
+        TTS_JOBS.inc("queued")
+        return filename, "pending"
+
+    def status(self, filename):
+        """Trạng thái file: ready, pending, failed hoặc unknown (chưa từng được yêu cầu / đã bị dọn)."""
+        with self._lock:
+            if filename in self._jobs:
+                return "pending"
+            failed = self._failed.get(filename)
+            if failed and failed[0] > time.monotonic():
+                return "failed"
+        if self.cache.has_file(filename):
+            return "ready"
+        # Job của worker khác
+        if self._marker_age(filename, "failed") < self.failed_ttl:
+            return "failed"
+        if self._marker_age(filename, "pending") < self.pending_ttl:
+            return "pending"
+        return "unknown"
+
+    def wait(self, filename, timeout):
+        """Chờ tối đa timeout giây cho job đang chạy; trả về trạng thái sau khi chờ."""
+        with self._lock:
+            job = self._jobs.get(filename)
+        if job is not None:
+            job.done.wait(timeout)
+            return self.status(filename)
+        # Job ở worker khác: chỉ còn cách xem lại file theo chu kỳ
+        deadline = time.monotonic() + timeout
+        state = self.status(filename)
+        while state == "pending" and time.monotonic() < deadline:
+            time.sleep(0.1)
+            state = self.status(filename)
+        return state
+
+    def render(self, text, lang="vi", tld="com.vn", timeout=30):
+        """Đưa vào hàng đợi rồi chờ xong; dùng cho luồng phụ (vd. /chat/stream), không cho request."""
+        filename, state = self.submit(text, lang, tld)
+        if state == "rejected":
+            raise RuntimeError("hàng đợi TTS đầy")
+        if state == "pending":
+            state = self.wait(filename, timeout)
+        if state != "ready":
+            raise RuntimeError(f"TTS {state}: {filename}")
+        return filename
+
+    def stats(self):
+        with self._lock:
+            return {
+                "queued": self._queue.qsize(),
+                "in_flight": len(self._jobs),
+                "recent_failures": len(self._failed),
+                "workers": self.workers,
+            }
+
+    def _start_locked(self):
+        self._threads = [
+            threading.Thread(target=self._work, name=f"tts-worker-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for t in self._threads:
+            t.start()
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            STAGE_SECONDS.observe(time.perf_counter() - job.enqueued_at, "tts_worker", "queue_wait")
+            try:
+                with STAGE_SECONDS.time("tts_worker", "render"):
+                    self.cache.get_file(job.text, job.lang, job.tld)
+            except Exception as e:
+                job.error = e
+                TTS_FAILURES.inc("tts_worker")
+                TTS_JOBS.inc("failed")
+                print(f"⚠️ TTS lỗi: {e}")
+            else:
+                TTS_JOBS.inc("done")
+            finally:
+                with self._lock:
+                    self._jobs.pop(job.filename, None)
+                    if job.error is not None:
+                        self._remember_failure_locked(job.filename, job.error)
+                if job.error is not None:
+                    self._write_marker(job.filename, "failed")
+                self._remove_marker(job.filename, "pending")
+                job.done.set()
+            if job.error is None and self.on_done:
+                try:
+                    self.on_done(job.filename)
+                except Exception as e:
+                    print(f"⚠️ Lỗi sau khi tạo âm thanh {job.filename}: {e}")
+
+    def _remember_failure_locked(self, filename, error):
+        now = time.monotonic()
+        self._failed[filename] = (now + self.failed_ttl, str(error))
+        self._failed.move_to_end(filename)
+        while self._failed and (len(self._failed) > 1024 or next(iter(self._failed.values()))[0] <= now):
+            self._failed.popitem(last=False)
+
+    def _marker_path(self, filename, kind):
+        return os.path.join(self.cache.folder, f"{filename}.{kind}")
+
+    def _claim(self, filename):
+        """
+        Tạo dấu pending (O_EXCL: chỉ một worker tạo được). False nếu worker khác đang render
+        file này; dấu quá pending_ttl giây là của worker đã chết nên được nhận lại.
+        """
+        try:
+            os.close(os.open(self._marker_path(filename, "pending"), os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return True
+        except FileExistsError:
+            if self._marker_age(filename, "pending") < self.pending_ttl:
+                return False
+            self._write_marker(filename, "pending")
+            return True
+        except OSError as e:
+            print(f"⚠️ Không ghi được dấu pending cho {filename}: {e}")
+            return True
+
+    def _write_marker(self, filename, kind):
+        try:
+            with open(self._marker_path(filename, kind), "w"):
+                pass
+        except OSError as e:
+            print(f"⚠️ Không ghi được dấu {kind} cho {filename}: {e}")
+
+    def _remove_marker(self, filename, kind):
+        try:
+            os.remove(self._marker_path(filename, kind))
+        except OSError:
+            pass
+
+    def _marker_age(self, filename, kind):
+        try:
+            return time.time() - os.path.getmtime(self._marker_path(filename, kind))
+        except OSError:
+            return float("inf")
@@ -0,0 +1,178 @@
+import threading
+import time
+from collections import Counter, OrderedDict
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class TTLCache:
+    """
+    Cache có hạn sống theo từng key, gộp các lần miss đồng thời (singleflight):
+    nhiều request cùng hỏi một key chỉ gây ra đúng một lần gọi upstream.
+    Khi đầy, key hết hạn bị bỏ trước, sau đó tới key lâu nhất chưa được dùng (LRU).
+    """
+
+    def __init__(self, max_entries=2048):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, value), ít dùng gần đây nhất ở đầu
+        self._flights = {}   # key -> _Flight đang chạy
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def get_or_load(self, key, loader, ttl_for):
+        """
+        loader() trả về giá trị mới; ttl_for(value) trả về số giây được cache
+        (0 = không cache, ví dụ khi upstream lỗi).
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > time.monotonic():
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return entry[1]
+            flight = self._flights.get(key)
+            if flight is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                self.misses += 1
+                flight = self._flights[key] = _Flight()
+                leader = True
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = loader()
+            self.put(key, flight.value, ttl_for(flight.value))
+            return flight.value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    def get(self, key, default=None):
+        """Giá trị còn hạn của key (không gọi upstream), ngược lại default."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > time.monotonic():
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return entry[1]
+            self.misses += 1
+            return default
+
+    def put(self, key, value, ttl):
+        if ttl <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if len(self._entries) >= self.max_entries and key not in self._entries:
+                self._prune_locked(now)
+            self._entries[key] = (now + ttl, value)
+            self._entries.move_to_end(key)
+
+    def _prune_locked(self, now):
+        for k in [k for k, (exp, _) in self._entries.items() if exp <= now]:
+            del self._entries[k]
+        # Vẫn đầy: bỏ key lâu nhất chưa được dùng
+        while len(self._entries) >= self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+            }
+
+
+class WeatherCache:
+    """
+    Cache payload OpenWeather theo (city_en, endpoint).
+    Payload /forecast 5 ngày được dùng chung cho mọi ngày trong khoảng dự báo.
+    known_cities: các tên tỉnh hợp lệ (CITY_MAP); chỉ chúng được đếm độ phổ biến để làm nóng,
+    nên bộ đếm không phình theo chuỗi tuỳ ý client gửi lên.
+    """
+
+    def __init__(self, client, api_key, current_ttl=600, forecast_ttl=1800, error_ttl=60, known_cities=()):
+        self.client = client
+        self.api_key = api_key
+        self.ttls = {"weather": current_ttl, "forecast": forecast_ttl}
+        self.error_ttl = error_ttl
+        self.cache = TTLCache()
+        self.known_cities = frozenset(known_cities)
+        self.popularity = Counter()
+        self._popularity_lock = threading.Lock()
+        self._refresher = None
+        self._refresher_stopped = None
+
+    def fetch(self, city_en, endpoint):
+        """Trả về (status_code, data) của /weather hoặc /forecast."""
+        if city_en in self.known_cities:
+            with self._popularity_lock:
+                self.popularity[city_en] += 1
+        return self.cache.get_or_load(
+            (city_en, endpoint),
+            lambda: self._load(city_en, endpoint),
+            lambda result: self._ttl(endpoint, result),
+        )
+
+    def _load(self, city_en, endpoint):
+        params = {"q": city_en, "units": "metric", "lang": "vi", "appid": self.api_key}
+        res = self.client.get(endpoint, params=params)
+        data = res.json() if res.status_code == 200 else None
+        return res.status_code, data
+
+    def _ttl(self, endpoint, result):
+        status, _ = result
+        if status == 200:
+            return self.ttls[endpoint]
+        # Tên thành phố sai: nhớ ngắn hạn để khỏi hỏi lại liên tục; lỗi khác không cache
+        return self.error_ttl if status == 404 else 0
+
+    def start_refresher(self, top_n=10, interval=None):
+        """Luồng nền giữ nóng thời tiết hiện tại của các tỉnh được hỏi nhiều nhất."""
+        if self._refresher is not None:
+            return
+        interval = interval or max(30, self.ttls["weather"] - 30)
+        stopped = threading.Event()
+
+        def run():
+            while not stopped.wait(interval):
+                with self._popularity_lock:
+                    popular = [c for c, _ in self.popularity.most_common(top_n)]
+                for city_en in popular:
+                    if stopped.is_set():
+                        return
+                    try:
+                        result = self._load(city_en, "weather")
+                        self.cache.put((city_en, "weather"), result, self._ttl("weather", result))
+                    except Exception as e:
+                        print(f"⚠️ Làm mới thời tiết {city_en} lỗi: {e}")
+
+        self._refresher_stopped = stopped
+        self._refresher = threading.Thread(target=run, name="weather-refresher", daemon=True)
+        self._refresher.start()
+
+    def stop_refresher(self):
+        if self._refresher is None:
+            return
+        self._refresher_stopped.set()
+        self._refresher.join()
+        self._refresher = None